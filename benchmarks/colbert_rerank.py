@@ -0,0 +1,74 @@
+"""
+Compares reranking candidates with the ColBERT ranker, which re-encodes every candidate per query, with MaxSim
+against token embeddings precomputed in a ColBERTStore: rerank latency of each and the agreement of their top results.
+
+    python benchmarks/colbert_rerank.py --data-path data/rag_data --candidates 15
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.open_retrieval.document_loaders import DocumentLoader
+from src.open_retrieval.text_splitters import TextSplitter
+from src.open_retrieval.colbert_store import ColBERTEncoder, ColBERTStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Live vs precomputed ColBERT reranking benchmark")
+    parser.add_argument("--data-path", default="data/rag_data")
+    parser.add_argument("--model", default="colbert")
+    parser.add_argument("--chunk-size", type=int, default=800)
+    parser.add_argument("--candidates", type=int, default=15, help="Number of chunks reranked per query")
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--output", default=None, help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    from rerankers import Reranker
+    docs, _ = DocumentLoader().load_directory(args.data_path)
+    chunks = TextSplitter(splitter="fast_recursive").split(docs, chunk_size=args.chunk_size, chunk_overlap=0)
+    ranker = Reranker(args.model, verbose=0)
+    rng = np.random.default_rng(0)
+
+    with tempfile.TemporaryDirectory() as path:
+        store = ColBERTStore(path, encoder=ColBERTEncoder(ranker))
+        start = time.perf_counter()
+        store.add_documents(chunks)
+        index_seconds = time.perf_counter() - start
+
+        live, stored, overlap = [], [], []
+        for _ in range(args.queries):
+            candidates = [chunks[i] for i in rng.choice(len(chunks), size=min(args.candidates, len(chunks)), replace=False)]
+            query = " ".join(rng.choice(candidates[0].page_content.split(), size=6))
+            start = time.perf_counter()
+            data = ranker.rank(query=query, docs=[doc.page_content for doc in candidates], doc_ids=list(range(len(candidates))))
+            live.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            scores = store.score(query, candidates)
+            stored.append(time.perf_counter() - start)
+            live_top = {result.document.doc_id for result in data.results[:args.top_k]}
+            overlap.append(len(live_top & set(np.argsort(scores)[::-1][:args.top_k].tolist())) / args.top_k)
+
+    results = {
+        "chunks": len(chunks),
+        "index_seconds": index_seconds,
+        "store_megabytes": store.tokens * store.dimension * np.dtype(store.dtype).itemsize / 2**20,
+        "live_rerank_ms": 1000 * float(np.median(live)),
+        "stored_rerank_ms": 1000 * float(np.median(stored)),
+        "speedup": float(np.median(live) / np.median(stored)),
+        "top_k_overlap": float(np.mean(overlap)),
+    }
+    for name, value in results.items():
+        print(f"{name:<32}{value:>10.3f}" if isinstance(value, float) else f"{name:<32}{value:>10}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Measures the cold-start cost of open_retrieval: the import time of every module in a fresh interpreter, the
+heavy backends each import pulls in, and optionally the latency of the first and second embedding model
+lookup in one process.
+
+    python benchmarks/cold_start.py --runs 5
+    python benchmarks/cold_start.py --provider fastembed --model BAAI/bge-small-en-v1.5
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+MODULES = ["document_loaders", "text_splitters", "embedding_providers", "vector_databases", "retrievers", "ingestion"]
+BACKENDS = ["chromadb", "qdrant_client", "pymilvus", "faiss", "unstructured", "rerankers", "torch", "sentence_transformers", "fastembed"]
+
+IMPORT_CODE = """
+import sys, time, json
+start = time.perf_counter()
+import src.open_retrieval.{module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "backends": [m for m in {backends!r} if m in sys.modules]}}))
+"""
+
+MODEL_CODE = """
+import time, json
+from src.open_retrieval.embedding_providers import EmbeddingProvider
+timings = []
+for _ in range(2):
+    start = time.perf_counter()
+    EmbeddingProvider({provider!r}).get_embedding_function(model_name={model!r}).embed_query("cold start")
+    timings.append(time.perf_counter() - start)
+print(json.dumps({{"first_query": timings[0], "second_query": timings[1]}}))
+"""
+
+
+def run(code: str) -> dict:
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time and cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument("--provider", default=None, help="Embedding provider whose first query is timed")
+    parser.add_argument("--model", default=None, help="Embedding model whose first query is timed")
+    parser.add_argument("--output", default=None, help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = {"imports": {}}
+    for module in MODULES:
+        samples = [run(IMPORT_CODE.format(module=module, backends=BACKENDS)) for _ in range(args.runs)]
+        results["imports"][module] = {
+            "median_seconds": statistics.median(sample["seconds"] for sample in samples),
+            "backends": samples[-1]["backends"],
+        }
+        print(f"{module:<22}{results['imports'][module]['median_seconds'] * 1000:>9.1f} ms  {', '.join(samples[-1]['backends']) or '-'}")
+
+    if args.provider:
+        results["model"] = run(MODEL_CODE.format(provider=args.provider, model=args.model))
+        print(f"first query  {results['model']['first_query']:.3f} s")
+        print(f"second query {results['model']['second_query']:.3f} s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
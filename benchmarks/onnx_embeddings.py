@@ -0,0 +1,74 @@
+"""
+Compares the ONNX Runtime embedding engine with the PyTorch HuggingFace provider on CPU: chunks embedded per
+second by each, and the cosine similarity between their embeddings of the same chunks.
+
+    python benchmarks/onnx_embeddings.py --data-path data/rag_data --model BAAI/bge-small-en-v1.5
+    python benchmarks/onnx_embeddings.py --model BAAI/bge-small-en-v1.5 --quantize --threads 8
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.open_retrieval.document_loaders import DocumentLoader
+from src.open_retrieval.text_splitters import TextSplitter
+from src.open_retrieval.embedding_providers import EmbeddingProvider
+
+
+def load_chunks(data_path: str, limit: int, chunk_size: int):
+    docs, _ = DocumentLoader().load_directory(data_path)
+    chunks = TextSplitter(splitter="fast_recursive").split(docs, chunk_size=chunk_size, chunk_overlap=0)
+    return [chunk.page_content for chunk in chunks][:limit]
+
+
+def throughput(embedding_function, texts, runs: int):
+    embedding_function.embed_documents(texts[:8])
+    timings, vectors = [], None
+    for _ in range(runs):
+        start = time.perf_counter()
+        vectors = embedding_function.embed_documents(texts)
+        timings.append(time.perf_counter() - start)
+    return len(texts) / min(timings), np.asarray(vectors, dtype=np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ONNX Runtime vs PyTorch embedding benchmark")
+    parser.add_argument("--data-path", default="data/rag_data")
+    parser.add_argument("--model", default="BAAI/bge-small-en-v1.5")
+    parser.add_argument("--limit", type=int, default=512, help="Number of chunks embedded")
+    parser.add_argument("--chunk-size", type=int, default=800)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=None, help="ONNX Runtime intra-op threads")
+    parser.add_argument("--quantize", action="store_true", help="Run the int8 dynamically quantized graph")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--output", default=None, help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    texts = load_chunks(args.data_path, args.limit, args.chunk_size)
+    baseline = EmbeddingProvider("huggingface").get_embedding_function(model_name=args.model, embedding_kwargs={"encode_kwargs": {"batch_size": args.batch_size, "normalize_embeddings": True}})
+    onnx = EmbeddingProvider("onnx").get_embedding_function(model_name=args.model, embedding_kwargs={"quantize": args.quantize, "intra_op_threads": args.threads, "batch_size": args.batch_size})
+
+    baseline_rate, baseline_vectors = throughput(baseline, texts, args.runs)
+    onnx_rate, onnx_vectors = throughput(onnx, texts, args.runs)
+    agreement = (baseline_vectors * onnx_vectors).sum(axis=1) / (np.linalg.norm(baseline_vectors, axis=1) * np.linalg.norm(onnx_vectors, axis=1))
+
+    results = {
+        "chunks": len(texts),
+        "huggingface_chunks_per_second": baseline_rate,
+        "onnx_chunks_per_second": onnx_rate,
+        "speedup": onnx_rate / baseline_rate,
+        "mean_cosine_agreement": float(agreement.mean()),
+        "min_cosine_agreement": float(agreement.min()),
+    }
+    for name, value in results.items():
+        print(f"{name:<32}{value:>10.3f}" if isinstance(value, float) else f"{name:<32}{value:>10}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
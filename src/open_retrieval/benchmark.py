@@ -0,0 +1,310 @@
+"""
+Benchmarks retrieval pipelines end to end on a query set in the data/Test.csv format.
+
+Every combination of splitter, embedding provider, vector store and retrieval type is built from scratch and
+reports per-stage latency percentiles, throughput, peak RSS (each combination runs in its own process), index size on disk, and recall@k and MRR of the
+retrieved chunks against the `Document Title` of every query.
+
+    python -m open_retrieval.benchmark --queries data/Test.csv --data data/rag_data \
+        --splitters recursive fast_recursive --providers huggingface --vector-stores faiss numpy \
+        --retrieval naive ranked --output output/benchmark.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import itertools
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from .document_loaders import DocumentLoader
+from .embedding_providers import EmbeddingProvider
+from .ingestion import default_extra_metadata
+from .lexical_index import BM25Index
+from .retrievers import Retriever
+from .text_splitters import TextSplitter
+from .vector_databases import VectorDatabase
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+RETRIEVAL_TYPES = ("naive", "ranked", "hybrid")
+
+
+@dataclass
+class BenchmarkConfig:
+    """
+    One combination of pipeline settings.
+
+    Attributes:
+        splitter (str): The TextSplitter splitter.
+        embedding_provider (str): The EmbeddingProvider provider.
+        vector_store (str): The VectorDatabase vector store.
+        retrieval_type (str): naive, ranked or hybrid.
+        model_name (Optional[str]): The embedding model. Defaults to the provider's default model.
+    """
+    splitter: str
+    embedding_provider: str
+    vector_store: str
+    retrieval_type: str
+    model_name: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        return "/".join([self.splitter, self.embedding_provider, self.model_name or "default", self.vector_store, self.retrieval_type])
+
+
+class StageTimer:
+    """
+    Collects latency samples per pipeline stage.
+    """
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+
+    def add(self, stage: str, seconds: float):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    @contextmanager
+    def measure(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns the count, total, mean and p50/p95/p99 latency in milliseconds of every stage.
+        """
+        summary = {}
+        for stage, samples in self.samples.items():
+            values = np.array(samples) * 1000
+            summary[stage] = {
+                "count": len(values),
+                "total_ms": float(values.sum()),
+                "mean_ms": float(values.mean()),
+                "p50_ms": float(np.percentile(values, 50)),
+                "p95_ms": float(np.percentile(values, 95)),
+                "p99_ms": float(np.percentile(values, 99)),
+            }
+        return summary
+
+
+class TimedEmbeddings(Embeddings):
+    """
+    Wraps an embedding function and records the latency of every embed_documents call as the embed stage.
+    """
+    def __init__(self, embedding_function: Embeddings, timer: StageTimer):
+        self.embedding_function = embedding_function
+        self.timer = timer
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self.timer.measure("embed"):
+            return self.embedding_function.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embedding_function.embed_query(text)
+
+
+def relevance_metrics(retrieved_labels: List[List[Optional[str]]], expected_labels: List[str], k: int) -> Dict[str, float]:
+    """
+    Computes recall@k, the fraction of queries with a relevant chunk in their top k, and the mean reciprocal rank.
+
+    Args:
+        retrieved_labels (List[List[Optional[str]]]): The label of every retrieved chunk, per query.
+        expected_labels (List[str]): The relevant label of every query.
+        k (int): The cutoff.
+
+    Returns:
+        Dict[str, float]: The recall@k and MRR.
+    """
+    hits, reciprocal_ranks = 0, 0.0
+    for labels, expected in zip(retrieved_labels, expected_labels):
+        rank = next((i for i, label in enumerate(labels[:k]) if label == expected), None)
+        if rank is not None:
+            hits += 1
+            reciprocal_ranks += 1 / (rank + 1)
+    n = max(len(expected_labels), 1)
+    return {f"recall@{k}": hits / n, "mrr": reciprocal_ranks / n}
+
+
+def directory_size(path: str) -> int:
+    """
+    Returns the number of bytes of every file under a directory.
+    """
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def peak_rss_mb() -> float:
+    """
+    Returns the peak resident set size of the process in megabytes, or 0 where the resource module is not available.
+    The peak is a high-water mark of the whole process, so main runs every configuration in its own process.
+    """
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_benchmark(config: BenchmarkConfig, queries: "pd.DataFrame", data_path: str, top_k: int = 5, candidates: int = 15, chunk_size: int = 800, chunk_overlap: int = 0, use_filter: bool = False, ranker=None, embedding_function: Optional[Embeddings] = None, store_kwargs: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Builds one pipeline from scratch and runs every query through it.
+
+    Args:
+        config (BenchmarkConfig): The pipeline settings.
+        queries (pd.DataFrame): The queries, with `Query text` and `Document Title` columns.
+        data_path (str): The directory of documents to index.
+        top_k (int): The number of results per query.
+        candidates (int): The number of candidates fetched per query before reranking.
+        chunk_size (int): The size of each chunk.
+        chunk_overlap (int): The overlap between chunks.
+        use_filter (bool): Whether to restrict every query to the chunks of its `Document Title`.
+        ranker (Optional[Reranker]): The reranker used by the ranked retrieval type.
+        embedding_function (Optional[Embeddings]): The embedding function. Defaults to the one of the configured provider and model.
+        store_kwargs (Optional[Dict[str, Any]]): Additional arguments passed to create_index.
+
+    Returns:
+        Dict[str, Any]: The configuration and its measurements.
+    """
+    if config.retrieval_type not in RETRIEVAL_TYPES:
+        raise ValueError('Invalid retrieval_type value: Expecting one of naive, ranked or hybrid')
+    if config.retrieval_type == "ranked" and ranker is None:
+        raise ValueError("The ranked retrieval type needs a ranker")
+    timer = StageTimer()
+    loader, splitter = DocumentLoader(), TextSplitter(splitter=config.splitter)
+
+    chunks, failed_files = [], []
+    for filename in sorted(os.listdir(data_path)):
+        file_path = os.path.join(data_path, filename)
+        with timer.measure("load"):
+            data = loader.load(file_path)
+        if not isinstance(data, list):
+            failed_files.append(filename)
+            continue
+        with timer.measure("split"):
+            chunks.extend(splitter.split(data, chunk_size=chunk_size, chunk_overlap=chunk_overlap, extra_metadata=default_extra_metadata(file_path)))
+
+    embedding_function = TimedEmbeddings(embedding_function or EmbeddingProvider(config.embedding_provider).get_embedding_function(model_name=config.model_name), timer)
+    index_dir = tempfile.mkdtemp(prefix="open_retrieval_benchmark_")
+    try:
+        start = time.perf_counter()
+        vector_index = VectorDatabase(vector_store=config.vector_store).create_index(embedding_function=embedding_function, docs=chunks, index_name="benchmark", index_dir=index_dir, **(store_kwargs or {}))
+        index_seconds = time.perf_counter() - start
+        timer.add("index", index_seconds - sum(timer.samples.get("embed", [])))
+        index_bytes = directory_size(index_dir)
+
+        lexical_index = None
+        if config.retrieval_type == "hybrid":
+            with timer.measure("lexical_index"):
+                lexical_index = BM25Index()
+                lexical_index.add_documents(chunks)
+        retriever = Retriever(vector_index=vector_index, ranker=ranker, lexical_index=lexical_index)
+
+        retrieved_labels = []
+        query_start = time.perf_counter()
+        for query, title in zip(queries["Query text"], queries["Document Title"]):
+            filter = {"file_name": title} if use_filter else None
+            if config.retrieval_type == "hybrid":
+                with timer.measure("search"):
+                    docs = [doc for doc, _ in retriever.hybrid_retrieval_with_scores(query, top_k=top_k, filter=filter)]
+            else:
+                with timer.measure("query_embed"):
+                    vector = embedding_function.embed_query(query)
+                k = candidates if config.retrieval_type == "ranked" else top_k
+                with timer.measure("search"):
+                    docs = vector_index.similarity_search_by_vector(vector, k=k, filter=filter)
+                if config.retrieval_type == "ranked":
+                    with timer.measure("rerank"):
+                        docs = [doc for doc, _ in retriever._rerank_with_scores(query, docs, top_k)]
+            # identical chunks of different files are judged by the file each retrieved copy comes from
+            retrieved_labels.append([doc.metadata.get("file_name") for doc in docs])
+        query_seconds = time.perf_counter() - query_start
+    finally:
+        shutil.rmtree(index_dir, ignore_errors=True)
+
+    return {
+        **asdict(config),
+        "name": config.name,
+        "files": len(os.listdir(data_path)) - len(failed_files),
+        "failed_files": failed_files,
+        "chunks": len(chunks),
+        "stages": timer.summary(),
+        "index_seconds": index_seconds,
+        "indexing_throughput": len(chunks) / index_seconds if index_seconds else 0.0,
+        "query_throughput": len(queries) / query_seconds if query_seconds else 0.0,
+        "index_bytes": index_bytes,
+        "peak_rss_mb": peak_rss_mb(),
+        **relevance_metrics(retrieved_labels, list(queries["Document Title"]), top_k),
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark open_retrieval pipelines on a query set")
+    parser.add_argument("--queries", default="data/Test.csv", help="CSV with Query text and Document Title columns")
+    parser.add_argument("--data", default="data/rag_data", help="Directory of documents to index")
+    parser.add_argument("--splitters", nargs="+", default=["recursive"])
+    parser.add_argument("--providers", nargs="+", default=["huggingface"])
+    parser.add_argument("--models", nargs="+", default=[None], help="Embedding models, defaults to the provider's default model")
+    parser.add_argument("--vector-stores", nargs="+", default=["faiss"])
+    parser.add_argument("--retrieval", nargs="+", default=["naive"], choices=RETRIEVAL_TYPES)
+    parser.add_argument("--ranker", default="colbert", help="Reranker model of the ranked retrieval type")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--candidates", type=int, default=15, help="Candidates fetched per query before reranking")
+    parser.add_argument("--chunk-size", type=int, default=800)
+    parser.add_argument("--chunk-overlap", type=int, default=0)
+    parser.add_argument("--filter", action="store_true", help="Restrict every query to the chunks of its Document Title")
+    parser.add_argument("--output", default="output/benchmark.json", help="Where the JSON results are written")
+    return parser.parse_args(argv)
+
+
+def run_isolated(config: BenchmarkConfig, args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Runs one configuration with its own queries and ranker. Called in a fresh process per configuration,
+    so the peak RSS of a configuration is not the high-water mark left by an earlier one.
+    """
+    import pandas as pd
+    logging.getLogger().setLevel(logging.WARNING)
+    ranker = None
+    if config.retrieval_type == "ranked":
+        from rerankers import Reranker
+        ranker = Reranker(args.ranker, verbose=0)
+    return run_benchmark(config, pd.read_csv(args.queries), args.data, top_k=args.top_k, candidates=args.candidates, chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap, use_filter=args.filter, ranker=ranker)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    context = multiprocessing.get_context("spawn")
+
+    results = []
+    for splitter, provider, model_name, vector_store, retrieval_type in itertools.product(args.splitters, args.providers, args.models, args.vector_stores, args.retrieval):
+        config = BenchmarkConfig(splitter=splitter, embedding_provider=provider, vector_store=vector_store, retrieval_type=retrieval_type, model_name=model_name)
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            result = executor.submit(run_isolated, config, args).result()
+        results.append(result)
+        search = result["stages"].get("search")
+        latency = f"search p50={search['p50_ms']:.1f}ms p95={search['p95_ms']:.1f}ms" if search else "no queries"
+        print(f"{config.name}: recall@{args.top_k}={result[f'recall@{args.top_k}']:.3f} mrr={result['mrr']:.3f} "
+              f"{latency} {result['query_throughput']:.1f} q/s "
+              f"index={result['index_bytes'] / 1e6:.1f}MB rss={result['peak_rss_mb']:.0f}MB")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump({"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "queries": args.queries, "data": args.data, "top_k": args.top_k, "filter": args.filter, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
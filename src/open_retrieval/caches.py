@@ -0,0 +1,215 @@
+import sys
+import time
+import asyncio
+import functools
+import weakref
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+_MISSING = object()
+_index_versions: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+WRITE_METHODS = ("add_texts", "aadd_texts", "add_embeddings", "delete", "adelete")
+
+
+def index_version(vector_index) -> Tuple[int, int]:
+    """
+    Returns the generation of a vector index, which changes whenever chunks are added to or deleted from it.
+
+    Stores that count their own writes (NumpyVectorStore, BM25Index) expose a `generation` attribute. Writes made
+    through IndexWriter, PrefilteredFAISS or a store wrapped by track_writes are recorded with bump_index_version.
+    """
+    try:
+        bumped = _index_versions.get(vector_index, 0)
+    except TypeError:
+        bumped = 0
+    return getattr(vector_index, "generation", 0), bumped
+
+
+def bump_index_version(vector_index):
+    """
+    Records that a vector index changed, invalidating cached results that were computed against it.
+    """
+    try:
+        _index_versions[vector_index] = _index_versions.get(vector_index, 0) + 1
+    except TypeError:
+        pass
+
+
+def track_writes(vector_index):
+    """
+    Wraps the write methods of a vector store instance so every add or delete bumps its index version,
+    for stores such as Chroma or Qdrant that do not count their own writes.
+
+    Args:
+        vector_index: The vector store.
+
+    Returns:
+        The same vector store.
+    """
+    for name in WRITE_METHODS:
+        method = getattr(vector_index, name, None)
+        if method is None or getattr(method, "_tracks_writes", False):
+            continue
+        setattr(vector_index, name, _tracking(vector_index, method))
+    return vector_index
+
+
+def _tracking(vector_index, method):
+    if asyncio.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def async_wrapper(*args, **kwargs):
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                bump_index_version(vector_index)
+        async_wrapper._tracks_writes = True
+        return async_wrapper
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        try:
+            return method(*args, **kwargs)
+        finally:
+            bump_index_version(vector_index)
+    wrapper._tracks_writes = True
+    return wrapper
+
+
+def approximate_size(value: Any) -> int:
+    """
+    Estimates the memory used by a cached value of strings, floats, lists, tuples, dicts or numpy arrays.
+    """
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(approximate_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(approximate_size(k) + approximate_size(v) for k, v in value.items())
+    if hasattr(value, "page_content"):
+        return approximate_size(value.page_content) + approximate_size(value.metadata)
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """
+    A thread-safe in-process LRU cache with an optional time-to-live and memory budget.
+
+    Every entry remembers how long it took to compute, so the cache can report the latency it saved.
+
+    Args:
+        max_entries (int): The maximum number of entries.
+        ttl (Optional[float]): The number of seconds an entry stays valid. Entries never expire when None.
+        max_bytes (Optional[int]): The approximate memory budget of the cached values.
+        sizeof (Callable[[Any], int]): Estimates the memory used by a value.
+    """
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None, max_bytes: Optional[int] = None, sizeof: Callable[[Any], int] = approximate_size):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.latency_saved = 0.0
+        self.bytes = 0
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float, int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING, record=False) is not _MISSING
+
+    def get(self, key: Hashable, default: Any = None, record: bool = True) -> Any:
+        """
+        Returns the cached value of a key and marks it as recently used.
+
+        Args:
+            key (Hashable): The key.
+            default (Any): The value returned on a miss.
+            record (bool): Whether the lookup counts towards the hit/miss statistics.
+
+        Returns:
+            Any: The cached value, or default.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and entry[1] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += record
+                return default
+            self._entries.move_to_end(key)
+            if record:
+                self.hits += 1
+                self.latency_saved += entry[3]
+            return entry[0]
+
+    def set(self, key: Hashable, value: Any, cost: float = 0.0):
+        """
+        Caches a value, evicting the least recently used entries when the cache is over its limits.
+
+        Args:
+            key (Hashable): The key.
+            value (Any): The value.
+            cost (float): The number of seconds it took to compute the value.
+        """
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else float("inf")
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires_at, size, cost)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or (self.max_bytes is not None and self.bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Returns the cached value of a key, computing and caching it on a miss.
+
+        Args:
+            key (Hashable): The key.
+            compute (Callable[[], Any]): Computes the value.
+
+        Returns:
+            Any: The value.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            start = time.perf_counter()
+            value = compute()
+            self.set(key, value, cost=time.perf_counter() - start)
+        return value
+
+    def _remove(self, key: Hashable):
+        self.bytes -= self._entries.pop(key)[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns the statistics of the cache.
+
+        Returns:
+            Dict[str, float]: The hits, misses, hit rate, evictions, entries, bytes and seconds of latency saved.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "latency_saved": self.latency_saved,
+        }
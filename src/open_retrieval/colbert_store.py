@@ -0,0 +1,218 @@
+import os
+import json
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from langchain.docstore.document import Document
+from .fusion import content_hash
+from .instrumentation import annotate, instrumented
+
+DTYPES = ("float16", "float32")
+
+
+def _to_numpy(tensor: Any) -> np.ndarray:
+    if hasattr(tensor, "cpu"):
+        tensor = tensor.float().cpu().numpy()
+    return np.asarray(tensor, dtype=np.float32)
+
+
+def maxsim(query_embeddings: np.ndarray, query_length: int, matrices: Sequence[np.ndarray]) -> np.ndarray:
+    """
+    Scores documents against a query by late interaction: every query token is matched with its most similar
+    document token, and the similarities are summed and divided by the number of real query tokens, like the
+    ColBERT ranker of rerankers.
+
+    Args:
+        query_embeddings (np.ndarray): The token embeddings of the query, including its expansion tokens.
+        query_length (int): The number of real query tokens.
+        matrices (Sequence[np.ndarray]): The token embeddings of every document.
+
+    Returns:
+        np.ndarray: The score of every document.
+    """
+    if not matrices:
+        return np.empty(0, dtype=np.float32)
+    offsets = np.cumsum([0] + [len(matrix) for matrix in matrices[:-1]])
+    similarities = np.concatenate(matrices).astype(np.float32) @ query_embeddings.T
+    return np.maximum.reduceat(similarities, offsets, axis=0).sum(axis=1) / max(query_length, 1)
+
+
+class ColBERTEncoder:
+    """
+    Encodes queries and documents into token embeddings with the model of a rerankers ColBERT ranker,
+    e.g. Reranker("colbert"), keeping only the unpadded document tokens.
+
+    Args:
+        ranker: The ColBERT ranker.
+        batch_size (int): The number of documents encoded at a time.
+    """
+    def __init__(self, ranker: Any, batch_size: int = 32):
+        for attribute in ("_query_encode", "_document_encode", "_to_embs"):
+            if not hasattr(ranker, attribute):
+                raise ValueError(f"{type(ranker).__name__} is not a ColBERT ranker: it has no {attribute} method")
+        self.ranker = ranker
+        self.batch_size = batch_size
+
+    def encode_query(self, query: str) -> Tuple[np.ndarray, int]:
+        """
+        Returns the token embeddings of a query, including its mask expansion tokens, and its number of real tokens.
+        """
+        encoding = self.ranker._query_encode([query])
+        embeddings = _to_numpy(self.ranker._to_embs(encoding))[0]
+        return embeddings, int(_to_numpy(encoding["attention_mask"])[0].sum())
+
+    def encode_documents(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        Returns the token embeddings of every document, without padding.
+        """
+        matrices: List[np.ndarray] = []
+        for start in range(0, len(texts), self.batch_size):
+            encoding = self.ranker._document_encode(texts[start:start + self.batch_size])
+            embeddings = _to_numpy(self.ranker._to_embs(encoding))
+            mask = _to_numpy(encoding["attention_mask"]) > 0
+            matrices.extend(embeddings[row][mask[row]] for row in range(len(embeddings)))
+        return matrices
+
+
+class ColBERTStore:
+    """
+    A persistent store of the ColBERT token embeddings of every chunk, computed once at index time so reranking
+    only encodes the query and scores the candidates by MaxSim against their stored matrices.
+
+    The token embeddings of all chunks are appended to a single float16 file that is memory-mapped for reading,
+    and a JSON manifest maps every chunk id to its rows. The manifest is replaced atomically after the rows are
+    written, so an interrupted write never exposes partial matrices.
+
+    Args:
+        path (str): The directory of the store.
+        encoder (Optional[ColBERTEncoder]): Encodes chunks and queries. Only needed to add chunks or score queries.
+        dtype (str): The dtype the token embeddings are stored in, float16 or float32.
+        key (Callable[[Document], str]): Returns the chunk id of a chunk. Defaults to the hash of its text.
+    """
+    def __init__(self, path: str, encoder: Optional[ColBERTEncoder] = None, dtype: str = "float16", key: Callable[[Document], str] = content_hash):
+        if dtype not in DTYPES:
+            raise ValueError('Invalid dtype value: Expecting one of float16 or float32')
+        self.path = path
+        self.encoder = encoder
+        self.dtype = dtype
+        self.key = key
+        self.dimension: Optional[int] = None
+        self.tokens = 0
+        self.chunks: Dict[str, Tuple[int, int]] = {}
+        self.logger = logging.getLogger(__name__)
+        self._matrix: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(self._path("colbert.json")):
+            with open(self._path("colbert.json")) as f:
+                manifest = json.load(f)
+            if manifest["dtype"] != dtype:
+                self.logger.info(f"Reusing the {manifest['dtype']} layout of the ColBERT store in {path}")
+            self.dtype = manifest["dtype"]
+            self.dimension = manifest["dimension"]
+            self.tokens = manifest["tokens"]
+            self.chunks = {key: tuple(rows) for key, rows in manifest["chunks"].items()}
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.chunks
+
+    def _rows(self) -> np.memmap:
+        if self._matrix is None or len(self._matrix) != self.tokens:
+            self._matrix = np.memmap(self._path("embeddings.bin"), dtype=self.dtype, mode="r", shape=(self.tokens, self.dimension))
+        return self._matrix
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """
+        Returns the stored token embeddings of a chunk as a read-only view, or None when it is not stored.
+        """
+        rows = self.chunks.get(key)
+        if rows is None:
+            return None
+        with self._lock:
+            return self._rows()[rows[0]:rows[0] + rows[1]]
+
+    def add(self, keys: List[str], matrices: List[np.ndarray]):
+        """
+        Stores the token embeddings of chunks. Chunks that are already stored are kept as they are.
+
+        Args:
+            keys (List[str]): The chunk ids.
+            matrices (List[np.ndarray]): The token embeddings of every chunk, one row per token.
+        """
+        with self._lock:
+            new = {}
+            for key, matrix in zip(keys, matrices):
+                if key not in self.chunks and key not in new:
+                    new[key] = matrix
+            if not new:
+                return
+            if self.dimension is None:
+                self.dimension = int(next(iter(new.values())).shape[1])
+            chunks = dict(self.chunks)
+            tokens = self.tokens
+            with open(self._path("embeddings.bin"), "ab") as f:
+                # rows past the manifest are left over from an interrupted write
+                f.truncate(tokens * self.dimension * np.dtype(self.dtype).itemsize)
+                for key, matrix in new.items():
+                    f.write(np.ascontiguousarray(matrix, dtype=self.dtype).tobytes())
+                    chunks[key] = (tokens, len(matrix))
+                    tokens += len(matrix)
+            tmp = self._path("colbert.json.tmp")
+            with open(tmp, "w") as f:
+                json.dump({"dimension": self.dimension, "dtype": self.dtype, "tokens": tokens, "chunks": chunks}, f)
+            os.replace(tmp, self._path("colbert.json"))
+            self.chunks, self.tokens = chunks, tokens
+
+    @instrumented("colbert_store.add_documents", lambda result, self, docs, *args, **kwargs: {"items": result})
+    def add_documents(self, docs: List[Document]) -> int:
+        """
+        Encodes and stores the chunks that are not stored yet.
+
+        Args:
+            docs (List[Document]): The chunks.
+
+        Returns:
+            int: The number of chunks encoded.
+        """
+        missing: Dict[str, str] = {}
+        for doc in docs:
+            key = self.key(doc)
+            if key not in self.chunks:
+                missing.setdefault(key, doc.page_content)
+        if missing:
+            self.add(list(missing), self._encoder().encode_documents(list(missing.values())))
+        return len(missing)
+
+    def _encoder(self) -> ColBERTEncoder:
+        if self.encoder is None:
+            raise ValueError("The ColBERT store needs an encoder to encode chunks and queries")
+        return self.encoder
+
+    def score(self, query: str, docs: List[Document]) -> List[float]:
+        """
+        Scores chunks against a query by MaxSim. Only the query is encoded for stored chunks; chunks that are
+        not stored are encoded on the fly without being added.
+
+        Args:
+            query (str): The query.
+            docs (List[Document]): The chunks.
+
+        Returns:
+            List[float]: The score of every chunk, equal to the score of the ColBERT ranker.
+        """
+        encoder = self._encoder()
+        matrices = [self.get(self.key(doc)) for doc in docs]
+        missing = [i for i, matrix in enumerate(matrices) if matrix is None]
+        annotate(precomputed=len(docs) - len(missing))
+        if missing:
+            for i, matrix in zip(missing, encoder.encode_documents([docs[i].page_content for i in missing])):
+                matrices[i] = matrix
+        query_embeddings, query_length = encoder.encode_query(query)
+        return maxsim(query_embeddings, query_length, matrices).tolist()
@@ -0,0 +1,227 @@
+import zlib
+import hashlib
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from langchain.docstore.document import Document
+from .embedding_cache import normalize_text
+
+DEDUPLICATION_METHODS = ("exact", "minhash", "simhash")
+# a Mersenne prime, so (a * x + b) mod p stays within uint64 for 31 bit a and x
+_PRIME = np.uint64((1 << 31) - 1)
+SOURCE_SEPARATOR = "|"
+
+
+@dataclass
+class DeduplicationReport:
+    """
+    The chunks removed by a ChunkDeduplicator.
+
+    Attributes:
+        chunks (int): The chunks seen.
+        kept (int): The chunks kept.
+        exact_duplicates (int): The chunks removed because their normalized text was already seen.
+        near_duplicates (int): The chunks removed because they were similar enough to a kept chunk.
+    """
+    chunks: int = 0
+    kept: int = 0
+    exact_duplicates: int = 0
+    near_duplicates: int = 0
+
+    @property
+    def removed(self) -> int:
+        return self.exact_duplicates + self.near_duplicates
+
+    @property
+    def embedding_calls_saved(self) -> int:
+        """
+        The texts that are not embedded, stored or reranked because they were removed.
+        """
+        return self.removed
+
+    @property
+    def saved_fraction(self) -> float:
+        return self.removed / self.chunks if self.chunks else 0.0
+
+
+def shingles(text: str, size: int) -> List[str]:
+    """
+    Returns the distinct word n-grams of a normalized text, or the text itself when it has fewer than size words.
+    """
+    words = text.lower().split()
+    if len(words) <= size:
+        return [" ".join(words)]
+    return list({" ".join(words[i:i + size]) for i in range(len(words) - size + 1)})
+
+
+class ChunkDeduplicator:
+    """
+    Removes duplicate chunks between splitting and indexing.
+
+    Exact duplicates are found by hashing the whitespace-normalized text. Near duplicates are found with
+    MinHash signatures bucketed by LSH bands, or with 64 bit SimHash fingerprints bucketed by blocks of bits,
+    and confirmed against the similarity threshold, so only chunks that share a bucket are compared.
+
+    The first chunk of every group is kept. Its metadata records the sources of the chunks merged into it
+    as `duplicate_sources`, joined by SOURCE_SEPARATOR so every vector store accepts it, and their number as
+    `duplicate_count`. The deduplicator is stateful: chunks of later calls are also compared with the chunks
+    kept by earlier calls, so an IngestionPipeline can deduplicate batch by batch. Provenance is only recorded
+    on chunks returned by the same call, the ones returned earlier may already be indexed. Neither key is part of
+    the chunk id, and an IngestionPipeline feeds files in sorted path order, so a re-run keeps the same chunks
+    under the same ids.
+
+    By default chunks are compared across files, so of the DOCX and PDF versions of a document only the chunks
+    of the first file are indexed, and a metadata filter on the name of the other file matches nothing: its name
+    is only kept inside `duplicate_sources`, which stores cannot filter on. Set scope to a metadata field such as
+    file_name to only compare chunks that share its value. Filters on that field then keep working, at the cost
+    of embedding and storing the duplicates of every other file.
+
+    Args:
+        method (str): exact, minhash or simhash.
+        threshold (float): The similarity above which chunks are near duplicates: the estimated Jaccard similarity of their word shingles for minhash, the fraction of equal fingerprint bits for simhash.
+        num_perm (int): The number of MinHash permutations.
+        shingle_size (int): The number of words per shingle.
+        seed (int): The seed of the MinHash permutations.
+        scope (Optional[str]): A metadata field whose value chunks must share to be duplicates, e.g. file_name. Chunks are compared across all values when None.
+    """
+    def __init__(self, method: str = "minhash", threshold: float = 0.85, num_perm: int = 128, shingle_size: int = 3, seed: int = 0, scope: Optional[str] = None):
+        if method not in DEDUPLICATION_METHODS:
+            raise ValueError('Invalid method value: Expecting one of exact, minhash or simhash')
+        if not 0 < threshold <= 1:
+            raise ValueError("threshold must be in (0, 1]")
+        self.method = method
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.scope = scope
+        self.report = DeduplicationReport()
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, int(_PRIME), size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, int(_PRIME), size=num_perm, dtype=np.uint64)
+        self._bands = self._band_slices()
+        self._exact: Dict[bytes, int] = {}
+        self._buckets: Dict[Tuple[str, int, bytes], List[int]] = {}
+        self._signatures: List = []
+
+    def _band_slices(self) -> List[slice]:
+        if self.method == "minhash":
+            # the LSH threshold (1/b)^(1/r) sits below the similarity threshold, trading extra candidate checks for fewer missed duplicates
+            rows = max((r for r in range(1, self.num_perm + 1) if (1 / (self.num_perm // r)) ** (1 / r) <= 0.9 * self.threshold), default=1)
+            return [slice(i * rows, (i + 1) * rows) for i in range(self.num_perm // rows)]
+        if self.method == "simhash":
+            # two fingerprints within max_distance bits agree on at least one of max_distance + 1 blocks
+            bounds = np.linspace(0, 64, self.max_distance + 2).astype(int)
+            return [slice(start, end) for start, end in zip(bounds[:-1], bounds[1:])]
+        return []
+
+    @property
+    def max_distance(self) -> int:
+        return int((1 - self.threshold) * 64)
+
+    def minhash(self, text: str) -> np.ndarray:
+        """
+        Returns the MinHash signature of a normalized text.
+        """
+        hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles(text, self.shingle_size)), dtype=np.uint64) % _PRIME
+        return ((self._a[:, None] * hashes[None, :] + self._b[:, None]) % _PRIME).min(axis=1).astype(np.uint32)
+
+    def simhash(self, text: str) -> np.ndarray:
+        """
+        Returns the SimHash fingerprint of a normalized text as 64 bits.
+        """
+        grams = [shingle.encode("utf-8") for shingle in shingles(text, self.shingle_size)]
+        hashes = np.array([(zlib.crc32(gram) << 32) | zlib.crc32(gram, 0x9E3779B9) for gram in grams], dtype=">u8")
+        bits = np.unpackbits(hashes.view(np.uint8).reshape(len(grams), 8), axis=1)
+        return (2 * bits.sum(axis=0, dtype=np.int64) > len(grams)).astype(np.uint8)
+
+    def _similarity(self, a: np.ndarray, b: np.ndarray) -> float:
+        return float(np.mean(a == b))
+
+    def _scope_value(self, doc: Document) -> str:
+        return "" if self.scope is None else repr(doc.metadata.get(self.scope))
+
+    def _match(self, signature: np.ndarray, scope: str) -> Optional[int]:
+        best, best_similarity = None, self.threshold
+        checked = set()
+        for i, band in enumerate(self._bands):
+            for candidate in self._buckets.get((scope, i, signature[band].tobytes()), ()):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                similarity = self._similarity(signature, self._signatures[candidate])
+                if similarity >= best_similarity:
+                    best, best_similarity = candidate, similarity
+        return best
+
+    def _insert(self, signature: Optional[np.ndarray], scope: str) -> int:
+        index = len(self._signatures)
+        self._signatures.append(signature)
+        for i, band in enumerate(self._bands):
+            self._buckets.setdefault((scope, i, signature[band].tobytes()), []).append(index)
+        return index
+
+    def deduplicate(self, docs: List[Document]) -> List[Document]:
+        """
+        Returns the chunks that are not duplicates of an earlier chunk, with the provenance of the chunks merged into them.
+
+        Args:
+            docs (List[Document]): The chunks, in the order they should be kept.
+
+        Returns:
+            List[Document]: Copies of the kept chunks.
+        """
+        kept: List[Document] = []
+        returned: Dict[int, Document] = {}
+        for doc in docs:
+            self.report.chunks += 1
+            text = normalize_text(doc.page_content)
+            scope = self._scope_value(doc)
+            key = hashlib.sha256(f"{scope}\0{text}".encode("utf-8")).digest()
+            target, signature = self._exact.get(key), None
+            if target is not None:
+                self.report.exact_duplicates += 1
+            elif self.method != "exact":
+                signature = self.minhash(text) if self.method == "minhash" else self.simhash(text)
+                target = self._match(signature, scope)
+                if target is not None:
+                    self.report.near_duplicates += 1
+                    self._exact[key] = target
+            if target is not None:
+                if target in returned:
+                    _merge_provenance(returned[target], doc)
+                continue
+
+            index = self._insert(signature, scope)
+            self._exact[key] = index
+            copy = Document(page_content=doc.page_content, metadata=dict(doc.metadata))
+            returned[index] = copy
+            kept.append(copy)
+            self.report.kept += 1
+        return kept
+
+
+def _merge_provenance(kept: Document, duplicate: Document):
+    source = str(duplicate.metadata.get("source", duplicate.metadata.get("file_name", "")))
+    sources = kept.metadata.get("duplicate_sources")
+    sources = sources.split(SOURCE_SEPARATOR) if sources else []
+    own = str(kept.metadata.get("source", kept.metadata.get("file_name", "")))
+    if source and source != own and source not in sources:
+        kept.metadata["duplicate_sources"] = SOURCE_SEPARATOR.join(sources + [source])
+    kept.metadata["duplicate_count"] = kept.metadata.get("duplicate_count", 0) + 1
+
+
+def deduplicate(docs: List[Document], method: str = "minhash", threshold: float = 0.85, **kwargs) -> Tuple[List[Document], DeduplicationReport]:
+    """
+    Removes the exact and near duplicate chunks of a list of chunks.
+
+    Args:
+        docs (List[Document]): The chunks.
+        method (str): exact, minhash or simhash.
+        threshold (float): The similarity above which chunks are near duplicates.
+        **kwargs: Additional arguments of the ChunkDeduplicator.
+
+    Returns:
+        Tuple[List[Document], DeduplicationReport]: The kept chunks and the number of chunks and embedding calls saved.
+    """
+    deduplicator = ChunkDeduplicator(method=method, threshold=threshold, **kwargs)
+    return deduplicator.deduplicate(docs), deduplicator.report
@@ -0,0 +1,190 @@
+import os
+import json
+import zlib
+import struct
+import threading
+import hashlib
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from langchain.docstore.document import Document
+
+FORMAT_VERSION = 1
+_HEADER_SIZE = struct.Struct("<I")
+
+
+def file_digest(file_path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Returns the sha256 of a file's content, read in chunks so large files are not loaded at once.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def encode_documents(docs: List[Document]) -> bytes:
+    """
+    Serializes documents column by column: one list of texts and one list of values per metadata field, zlib-compressed.
+
+    Metadata fields repeat the same keys and often the same values on every page, which the columnar layout
+    turns into long runs that compress far better than one JSON object per document.
+    """
+    columns: Dict[str, List[Any]] = {}
+    missing: Dict[str, List[int]] = {}
+    for row, doc in enumerate(docs):
+        for name in doc.metadata:
+            if name not in columns:
+                columns[name] = [None] * row
+                missing[name] = list(range(row))
+        for name, values in columns.items():
+            if name in doc.metadata:
+                values.append(doc.metadata[name])
+            else:
+                values.append(None)
+                missing[name].append(row)
+    payload = {"texts": [doc.page_content for doc in docs], "columns": columns, "missing": {name: rows for name, rows in missing.items() if rows}}
+    return zlib.compress(json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8"), 6)
+
+
+def decode_documents(data: bytes) -> List[Document]:
+    """
+    Deserializes documents written by encode_documents.
+    """
+    payload = json.loads(zlib.decompress(data))
+    missing = {name: set(rows) for name, rows in payload["missing"].items()}
+    columns = payload["columns"].items()
+    return [
+        Document(page_content=text, metadata={name: values[row] for name, values in columns if row not in missing.get(name, ())})
+        for row, text in enumerate(payload["texts"])
+    ]
+
+
+def read_header(entry: str) -> Optional[Tuple[Dict[str, Any], int]]:
+    """
+    Returns the JSON header of a cache entry and the offset of its body, or None when the entry is missing or unreadable.
+    """
+    try:
+        with open(entry, "rb") as f:
+            size, = _HEADER_SIZE.unpack(f.read(_HEADER_SIZE.size))
+            header = json.loads(f.read(size))
+    except (OSError, ValueError, struct.error):
+        return None
+    if header.get("version") != FORMAT_VERSION:
+        return None
+    return header, _HEADER_SIZE.size + size
+
+
+def read_body(entry: str, offset: int) -> bytes:
+    with open(entry, "rb") as f:
+        f.seek(offset)
+        return f.read()
+
+
+def write_entry(entry: str, header: Dict[str, Any], body: bytes):
+    """
+    Atomically writes a cache entry made of a length-prefixed JSON header followed by a body.
+    """
+    encoded = json.dumps({"version": FORMAT_VERSION, **header}).encode("utf-8")
+    tmp = f"{entry}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER_SIZE.pack(len(encoded)) + encoded + body)
+    os.replace(tmp, entry)
+
+
+@dataclass
+class CacheStats:
+    """
+    The lookups served by a DocumentCache.
+
+    Attributes:
+        hits (int): Lookups served from the cache.
+        misses (int): Lookups of files that were never cached or changed since.
+        rehashed (int): Hits whose size or mtime changed but whose content did not, e.g. a touched or copied file.
+    """
+    hits: int = 0
+    misses: int = 0
+    rehashed: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / (self.hits + self.misses) if self.hits + self.misses else 0.0
+
+
+class DocumentCache:
+    """
+    A persistent cache of parsed documents, so a file is only parsed again when its content changes.
+
+    Every file gets one entry named after the hash of its absolute path. The entry starts with a small JSON
+    header holding the file's size, mtime and content hash, followed by the columnar, compressed documents.
+    A lookup reads the header only: when size and mtime match the documents are decoded straight away,
+    otherwise the file is hashed and the entry is still served if the content is unchanged. Entries are
+    replaced atomically, so the parser processes of an IngestionPipeline can share one cache directory.
+
+    Args:
+        cache_dir (str): The directory where the entries are stored.
+    """
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self.stats = CacheStats()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry(self, file_path: str) -> str:
+        name = hashlib.sha1(os.path.abspath(file_path).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{name}.docs")
+
+    def is_fresh(self, file_path: str) -> bool:
+        """
+        Returns whether the file has an entry and its size and mtime are unchanged, without hashing it.
+        """
+        found = read_header(self._entry(file_path))
+        if found is None:
+            return False
+        stat = os.stat(file_path)
+        return (found[0]["size"], found[0]["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns)
+
+    def get(self, file_path: str) -> Optional[List[Document]]:
+        """
+        Returns the cached documents of a file, or None when the file was never cached or its content changed.
+
+        Args:
+            file_path (str): The path of the file.
+
+        Returns:
+            Optional[List[Document]]: The documents.
+        """
+        entry = self._entry(file_path)
+        found = read_header(entry)
+        if found is None:
+            self.stats.misses += 1
+            return None
+        header, offset = found
+        stat = os.stat(file_path)
+        if (header["size"], header["mtime_ns"]) != (stat.st_size, stat.st_mtime_ns):
+            if header["size"] != stat.st_size or header["sha256"] != file_digest(file_path):
+                self.stats.misses += 1
+                return None
+            self.stats.rehashed += 1
+            body = read_body(entry, offset)
+            write_entry(entry, {**header, "mtime_ns": stat.st_mtime_ns}, body)
+        else:
+            body = read_body(entry, offset)
+        self.stats.hits += 1
+        return decode_documents(body)
+
+    def put(self, file_path: str, docs: List[Document]):
+        """
+        Stores the parsed documents of a file, replacing any previous entry.
+
+        Args:
+            file_path (str): The path of the file.
+            docs (List[Document]): The documents parsed from the file.
+        """
+        stat = os.stat(file_path)
+        header = {"path": os.path.abspath(file_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": file_digest(file_path), "count": len(docs)}
+        write_entry(self._entry(file_path), header, encode_documents(docs))
+
+    def clear(self):
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".docs"):
+                os.remove(os.path.join(self.cache_dir, name))
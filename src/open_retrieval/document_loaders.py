@@ -1,21 +1,54 @@
-import bs4
+import os
 import logging
-from typing import Optional
-from langchain_community.document_loaders.csv_loader import CSVLoader   
-from langchain_community.document_loaders import JSONLoader, UnstructuredPDFLoader, WebBaseLoader,UnstructuredWordDocumentLoader,UnstructuredMarkdownLoader,UnstructuredHTMLLoader, UnstructuredPowerPointLoader
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Iterable, List, Optional, Tuple
+from langchain.docstore.document import Document
+from .document_cache import DocumentCache
+from .instrumentation import annotate, instrumented
+
+if TYPE_CHECKING:
+    from .web_loader import WebLoadReport
 
 logging.basicConfig(level=logging.INFO)
+
+
+@dataclass
+class DirectoryLoadReport:
+    """
+    The outcome of loading a directory.
+
+    Attributes:
+        files (int): The number of files in the directory.
+        parsed (int): The files that were parsed.
+        cache_hits (int): The files served from the document cache.
+        skipped (int): The unchanged files left out of the result.
+        failed_files (List[str]): The files that could not be loaded.
+    """
+    files: int = 0
+    parsed: int = 0
+    cache_hits: int = 0
+    skipped: int = 0
+    failed_files: List[str] = field(default_factory=list)
+
+
 class DocumentLoader:
     """
     This class is used to load documents from different sources and return them as a list of strings.
     The supported sources include CSV, JSON, PDF, HTML, Markdown, Word and Powerpoint documents.
+
+    With a cache_dir, parsed files are stored in a DocumentCache and only parsed again when their content changes.
     """
-    def __init__(self) -> None:
+    def __init__(self, cache_dir: Optional[str] = None) -> None:
         """
         Initialize the DocumentLoader class.
+
+        Args:
+            cache_dir (Optional[str]): The directory of a persistent cache of parsed documents. Defaults to None.
         """
         self.logger = logging.getLogger(__name__)
+        self.cache = DocumentCache(cache_dir) if cache_dir else None
     
+    @instrumented("document_loader.load", lambda result, *args, **kwargs: {"items": len(result) if isinstance(result, list) else 0, "failed": not isinstance(result, list)})
     def load(self, file_path: Optional[str]= None, url_path: Optional[str] = None):
             
         """
@@ -32,23 +65,37 @@ class DocumentLoader:
             ValueError: If neither file_path nor url_path is provided.
         """
         if file_path is not None:
+            if self.cache is not None:
+                cached = self.cache.get(file_path)
+                annotate(cache_hit=cached is not None)
+                if cached is not None:
+                    return cached
             try:
                 if file_path.endswith('.csv'):
+                    from langchain_community.document_loaders.csv_loader import CSVLoader
                     loader = CSVLoader(file_path)
                 elif file_path.endswith('.json'):
+                    from langchain_community.document_loaders import JSONLoader
                     loader = JSONLoader(file_path)
                 elif file_path.endswith('.pdf'):
+                    from langchain_community.document_loaders import UnstructuredPDFLoader
                     loader =  UnstructuredPDFLoader(file_path)
                 elif file_path.endswith('.html') or file_path.endswith('.htm'):
+                    from langchain_community.document_loaders import UnstructuredHTMLLoader
                     loader = UnstructuredHTMLLoader(file_path)
                 elif file_path.endswith('.md'):
+                    from langchain_community.document_loaders import UnstructuredMarkdownLoader
                     loader = UnstructuredMarkdownLoader(file_path)
                 elif file_path.endswith('.docx') or file_path.endswith('.doc'):
+                    from langchain_community.document_loaders import UnstructuredWordDocumentLoader
                     loader = UnstructuredWordDocumentLoader(file_path)
                 elif file_path.endswith('pptx'):
+                    from langchain_community.document_loaders import UnstructuredPowerPointLoader
                     loader = UnstructuredPowerPointLoader(file_path)
 
                 data = loader.load_and_split()
+                if self.cache is not None:
+                    self.cache.put(file_path, data)
                 return data
             except Exception as e:
                 self.logger.error(f"Error loading the file: {e}")
@@ -56,11 +103,62 @@ class DocumentLoader:
             
         elif url_path is not None:
             try:
+                import bs4
+                from langchain_community.document_loaders import WebBaseLoader
                 bs_strainer = bs4.SoupStrainer(class_=("post-content", "post-title", "post-header"))
-                loader = WebBaseLoader(web_paths = (url_path), bs_kwargs = {"parse_only": bs_strainer})
+                loader = WebBaseLoader(web_paths = (url_path,), bs_kwargs = {"parse_only": bs_strainer})
                 data = loader.load()
                 return data
             except Exception as e:
                 self.logger.error(f"Error loading the url: {e}")
                 return "Error loading the url. Please make sure you have provided a valid url"
-            
\ No newline at end of file
+            
+    def load_directory(self, directory: str, skip_unchanged: bool = False) -> Tuple[List[Document], DirectoryLoadReport]:
+        """
+        Loads every file of a directory, serving unchanged files from the document cache.
+
+        Args:
+            directory (str): The directory containing the files.
+            skip_unchanged (bool): Whether to leave out files whose cache entry matches their size and mtime, e.g. when their chunks are already indexed. Requires a cache_dir.
+
+        Returns:
+            Tuple[List[Document], DirectoryLoadReport]: The documents and the number of files parsed, served from the cache and skipped.
+        """
+        if skip_unchanged and self.cache is None:
+            raise ValueError("skip_unchanged needs a DocumentLoader with a cache_dir")
+        file_paths = sorted(os.path.join(directory, filename) for filename in os.listdir(directory))
+        report = DirectoryLoadReport()
+        docs: List[Document] = []
+        for file_path in file_paths:
+            if not os.path.isfile(file_path):
+                continue
+            report.files += 1
+            if skip_unchanged and self.cache.is_fresh(file_path):
+                report.skipped += 1
+                continue
+            hits = self.cache.stats.hits if self.cache is not None else 0
+            data = self.load(file_path)
+            if not isinstance(data, list):
+                report.failed_files.append(file_path)
+                continue
+            if self.cache is not None and self.cache.stats.hits > hits:
+                report.cache_hits += 1
+            else:
+                report.parsed += 1
+            docs.extend(data)
+        self.logger.info(f"Loaded {report.files} files from {directory}: {report.parsed} parsed, {report.cache_hits} from cache, {report.skipped} skipped")
+        return docs, report
+
+    def load_urls(self, urls: Iterable[str], **kwargs) -> Tuple[List[Document], "WebLoadReport"]:
+        """
+        Loads many URLs concurrently with a pooled, rate-limited HTTP client. See WebLoader for the options.
+
+        Args:
+            urls (Iterable[str]): The URLs to load.
+            **kwargs: Arguments of the WebLoader, e.g. cache_dir to skip pages the server reports unchanged.
+
+        Returns:
+            Tuple[List[Document], WebLoadReport]: The documents and the number of pages fetched, unchanged and failed.
+        """
+        from .web_loader import WebLoader
+        return WebLoader(**kwargs).load(urls)
@@ -0,0 +1,291 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional, Sequence, Set
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalizes a chunk of text before hashing so that whitespace-only differences share a cache entry.
+
+    Args:
+        text (str): The text to normalize.
+
+    Returns:
+        str: The normalized text.
+    """
+    return " ".join(text.split())
+
+
+def content_key(provider: str, model_name: str, text: str) -> bytes:
+    """
+    Computes the 16 byte cache key of a chunk for a given provider and model.
+
+    Args:
+        provider (str): The name of the embedding provider.
+        model_name (str): The name of the embedding model.
+        text (str): The chunk text.
+
+    Returns:
+        bytes: The cache key.
+    """
+    payload = "\x00".join([provider, model_name, normalize_text(text)])
+    return hashlib.sha256(payload.encode("utf-8")).digest()[:16]
+
+
+def embed_queries(embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+    """
+    Embeds queries with the query path of an embedding function, keeping its query prefix or instruction.
+    Uses its batched embed_queries when it has one, and calls embed_query per query otherwise.
+
+    Args:
+        embeddings (Embeddings): The embedding function.
+        texts (List[str]): The queries.
+
+    Returns:
+        List[List[float]]: The embeddings of the queries.
+    """
+    batched = getattr(embeddings, "embed_queries", None)
+    if batched is not None:
+        return batched(texts)
+    return [embeddings.embed_query(text) for text in texts]
+
+
+class EmbeddingCache:
+    """
+    A persistent, size-bounded LRU cache of embedding vectors.
+
+    The vectors are stored in a fixed-capacity memory-mapped matrix next to a matrix of 16 byte keys
+    and a recency clock per slot, so lookups only touch the rows that are actually requested.
+
+    Args:
+        cache_dir (str): The directory where the cache files are stored.
+        max_entries (int): The maximum number of vectors kept before the least recently used ones are evicted.
+        dtype (str): The storage precision of the vectors, either float32 or float16.
+    """
+    KEY_BYTES = 16
+
+    def __init__(self, cache_dir: str, max_entries: int = 100_000, dtype: str = "float32"):
+        if dtype not in ("float32", "float16"):
+            raise ValueError('Invalid dtype value: Expecting one of float32 or float16')
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.dtype = dtype
+        self.dimension: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._slots: Dict[bytes, int] = {}
+        self._clock = 0
+        self._keys = None
+        self._vectors = None
+        self._last_used = None
+        os.makedirs(cache_dir, exist_ok=True)
+        if os.path.exists(self._path("header.json")):
+            self._open()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.cache_dir, name)
+
+    def _memmap(self, name: str, dtype, shape, mode: str):
+        return np.memmap(self._path(name), dtype=dtype, mode=mode, shape=shape)
+
+    def _open(self):
+        with open(self._path("header.json")) as f:
+            header = json.load(f)
+        if header["max_entries"] != self.max_entries or header["dtype"] != self.dtype:
+            self.logger.info(f"Reusing the existing embedding cache layout in {self.cache_dir}: {header}")
+        self.max_entries = header["max_entries"]
+        self.dtype = header["dtype"]
+        self.dimension = header["dimension"]
+        self._map_files("r+")
+        used = np.flatnonzero(self._last_used)
+        self._slots = {self._keys[slot].tobytes(): int(slot) for slot in used}
+        self._clock = int(self._last_used.max()) if len(used) else 0
+
+    def _create(self, dimension: int):
+        self.dimension = dimension
+        with open(self._path("header.json"), "w") as f:
+            json.dump({"dimension": dimension, "dtype": self.dtype, "max_entries": self.max_entries}, f)
+        self._map_files("w+")
+
+    def _map_files(self, mode: str):
+        self._keys = self._memmap("keys.bin", np.uint8, (self.max_entries, self.KEY_BYTES), mode)
+        self._vectors = self._memmap("vectors.bin", self.dtype, (self.max_entries, self.dimension), mode)
+        self._last_used = self._memmap("last_used.bin", np.int64, (self.max_entries,), mode)
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def get_many(self, keys: Sequence[bytes]) -> List[Optional[np.ndarray]]:
+        """
+        Looks up the vectors of the given keys and marks them as recently used.
+
+        Args:
+            keys (Sequence[bytes]): The cache keys.
+
+        Returns:
+            List[Optional[np.ndarray]]: A float32 copy of the vector of every key, or None on a miss.
+        """
+        results: List[Optional[np.ndarray]] = []
+        with self._lock:
+            for key in keys:
+                slot = self._slots.get(key)
+                if slot is None:
+                    self.misses += 1
+                    results.append(None)
+                    continue
+                self.hits += 1
+                self._clock += 1
+                self._last_used[slot] = self._clock
+                # copy, the slot may be evicted and overwritten before the caller reads it
+                results.append(np.array(self._vectors[slot], dtype=np.float32))
+        return results
+
+    def put_many(self, keys: Sequence[bytes], vectors: Sequence[Sequence[float]], protected: Sequence[bytes] = ()):
+        """
+        Stores vectors in the cache, evicting the least recently used entries when the cache is full.
+
+        Args:
+            keys (Sequence[bytes]): The cache keys.
+            vectors (Sequence[Sequence[float]]): The vectors to store, one per key.
+            protected (Sequence[bytes]): Keys that must not be evicted, such as the hits of the same batch. New keys that do not fit beside them are not stored.
+        """
+        if not keys:
+            return
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if len(keys) > self.max_entries:
+            keys, matrix = keys[-self.max_entries:], matrix[-self.max_entries:]
+        with self._lock:
+            if self.dimension is None:
+                self._create(matrix.shape[1])
+            elif matrix.shape[1] != self.dimension:
+                raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match the cache dimension {self.dimension}")
+
+            new: Dict[bytes, int] = {}
+            for i, key in enumerate(keys):
+                slot = self._slots.get(key)
+                if slot is None:
+                    new[key] = i
+                    continue
+                self._clock += 1
+                self._vectors[slot] = matrix[i]
+                self._last_used[slot] = self._clock
+
+            keep = {self._slots[key] for key in list(protected) + list(keys) if key in self._slots}
+            for (key, i), slot in zip(new.items(), self._free_slots(len(new), keep)):
+                if self._last_used[slot]:
+                    del self._slots[self._keys[slot].tobytes()]
+                    self.evictions += 1
+                self._clock += 1
+                self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+                self._vectors[slot] = matrix[i]
+                self._last_used[slot] = self._clock
+                self._slots[key] = int(slot)
+
+    def _free_slots(self, count: int, keep: Set[int]) -> np.ndarray:
+        if count == 0:
+            return np.empty(0, dtype=np.int64)
+        empty = np.flatnonzero(self._last_used == 0)[:count]
+        if len(empty) == count:
+            return empty
+        used = np.flatnonzero(self._last_used)
+        if keep:
+            used = used[~np.isin(used, list(keep))]
+        needed = min(count - len(empty), len(used))
+        if needed == 0:
+            return empty
+        oldest = used[np.argpartition(self._last_used[used], needed - 1)[:needed]]
+        return np.concatenate([empty, oldest])
+
+    def flush(self):
+        """
+        Flushes the memory-mapped files to disk.
+        """
+        with self._lock:
+            for array in (self._keys, self._vectors, self._last_used):
+                if array is not None:
+                    array.flush()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns the hit/miss counters of the cache.
+
+        Returns:
+            Dict[str, float]: The hits, misses, hit rate, evictions and number of cached vectors.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "size": len(self._slots),
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    An embedding function that serves document embeddings from an EmbeddingCache and only embeds cache misses.
+
+    Args:
+        embeddings (Embeddings): The embedding function to wrap.
+        cache (EmbeddingCache): The cache to read from and write to.
+        provider (str): The name of the embedding provider, part of the cache key.
+        model_name (str): The name of the embedding model, part of the cache key.
+    """
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, provider: str, model_name: str):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.provider = provider
+        self.model_name = model_name
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds a list of documents, computing only the ones that are not cached yet.
+
+        Args:
+            texts (List[str]): The texts to embed.
+
+        Returns:
+            List[List[float]]: The embeddings of the texts.
+        """
+        keys = [content_key(self.provider, self.model_name, text) for text in texts]
+        vectors = self.cache.get_many(keys)
+
+        missing: Dict[bytes, str] = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None:
+                missing.setdefault(key, text)
+        if missing:
+            computed = self.embeddings.embed_documents(list(missing.values()))
+            hits = [key for key, vector in zip(keys, vectors) if vector is not None]
+            self.cache.put_many(list(missing.keys()), computed, protected=hits)
+            self.cache.flush()
+            by_key = dict(zip(missing.keys(), computed))
+            vectors = [by_key[key] if vector is None else vector for key, vector in zip(keys, vectors)]
+        return [[float(x) for x in vector] for vector in vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embeds a query with the wrapped embedding function, queries are not cached.
+
+        Args:
+            text (str): The query to embed.
+
+        Returns:
+            List[float]: The embedding of the query.
+        """
+        return self.embeddings.embed_query(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds queries with the wrapped embedding function, queries are not cached.
+        """
+        return embed_queries(self.embeddings, texts)
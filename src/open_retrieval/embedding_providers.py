@@ -1,9 +1,54 @@
-from typing import Optional, Union
-from langchain_community.embeddings import FastEmbedEmbeddings, HuggingFaceEmbeddings, OllamaEmbeddings
+import os
+import json
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Hashable, Optional, Tuple, Union
+from .embedding_cache import CachedEmbeddings, EmbeddingCache
+
+if TYPE_CHECKING:
+    from langchain_community.embeddings import FastEmbedEmbeddings, HuggingFaceEmbeddings
+    from .ollama_embeddings import OllamaEmbeddingClient
+    from .onnx_embeddings import OnnxEmbeddings
+
+_registry: Dict[Hashable, Any] = {}
+_registry_locks: Dict[Hashable, threading.Lock] = {}
+_registry_lock = threading.Lock()
+_caches: Dict[str, EmbeddingCache] = {}
+
+
+def registry_key(provider: str, model_name: Optional[str], embedding_kwargs: Optional[Dict[str, Any]] = None) -> Tuple[str, Optional[str], str]:
+    """
+    Returns the key of an embedding model in the process-wide registry.
+    """
+    return provider, model_name, json.dumps(embedding_kwargs or {}, sort_keys=True, default=str)
+
+
+def shared_embedding_cache(cache_dir: str, max_entries: int = 100_000, dtype: str = "float32") -> EmbeddingCache:
+    """
+    Returns the process-wide EmbeddingCache of a directory. Instances on the same directory would share the
+    memory-mapped files but not the slot index, and overwrite each other's entries.
+    """
+    path = os.path.abspath(cache_dir)
+    with _registry_lock:
+        if path not in _caches:
+            _caches[path] = EmbeddingCache(cache_dir, max_entries=max_entries, dtype=dtype)
+        return _caches[path]
+
+
+def clear_model_registry():
+    """
+    Drops every shared embedding model and embedding cache, releasing its memory once no caller holds a reference.
+    """
+    with _registry_lock:
+        _registry.clear()
+        _registry_locks.clear()
+        _caches.clear()
+
 
 class EmbeddingProvider:
     """
     A class that provides different embedding functions based on the embedding_provider specified in the settings file.
+
+    Embedding models are loaded once per process for every (provider, model, kwargs) and shared by every caller.
     """
     def __init__(self, embedding_provider: str):
         """
@@ -14,37 +59,98 @@ class EmbeddingProvider:
         """
         self.embedding_provider = embedding_provider
 
-    def get_embedding_function(self, model_name: Optional[str] = None)-> Union[FastEmbedEmbeddings, HuggingFaceEmbeddings, OllamaEmbeddings]:
+    def get_embedding_function(self, model_name: Optional[str] = None, cache_dir: Optional[str] = None, cache_size: int = 100_000, cache_dtype: str = "float32", embedding_kwargs: Optional[Dict[str, Any]] = None, shared: bool = True)-> Union["FastEmbedEmbeddings", "HuggingFaceEmbeddings", "OllamaEmbeddingClient", "OnnxEmbeddings", CachedEmbeddings]:
         """
         Get the embedding function based on the embedding_provider and model_name.
 
         Args:
             model_name (str, optional): The name of the model. Defaults to None.
+            cache_dir (str, optional): The directory of a persistent embedding cache. When set, document embeddings are served from the cache and only new chunks are embedded. Vectors are cached per provider, model and embedding_kwargs. Defaults to None.
+            cache_size (int, optional): The maximum number of cached vectors. Defaults to 100000.
+            cache_dtype (str, optional): The storage precision of the cached vectors, float32 or float16. Defaults to float32.
+            embedding_kwargs (Dict[str, Any], optional): Extra arguments passed to the embedding class. Defaults to None.
+            shared (bool, optional): Whether to reuse the model already loaded by this process for the same provider, model and kwargs. Defaults to True.
 
         Returns:
             The embedding function.
         """
+        if shared:
+            embedding_function = self._shared_embedding_function(model_name, embedding_kwargs)
+        else:
+            embedding_function = self._create_embedding_function(model_name, embedding_kwargs)
+        if cache_dir is None:
+            return embedding_function
+
+        resolved_name = str(model_name or getattr(embedding_function, "model_name", None) or getattr(embedding_function, "model", None))
+        if embedding_kwargs:
+            # prefixes, pooling or quantization change the vectors, so every configuration gets its own entries
+            resolved_name += "\x00" + registry_key(self.embedding_provider, model_name, embedding_kwargs)[2]
+        cache = shared_embedding_cache(cache_dir, max_entries=cache_size, dtype=cache_dtype)
+        return CachedEmbeddings(embedding_function, cache, provider=self.embedding_provider, model_name=resolved_name)
+
+    def warm_up(self, model_name: Optional[str] = None, embedding_kwargs: Optional[Dict[str, Any]] = None):
+        """
+        Loads a model into the registry and embeds a short text, so the first query does not pay for model loading or lazy initialization.
+
+        Args:
+            model_name (str, optional): The name of the model. Defaults to None.
+            embedding_kwargs (Dict[str, Any], optional): Extra arguments passed to the embedding class. Defaults to None.
+
+        Returns:
+            The shared embedding function.
+        """
+        embedding_function = self._shared_embedding_function(model_name, embedding_kwargs)
+        embedding_function.embed_query("warm up")
+        return embedding_function
+
+    def _shared_embedding_function(self, model_name: Optional[str], embedding_kwargs: Optional[Dict[str, Any]]):
+        key = registry_key(self.embedding_provider, model_name, embedding_kwargs)
+        with _registry_lock:
+            if key in _registry:
+                return _registry[key]
+            lock = _registry_locks.setdefault(key, threading.Lock())
+        # loading can take seconds, so only callers of the same model wait for it
+        with lock:
+            if key not in _registry:
+                embedding_function = self._create_embedding_function(model_name, embedding_kwargs)
+                with _registry_lock:
+                    _registry[key] = embedding_function
+            return _registry[key]
+
+    def _create_embedding_function(self, model_name: Optional[str] = None, embedding_kwargs: Optional[Dict[str, Any]] = None):
+        embedding_kwargs = dict(embedding_kwargs or {})
         if self.embedding_provider == "huggingface":
+            from langchain_community.embeddings import HuggingFaceEmbeddings
             if model_name:
-                return HuggingFaceEmbeddings(model_name=model_name)
+                return HuggingFaceEmbeddings(model_name=model_name, **embedding_kwargs)
             else:
-                model_kwargs = {'trust_remote_code': True}
-                return HuggingFaceEmbeddings(model_name='Alibaba-NLP/gte-large-en-v1.5',model_kwargs = model_kwargs)
+                model_kwargs = {'trust_remote_code': True, **embedding_kwargs.pop('model_kwargs', {})}
+                return HuggingFaceEmbeddings(model_name='Alibaba-NLP/gte-large-en-v1.5',model_kwargs = model_kwargs, **embedding_kwargs)
 
         elif self.embedding_provider == "ollama":
+            from .ollama_embeddings import OllamaEmbeddingClient
+            # the prefixes and argument names of langchain's OllamaEmbeddings, so existing indexes are queried the same way
+            embedding_kwargs.setdefault("query_prefix", embedding_kwargs.pop("query_instruction", "query: "))
+            embedding_kwargs.setdefault("document_prefix", embedding_kwargs.pop("embed_instruction", "passage: "))
             if model_name:
-                return OllamaEmbeddings(model_name)
+                return OllamaEmbeddingClient(model=model_name, **embedding_kwargs)
             else:
-                return OllamaEmbeddings()
+                return OllamaEmbeddingClient(**embedding_kwargs)
 
 
         elif self.embedding_provider == 'fastembed':
+            from langchain_community.embeddings import FastEmbedEmbeddings
             # Assuming FastEmbedEmbeddings doesn't require any API key
             if model_name:
-                return FastEmbedEmbeddings(model_name = model_name)
+                return FastEmbedEmbeddings(model_name = model_name, **embedding_kwargs)
             else:
-                return FastEmbedEmbeddings(model_name = "BAAI/bge-large-en-v1.5")
+                return FastEmbedEmbeddings(model_name = "BAAI/bge-large-en-v1.5", **embedding_kwargs)
+
+        elif self.embedding_provider == 'onnx':
+            from .onnx_embeddings import OnnxEmbeddings
+            # CPU inference of an exported ONNX graph, pass quantize=True for int8 weights
+            return OnnxEmbeddings(model_name = model_name or "BAAI/bge-large-en-v1.5", **embedding_kwargs)
 
         else:
             raise ValueError(
-                f"Embedding provider {self.embedding_provider} is not supported. We currently support huggingface, fastembed and ollama as embedding providers")
\ No newline at end of file
+                f"Embedding provider {self.embedding_provider} is not supported. We currently support huggingface, fastembed, ollama and onnx as embedding providers")
@@ -0,0 +1,133 @@
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+import operator
+import numpy as np
+from langchain.docstore.document import Document
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.faiss import dependable_faiss_import
+from langchain_community.vectorstores.utils import DistanceStrategy
+from .caches import bump_index_version
+from .metadata_index import MetadataIndex, encode_value, is_simple_filter
+
+
+class PrefilteredFAISS(FAISS):
+    """
+    A FAISS vector store that applies metadata filters before scoring instead of after.
+
+    The langchain FAISS store searches the fetch_k nearest vectors and drops the ones that do not match the
+    filter, so a selective filter returns fewer than k results, or none. This store resolves equality and list
+    filters through a MetadataIndex of the docstore and restricts the search to the matching rows with a faiss
+    IDSelector, so it returns k results whenever k rows match. Filters on a single value of a partition field,
+    such as file_name, are served from a small flat index of that partition's vectors, built on first use.
+
+    Callable filters and filters with operators fall back to the post-filtering search of FAISS.
+
+    Args:
+        partition_fields (Sequence[str]): The high-cardinality metadata fields that get per-value sub-indexes.
+    """
+    def __init__(self, *args: Any, partition_fields: Sequence[str] = ("file_name",), **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.partition_fields = tuple(partition_fields)
+        self._metadata_index: Optional[MetadataIndex] = None
+        self._partitions: Dict[Tuple[str, str], Tuple[Any, np.ndarray]] = {}
+
+    @property
+    def metadata_index(self) -> MetadataIndex:
+        if self._metadata_index is None:
+            self._metadata_index = MetadataIndex.from_metadatas((row, self.docstore.search(id_).metadata) for row, id_ in self.index_to_docstore_id.items())
+        return self._metadata_index
+
+    def _invalidate(self):
+        # row ids shift on delete, so the postings and partitions are rebuilt on the next filtered search
+        self._metadata_index = None
+        self._partitions = {}
+        bump_index_version(self)
+
+    def add_texts(self, *args: Any, **kwargs: Any) -> List[str]:
+        ids = super().add_texts(*args, **kwargs)
+        self._invalidate()
+        return ids
+
+    async def aadd_texts(self, *args: Any, **kwargs: Any) -> List[str]:
+        ids = await super().aadd_texts(*args, **kwargs)
+        self._invalidate()
+        return ids
+
+    def add_embeddings(self, *args: Any, **kwargs: Any) -> List[str]:
+        ids = super().add_embeddings(*args, **kwargs)
+        self._invalidate()
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        deleted = super().delete(ids, **kwargs)
+        self._invalidate()
+        return deleted
+
+    def merge_from(self, target: FAISS) -> None:
+        super().merge_from(target)
+        self._invalidate()
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[Union[Callable, Dict[str, Any]]] = None, fetch_k: int = 20, **kwargs: Any) -> List[Tuple[Document, float]]:
+        """
+        Returns the k documents closest to an embedding that match the filter, with their scores.
+
+        Args:
+            embedding (List[float]): The query embedding.
+            k (int): The number of documents to return.
+            filter (Optional[Union[Callable, Dict[str, Any]]]): Metadata values the results must match. A list value matches any of its items.
+            fetch_k (int): The number of documents fetched before post-filtering, only used for callable filters.
+            **kwargs: May include score_threshold.
+
+        Returns:
+            List[Tuple[Document, float]]: The documents and their distances, or similarities for inner product indexes.
+        """
+        if filter is None or not is_simple_filter(filter):
+            return super().similarity_search_with_score_by_vector(embedding, k, filter, fetch_k, **kwargs)
+        faiss = dependable_faiss_import()
+        rows = self.metadata_index.rows(filter)
+        if k <= 0 or len(rows) == 0:
+            return []
+        vector = np.array([embedding], dtype=np.float32)
+        if self._normalize_L2:
+            faiss.normalize_L2(vector)
+        try:
+            scores, indices = self._filtered_search(faiss, vector, min(k, len(rows)), rows, filter)
+        except RuntimeError:
+            # the index type does not support search parameters
+            return super().similarity_search_with_score_by_vector(embedding, k, filter, fetch_k, **kwargs)
+        docs = [(self.docstore.search(self.index_to_docstore_id[int(i)]), score) for score, i in zip(scores, indices) if i != -1]
+
+        score_threshold = kwargs.get("score_threshold")
+        if score_threshold is not None:
+            cmp = operator.ge if self.distance_strategy in (DistanceStrategy.MAX_INNER_PRODUCT, DistanceStrategy.JACCARD) else operator.le
+            docs = [(doc, score) for doc, score in docs if cmp(score, score_threshold)]
+        return docs[:k]
+
+    def _filtered_search(self, faiss, vector: np.ndarray, k: int, rows: np.ndarray, filter: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+        partition = self._partition(faiss, filter)
+        if partition is not None:
+            index, partition_rows = partition
+            scores, local = index.search(vector, k)
+            return scores[0], np.where(local[0] == -1, -1, partition_rows[local[0]])
+        selector = faiss.IDSelectorBatch(rows)
+        if isinstance(self.index, faiss.IndexIVF):
+            scores, indices = self.index.search(vector, k, params=faiss.SearchParametersIVF(sel=selector, nprobe=self.index.nprobe))
+            if (indices[0] == -1).any() and self.index.nprobe < self.index.nlist:
+                # the probed lists hold fewer than k matching rows, so probe every list
+                scores, indices = self.index.search(vector, k, params=faiss.SearchParametersIVF(sel=selector, nprobe=self.index.nlist))
+        else:
+            scores, indices = self.index.search(vector, k, params=faiss.SearchParameters(sel=selector))
+        return scores[0], indices[0]
+
+    def _partition(self, faiss, filter: Dict[str, Any]) -> Optional[Tuple[Any, np.ndarray]]:
+        if len(filter) != 1 or not isinstance(self.index, faiss.IndexFlat):
+            return None
+        (name, value), = filter.items()
+        if name not in self.partition_fields or isinstance(value, list):
+            return None
+        key = (name, encode_value(value))
+        if key not in self._partitions:
+            rows = self.metadata_index.rows(filter)
+            index = faiss.IndexFlat(self.index.d, self.index.metric_type)
+            index.add(self.index.reconstruct_batch(rows))
+            self._partitions[key] = (index, rows)
+        return self._partitions[key]
@@ -0,0 +1,60 @@
+import hashlib
+from typing import Callable, Dict, List, Optional, Tuple
+from langchain.docstore.document import Document
+
+
+def content_hash(doc: Document) -> str:
+    """
+    Returns the hash of a chunk's text, used to recognise the same chunk across result lists.
+    """
+    return hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int = 60, key: Callable[[Document], str] = content_hash) -> List[Tuple[Document, float]]:
+    """
+    Fuses ranked result lists with reciprocal rank fusion, score = sum over lists of 1 / (k + rank).
+
+    Args:
+        rankings (List[List[Document]]): The ranked result lists.
+        k (int): The rank smoothing constant.
+        key (Callable[[Document], str]): Identifies the same chunk across lists.
+
+    Returns:
+        List[Tuple[Document, float]]: The deduplicated chunks sorted by fused score.
+    """
+    docs: Dict[str, Document] = {}
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            doc_key = key(doc)
+            docs.setdefault(doc_key, doc)
+            scores[doc_key] = scores.get(doc_key, 0.0) + 1.0 / (k + rank)
+    return sorted(((docs[doc_key], score) for doc_key, score in scores.items()), key=lambda x: x[1], reverse=True)
+
+
+def weighted_score_fusion(results: List[List[Tuple[Document, float]]], weights: Optional[List[float]] = None, key: Callable[[Document], str] = content_hash) -> List[Tuple[Document, float]]:
+    """
+    Fuses scored result lists by min-max normalizing the scores of every list and summing them with weights.
+
+    Args:
+        results (List[List[Tuple[Document, float]]]): The scored result lists, higher scores are better.
+        weights (Optional[List[float]]): The weight of every list. Defaults to equal weights.
+        key (Callable[[Document], str]): Identifies the same chunk across lists.
+
+    Returns:
+        List[Tuple[Document, float]]: The deduplicated chunks sorted by fused score.
+    """
+    weights = weights or [1.0] * len(results)
+    docs: Dict[str, Document] = {}
+    scores: Dict[str, float] = {}
+    for scored, weight in zip(results, weights):
+        if not scored:
+            continue
+        values = [score for _, score in scored]
+        low, high = min(values), max(values)
+        for doc, score in scored:
+            doc_key = key(doc)
+            docs.setdefault(doc_key, doc)
+            normalized = (score - low) / (high - low) if high > low else 1.0
+            scores[doc_key] = scores.get(doc_key, 0.0) + weight * normalized
+    return sorted(((docs[doc_key], score) for doc_key, score in scores.items()), key=lambda x: x[1], reverse=True)
@@ -0,0 +1,108 @@
+import os
+import json
+import uuid
+import hashlib
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+from langchain.docstore.document import Document
+
+# metadata a ChunkDeduplicator records on kept chunks, which depends on the order chunks are seen in
+PROVENANCE_KEYS = ("duplicate_sources", "duplicate_count")
+
+
+@dataclass
+class SyncReport:
+    """
+    The outcome of an incremental index sync.
+
+    Attributes:
+        added (int): The number of chunks embedded and inserted.
+        skipped (int): The number of chunks that were already indexed.
+        removed (int): The number of chunks deleted from the index.
+    """
+    added: int = 0
+    skipped: int = 0
+    removed: int = 0
+
+
+def chunk_id(doc: Document) -> str:
+    """
+    Computes a stable id of a chunk from its source, content and metadata. The provenance keys of deduplicated
+    chunks are left out, so a chunk keeps its id whichever of its duplicates were merged into it.
+
+    Args:
+        doc (Document): The chunk.
+
+    Returns:
+        str: The chunk id formatted as a UUID so that it is accepted by every backend.
+    """
+    metadata = json.dumps({key: value for key, value in doc.metadata.items() if key not in PROVENANCE_KEYS}, sort_keys=True, default=str)
+    payload = "\x00".join([str(doc.metadata.get("source", "")), doc.page_content, metadata])
+    return str(uuid.UUID(bytes=hashlib.sha256(payload.encode("utf-8")).digest()[:16]))
+
+
+def source_mtime(source: str) -> Optional[float]:
+    """
+    Returns the modification time of a source file, or None when the source is not a local file.
+    """
+    return os.path.getmtime(source) if source and os.path.isfile(source) else None
+
+
+class IndexManifest:
+    """
+    A record of the chunks stored in a persisted index, saved as JSON next to the index.
+
+    Every chunk is tracked by its content hash together with its source, and every source
+    by its modification time at indexing time, so a later sync only embeds what changed.
+
+    Args:
+        path (str): The path of the manifest file.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.chunks: Dict[str, str] = {}
+        self.sources: Dict[str, Optional[float]] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.chunks = data["chunks"]
+            self.sources = data["sources"]
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def stale_sources(self, paths: Iterable[str]) -> List[str]:
+        """
+        Returns the paths that are new or were modified since they were last indexed.
+
+        Args:
+            paths (Iterable[str]): The source file paths to check.
+
+        Returns:
+            List[str]: The paths that need to be loaded again.
+        """
+        return [path for path in paths if path not in self.sources or self.sources[path] != source_mtime(path)]
+
+    def update(self, docs: Dict[str, Document], removed: Iterable[str]):
+        """
+        Records added chunks and forgets removed ones.
+
+        Args:
+            docs (Dict[str, Document]): The chunks that are now indexed, keyed by chunk id.
+            removed (Iterable[str]): The ids of the chunks deleted from the index.
+        """
+        for id_ in removed:
+            self.chunks.pop(id_, None)
+        for id_, doc in docs.items():
+            source = str(doc.metadata.get("source", ""))
+            self.chunks[id_] = source
+            self.sources[source] = source_mtime(source)
+        live_sources = set(self.chunks.values())
+        self.sources = {source: mtime for source, mtime in self.sources.items() if source in live_sources}
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump({"chunks": self.chunks, "sources": self.sources}, f)
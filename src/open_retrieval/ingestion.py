@@ -0,0 +1,215 @@
+import os
+import queue
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from langchain.docstore.document import Document
+from .document_loaders import DocumentLoader
+from .text_splitters import TextSplitter
+from .vector_databases import VectorDatabase
+from .deduplication import ChunkDeduplicator
+from .colbert_store import ColBERTStore
+
+_DONE = object()
+
+
+def default_extra_metadata(file_path: str) -> Dict[str, str]:
+    """
+    Returns the file name without its extension as the `file_name` metadata of a file's chunks.
+    """
+    return {"file_name": os.path.basename(file_path).split('.')[0]}
+
+
+def parse_file(loader: DocumentLoader, splitter: TextSplitter, file_path: str, chunk_size: int, chunk_overlap: int, extra_metadata: Optional[Dict] = None) -> List[Document]:
+    """
+    Loads and splits a single file. Runs inside the worker processes of the IngestionPipeline.
+
+    Args:
+        loader (DocumentLoader): The document loader.
+        splitter (TextSplitter): The text splitter.
+        file_path (str): The path of the file.
+        chunk_size (int): The size of each chunk.
+        chunk_overlap (int): The overlap between chunks.
+        extra_metadata (Optional[Dict]): Extra metadata added to every chunk.
+
+    Returns:
+        List[Document]: The chunks of the file, empty if the file could not be loaded.
+    """
+    data = loader.load(file_path)
+    if not isinstance(data, list):
+        logging.getLogger(__name__).error(f"Skipping {file_path}: {data}")
+        return []
+    return splitter.split(data, chunk_size=chunk_size, chunk_overlap=chunk_overlap, extra_metadata=extra_metadata)
+
+
+@dataclass
+class IngestionReport:
+    """
+    The outcome of an ingestion run.
+
+    Attributes:
+        files (int): The number of files parsed into chunks.
+        failed_files (List[str]): The files that could not be loaded or had no text, not counted in files.
+        chunks (int): The number of chunks produced by the splitter.
+        added (int): The number of chunks embedded and written to the index.
+        skipped (int): The number of chunks that were already indexed.
+        batches (int): The number of batches written.
+        duplicates (int): The number of duplicate chunks removed before embedding.
+    """
+    files: int = 0
+    failed_files: List[str] = field(default_factory=list)
+    chunks: int = 0
+    added: int = 0
+    skipped: int = 0
+    batches: int = 0
+    duplicates: int = 0
+
+
+class IngestionPipeline:
+    """
+    A pipeline that parses files in a process pool and streams their chunks into a vector index in fixed-size batches.
+
+    Parsed chunks flow through a bounded queue, so at most `queue_size` chunks plus one batch are held in memory
+    at a time; when the embedder falls behind, the parser workers stop receiving new files.
+
+    Args:
+        loader (DocumentLoader): The document loader.
+        splitter (TextSplitter): The text splitter.
+        vector_database (VectorDatabase): The vector database to write to, one of chroma, faiss, qdrant or numpy.
+        embedding_function: The embedding function to use.
+        batch_size (int): The number of chunks embedded and written at a time.
+        max_workers (Optional[int]): The number of parser processes. Defaults to the number of CPUs.
+        queue_size (Optional[int]): The maximum number of parsed chunks waiting to be embedded. Defaults to 4 batches.
+        chunk_size (int): The size of each chunk.
+        chunk_overlap (int): The overlap between chunks.
+        deduplicator (Optional[ChunkDeduplicator]): Removes exact and near duplicate chunks from every batch before it is embedded. Duplicates are removed across files unless its scope is set, see ChunkDeduplicator.
+        colbert_store (Optional[ColBERTStore]): Stores the ColBERT token embeddings of every written chunk, so a Retriever reranks them without re-encoding.
+    """
+    def __init__(self, loader: DocumentLoader, splitter: TextSplitter, vector_database: VectorDatabase, embedding_function, batch_size: int = 64, max_workers: Optional[int] = None, queue_size: Optional[int] = None, chunk_size: int = 800, chunk_overlap: int = 0, deduplicator: Optional[ChunkDeduplicator] = None, colbert_store: Optional[ColBERTStore] = None):
+        self.loader = loader
+        self.splitter = splitter
+        self.vector_database = vector_database
+        self.embedding_function = embedding_function
+        self.batch_size = batch_size
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.queue_size = queue_size or 4 * batch_size
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.deduplicator = deduplicator
+        self.colbert_store = colbert_store
+        self.logger = logging.getLogger(__name__)
+
+    def iter_chunks(self, file_paths: List[str], extra_metadata: Callable[[str], Dict] = default_extra_metadata, report: Optional[IngestionReport] = None) -> Iterator[Document]:
+        """
+        Parses files in a process pool and yields their chunks in the order of file_paths, so batches,
+        the manifest and the chunks kept by a deduplicator do not depend on which worker finishes first.
+
+        Args:
+            file_paths (List[str]): The paths of the files to parse.
+            extra_metadata (Callable[[str], Dict]): Returns the extra metadata of a file's chunks from its path.
+            report (Optional[IngestionReport]): A report updated with the number of files and chunks.
+
+        Yields:
+            Document: The chunks of every file.
+        """
+        chunks: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        producer = threading.Thread(target=self._produce, args=(file_paths, extra_metadata, chunks, stop, report), daemon=True)
+        producer.start()
+        try:
+            while True:
+                item = chunks.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            while producer.is_alive():
+                try:
+                    chunks.get_nowait()
+                except queue.Empty:
+                    producer.join(0.01)
+
+    def _produce(self, file_paths: List[str], extra_metadata: Callable[[str], Dict], chunks: queue.Queue, stop: threading.Event, report: Optional[IngestionReport]):
+        try:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                pending: deque = deque()
+                paths = iter(file_paths)
+                while not stop.is_set():
+                    # keep at most two files per worker in flight so parsing cannot run ahead of the queue
+                    for file_path in paths:
+                        future = executor.submit(parse_file, self.loader, self.splitter, file_path, self.chunk_size, self.chunk_overlap, extra_metadata(file_path))
+                        pending.append((future, file_path))
+                        if len(pending) >= 2 * self.max_workers:
+                            break
+                    if not pending:
+                        break
+                    # files are emitted in submission order, the ones that finish early wait in the window
+                    future, file_path = pending.popleft()
+                    docs = future.result()
+                    if report is not None:
+                        if docs:
+                            report.files += 1
+                            report.chunks += len(docs)
+                        else:
+                            report.failed_files.append(file_path)
+                    for doc in docs:
+                        if stop.is_set():
+                            break
+                        chunks.put(doc)
+                for future, _ in pending:
+                    future.cancel()
+            chunks.put(_DONE)
+        except BaseException as e:
+            chunks.put(e)
+
+    def run(self, data_path: str, index_name: str, index_dir: Optional[str] = None, extra_metadata: Callable[[str], Dict] = default_extra_metadata, **kwargs) -> Tuple[object, IngestionReport]:
+        """
+        Ingests every file of a directory into a vector index, writing it incrementally batch by batch.
+
+        Chunks that are already recorded in the index manifest are skipped, so re-running the pipeline
+        over a directory only embeds new content.
+
+        Args:
+            data_path (str): The directory containing the files to ingest.
+            index_name (str): The name of the index.
+            index_dir (Optional[str]): The directory the index is stored in.
+            extra_metadata (Callable[[str], Dict]): Returns the extra metadata of a file's chunks from its path.
+            **kwargs: Additional arguments specific to the vector store being used.
+
+        Returns:
+            Tuple[object, IngestionReport]: The index object and the ingestion statistics.
+        """
+        file_paths = sorted(os.path.join(data_path, filename) for filename in os.listdir(data_path))
+        file_paths = [file_path for file_path in file_paths if os.path.isfile(file_path)]
+        report = IngestionReport()
+        writer = self.vector_database.index_writer(embedding_function=self.embedding_function, index_name=index_name, index_dir=index_dir, **kwargs)
+
+        batch: List[Document] = []
+        for doc in self.iter_chunks(file_paths, extra_metadata=extra_metadata, report=report):
+            batch.append(doc)
+            if len(batch) == self.batch_size:
+                self._write(writer, batch, report)
+                batch = []
+        if batch:
+            self._write(writer, batch, report)
+
+        vector_index, sync_report = writer.close()
+        report.added, report.skipped = sync_report.added, sync_report.skipped
+        self.logger.info(f"Ingested {report.files} files into {index_name}: {report.added} chunks added, {report.skipped} skipped, {report.duplicates} duplicates removed")
+        return vector_index, report
+
+    def _write(self, writer, batch: List[Document], report: IngestionReport):
+        if self.deduplicator is not None:
+            unique = self.deduplicator.deduplicate(batch)
+            report.duplicates += len(batch) - len(unique)
+            batch = unique
+        writer.add(batch)
+        if self.colbert_store is not None:
+            self.colbert_store.add_documents(batch)
+        report.batches += 1
@@ -0,0 +1,288 @@
+import time
+import random
+import asyncio
+import functools
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_hooks: List["InstrumentationHook"] = []
+_current_span: contextvars.ContextVar = contextvars.ContextVar("open_retrieval_span", default=None)
+
+
+@dataclass
+class Span:
+    """
+    A timed operation of the pipeline.
+
+    Attributes:
+        name (str): The name of the stage, e.g. retriever.naive_retrieval.
+        trace_id (str): The id shared by a span and all its children.
+        span_id (str): The id of the span.
+        parent_id (Optional[str]): The id of the enclosing span.
+        start_time (int): The start time in nanoseconds since the epoch.
+        end_time (int): The end time in nanoseconds since the epoch.
+        attributes (Dict[str, Any]): Item counts, batch sizes, cache hits and other details of the operation.
+        error (Optional[str]): The exception type when the operation failed.
+    """
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    start_time: int = 0
+    end_time: int = 0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        return (self.end_time - self.start_time) / 1e9
+
+    def to_otel(self) -> Dict[str, Any]:
+        """
+        Returns the span in the OpenTelemetry JSON span layout.
+        """
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": "SPAN_KIND_INTERNAL",
+            "startTimeUnixNano": self.start_time,
+            "endTimeUnixNano": self.end_time,
+            "attributes": [{"key": key, "value": _otel_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": "STATUS_CODE_ERROR", "message": self.error} if self.error else {"code": "STATUS_CODE_OK"},
+        }
+
+
+def _otel_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class InstrumentationHook:
+    """
+    The interface of instrumentation hooks. A hook receives every span when it ends.
+    """
+    def on_span(self, span: Span):
+        raise NotImplementedError
+
+
+def add_hook(hook: InstrumentationHook) -> InstrumentationHook:
+    """
+    Registers a hook. Instrumentation is disabled, and costs a single list check per call, while no hook is registered.
+    """
+    _hooks.append(hook)
+    return hook
+
+
+def remove_hook(hook: InstrumentationHook):
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+def enabled() -> bool:
+    return bool(_hooks)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Times a block as a child of the current span. Yields None when instrumentation is disabled.
+
+    Args:
+        name (str): The name of the stage.
+        **attributes: Attributes of the span.
+    """
+    if not _hooks:
+        yield None
+        return
+    parent = _current_span.get()
+    current = Span(name=name, trace_id=parent.trace_id if parent else f"{random.getrandbits(128):032x}", span_id=f"{random.getrandbits(64):016x}",
+                   parent_id=parent.span_id if parent else None, start_time=time.time_ns(), attributes=attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end_time = time.time_ns()
+        for hook in list(_hooks):
+            hook.on_span(current)
+
+
+def annotate(**attributes: Any):
+    """
+    Adds attributes, such as cache_hit, to the current span. Does nothing when instrumentation is disabled.
+    """
+    if _hooks:
+        current = _current_span.get()
+        if current is not None:
+            current.attributes.update(attributes)
+
+
+def instrumented(name: str, attributes: Optional[Callable[..., Dict[str, Any]]] = None):
+    """
+    Decorates a function or coroutine function so every call is reported as a span.
+
+    Args:
+        name (str): The name of the stage.
+        attributes (Optional[Callable[..., Dict[str, Any]]]): Called with the result followed by the call arguments, returns attributes of the span.
+    """
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not _hooks:
+                    return await func(*args, **kwargs)
+                with span(name) as current:
+                    result = await func(*args, **kwargs)
+                    if attributes is not None:
+                        current.attributes.update(attributes(result, *args, **kwargs))
+                    return result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _hooks:
+                return func(*args, **kwargs)
+            with span(name) as current:
+                result = func(*args, **kwargs)
+                if attributes is not None:
+                    current.attributes.update(attributes(result, *args, **kwargs))
+                return result
+        return wrapper
+    return decorator
+
+
+@dataclass
+class StageMetrics:
+    calls: int = 0
+    errors: int = 0
+    duration_sum: float = 0.0
+    buckets: List[int] = field(default_factory=lambda: [0] * len(DURATION_BUCKETS))
+    items: int = 0
+    batches: int = 0
+    batch_size_sum: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+
+
+class MetricsCollector(InstrumentationHook):
+    """
+    An in-memory hook that aggregates per-stage call counts, errors, duration histograms, item counts, batch sizes
+    and cache hits, and keeps the most recent spans.
+
+    The `items`, `batch_size` and `cache_hit` span attributes feed the item, batch size and cache counters.
+
+    Args:
+        max_spans (int): The number of recent spans kept for export.
+        namespace (str): The prefix of the Prometheus metric names.
+    """
+    def __init__(self, max_spans: int = 10_000, namespace: str = "open_retrieval"):
+        self.namespace = namespace
+        self.stages: Dict[str, StageMetrics] = {}
+        self.spans: deque = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    def on_span(self, span: Span):
+        with self._lock:
+            metrics = self.stages.setdefault(span.name, StageMetrics())
+            metrics.calls += 1
+            metrics.errors += span.error is not None
+            metrics.duration_sum += span.duration
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if span.duration <= bound:
+                    metrics.buckets[i] += 1
+            metrics.items += int(span.attributes.get("items", 0))
+            if "batch_size" in span.attributes:
+                metrics.batches += 1
+                metrics.batch_size_sum += int(span.attributes["batch_size"])
+            if "cache_hit" in span.attributes:
+                metrics.cache_hits += bool(span.attributes["cache_hit"])
+                metrics.cache_misses += not span.attributes["cache_hit"]
+            self.spans.append(span)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns the calls, errors, mean duration, items, mean batch size and cache hit rate of every stage.
+        """
+        with self._lock:
+            return {
+                name: {
+                    "calls": m.calls,
+                    "errors": m.errors,
+                    "mean_seconds": m.duration_sum / m.calls if m.calls else 0.0,
+                    "items": m.items,
+                    "mean_batch_size": m.batch_size_sum / m.batches if m.batches else 0.0,
+                    "cache_hit_rate": m.cache_hits / (m.cache_hits + m.cache_misses) if m.cache_hits + m.cache_misses else 0.0,
+                }
+                for name, m in self.stages.items()
+            }
+
+    def to_prometheus(self) -> str:
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        """
+        prefix = self.namespace
+        lines = [f"# HELP {prefix}_stage_duration_seconds Duration of pipeline stages.", f"# TYPE {prefix}_stage_duration_seconds histogram"]
+        with self._lock:
+            stages = sorted(self.stages.items())
+            for name, m in stages:
+                for bound, count in zip(DURATION_BUCKETS, m.buckets):
+                    lines.append(f'{prefix}_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {count}')
+                lines.append(f'{prefix}_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {m.calls}')
+                lines.append(f'{prefix}_stage_duration_seconds_sum{{stage="{name}"}} {m.duration_sum}')
+                lines.append(f'{prefix}_stage_duration_seconds_count{{stage="{name}"}} {m.calls}')
+            counters: List[Tuple[str, str, Callable[[StageMetrics], int]]] = [
+                ("stage_errors_total", "Failed calls of pipeline stages.", lambda m: m.errors),
+                ("stage_items_total", "Items produced by pipeline stages.", lambda m: m.items),
+                ("stage_batch_items_total", "Items submitted to batched pipeline stages.", lambda m: m.batch_size_sum),
+                ("stage_batches_total", "Batches submitted to batched pipeline stages.", lambda m: m.batches),
+                ("stage_cache_hits_total", "Cache hits of pipeline stages.", lambda m: m.cache_hits),
+                ("stage_cache_misses_total", "Cache misses of pipeline stages.", lambda m: m.cache_misses),
+            ]
+            for metric, help_text, value in counters:
+                lines.append(f"# HELP {prefix}_{metric} {help_text}")
+                lines.append(f"# TYPE {prefix}_{metric} counter")
+                lines.extend(f'{prefix}_{metric}{{stage="{name}"}} {value(m)}' for name, m in stages)
+        return "\n".join(lines) + "\n"
+
+    def export_spans(self) -> List[Dict[str, Any]]:
+        """
+        Returns the recent spans in the OpenTelemetry JSON span layout.
+        """
+        with self._lock:
+            return [span.to_otel() for span in self.spans]
+
+    def reset(self):
+        with self._lock:
+            self.stages.clear()
+            self.spans.clear()
+
+
+@contextmanager
+def collect_metrics(collector: Optional[MetricsCollector] = None) -> Iterator[MetricsCollector]:
+    """
+    Registers a MetricsCollector for the duration of a block.
+
+    Args:
+        collector (Optional[MetricsCollector]): The collector. Defaults to a new one.
+    """
+    collector = add_hook(collector or MetricsCollector())
+    try:
+        yield collector
+    finally:
+        remove_hook(collector)
@@ -0,0 +1,204 @@
+import os
+import re
+import json
+import math
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from langchain.docstore.document import Document
+from .index_manifest import chunk_id
+from .metadata_index import MetadataIndex, is_simple_filter
+
+TOKEN_PATTERN = re.compile(r"\w+(?:[.\-/]\w+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercases a text and splits it into word tokens, keeping section numbers such as 12.3 or 4(a)-1 together.
+    """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """
+    An inverted index over chunk texts scored with BM25.
+
+    The postings are kept in CSR form: a term offset array into flat int32 document id and uint16 term
+    frequency arrays, so the index costs a few bytes per posting. New chunks are buffered and merged into
+    the CSR arrays on the next search or save, which lets the index be built incrementally batch by batch.
+    Equality and list filters are answered from the postings of a MetadataIndex kept alongside the texts.
+
+    Args:
+        path (Optional[str]): The directory where the index is persisted. The index is in-memory only when None.
+        k1 (float): The BM25 term frequency saturation.
+        b (float): The BM25 length normalization.
+    """
+    def __init__(self, path: Optional[str] = None, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.generation = 0
+        self._lock = threading.RLock()
+        self.vocabulary: Dict[str, int] = {}
+        self.ids: List[str] = []
+        self.documents: List[Tuple[str, Dict[str, Any]]] = []
+        self._rows: Dict[str, int] = {}
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.doc_ids = np.empty(0, dtype=np.int32)
+        self.tfs = np.empty(0, dtype=np.uint16)
+        self.doc_lengths = np.empty(0, dtype=np.int32)
+        self.deleted = np.empty(0, dtype=bool)
+        self.metadata_index = MetadataIndex()
+        self._pending: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        if path and os.path.exists(os.path.join(path, "vocabulary.json")):
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self.ids) - int(self.deleted.sum())
+
+    def __contains__(self, id_: str) -> bool:
+        return id_ in self._rows
+
+    def add_documents(self, docs: List[Document], ids: Optional[List[str]] = None) -> int:
+        """
+        Adds chunks to the index, skipping ids that are already indexed.
+
+        Args:
+            docs (List[Document]): The chunks to add.
+            ids (Optional[List[str]]): The chunk ids. Defaults to the content hash of every chunk.
+
+        Returns:
+            int: The number of chunks added.
+        """
+        ids = ids or [chunk_id(doc) for doc in docs]
+        with self._lock:
+            term_ids, doc_ids, tfs, lengths = [], [], [], []
+            for id_, doc in zip(ids, docs):
+                if id_ in self._rows:
+                    continue
+                row = len(self.ids)
+                self._rows[id_] = row
+                self.ids.append(id_)
+                self.documents.append((doc.page_content, dict(doc.metadata)))
+                counts = Counter(tokenize(doc.page_content))
+                for term, tf in counts.items():
+                    term_ids.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+                    doc_ids.append(row)
+                    tfs.append(min(tf, np.iinfo(np.uint16).max))
+                lengths.append(sum(counts.values()))
+            if not lengths:
+                return 0
+            self.metadata_index.add_metadatas((row, self.documents[row][1]) for row in range(len(self.ids) - len(lengths), len(self.ids)))
+            self._pending.append((np.array(term_ids, dtype=np.int64), np.array(doc_ids, dtype=np.int32), np.array(tfs, dtype=np.uint16)))
+            self.doc_lengths = np.concatenate([self.doc_lengths, np.array(lengths, dtype=np.int32)])
+            self.deleted = np.concatenate([self.deleted, np.zeros(len(lengths), dtype=bool)])
+            self.generation += 1
+            return len(lengths)
+
+    def delete(self, ids: List[str]) -> int:
+        """
+        Removes chunks from the index by id.
+
+        Args:
+            ids (List[str]): The chunk ids.
+
+        Returns:
+            int: The number of chunks removed.
+        """
+        with self._lock:
+            rows = [self._rows.pop(id_) for id_ in ids if id_ in self._rows]
+            self.deleted[rows] = True
+            self.generation += bool(rows)
+            return len(rows)
+
+    def _merge(self):
+        if not self._pending:
+            return
+        old_terms = np.repeat(np.arange(len(self.offsets) - 1), np.diff(self.offsets))
+        terms = np.concatenate([old_terms] + [p[0] for p in self._pending])
+        doc_ids = np.concatenate([self.doc_ids] + [p[1] for p in self._pending])
+        tfs = np.concatenate([self.tfs] + [p[2] for p in self._pending])
+        order = np.argsort(terms, kind="stable")
+        self.doc_ids, self.tfs = doc_ids[order], tfs[order]
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(terms, minlength=len(self.vocabulary)))]).astype(np.int64)
+        self._pending = []
+
+    def _filter_rows(self, filter: Dict[str, Any], candidates: np.ndarray) -> np.ndarray:
+        if is_simple_filter(filter):
+            rows = self.metadata_index.rows(filter)
+            return rows[candidates[rows]]
+        # None values also match chunks without the field, which the postings do not record
+        return np.flatnonzero(candidates & self._filter_mask(filter))
+
+    def _filter_mask(self, filter: Dict[str, Any]) -> np.ndarray:
+        wanted = {name: value if isinstance(value, list) else [value] for name, value in filter.items()}
+        return np.array([all(metadata.get(name) in values for name, values in wanted.items()) for _, metadata in self.documents], dtype=bool)
+
+    def search(self, query: str, k: int = 5, filter: Optional[Dict[str, Any]] = None) -> List[Tuple[Document, float]]:
+        """
+        Returns the k chunks with the highest BM25 score for a query.
+
+        Args:
+            query (str): The query.
+            k (int): The number of results.
+            filter (Optional[Dict[str, Any]]): Metadata values the results must match. A list value matches any of its items.
+
+        Returns:
+            List[Tuple[Document, float]]: The results and their BM25 scores.
+        """
+        with self._lock:
+            self._merge()
+            n = len(self)
+            if n == 0:
+                return []
+            live_lengths = self.doc_lengths[~self.deleted]
+            avgdl = float(live_lengths.mean()) or 1.0
+            scores = np.zeros(len(self.ids), dtype=np.float32)
+            for term in set(tokenize(query)):
+                term_id = self.vocabulary.get(term)
+                if term_id is None or term_id + 1 >= len(self.offsets):
+                    continue
+                start, end = self.offsets[term_id], self.offsets[term_id + 1]
+                docs, tfs = self.doc_ids[start:end], self.tfs[start:end].astype(np.float32)
+                df = int((~self.deleted[docs]).sum())
+                idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[docs] / avgdl)
+                scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+
+            candidates = ~self.deleted & (scores > 0)
+            rows = self._filter_rows(filter, candidates) if filter else np.flatnonzero(candidates)
+            if len(rows) > k:
+                rows = rows[np.argpartition(-scores[rows], k - 1)[:k]]
+            rows = rows[np.argsort(-scores[rows], kind="stable")]
+            return [(Document(page_content=self.documents[row][0], metadata=dict(self.documents[row][1])), float(scores[row])) for row in rows]
+
+    def save(self):
+        """
+        Persists the index to its path.
+        """
+        if not self.path:
+            raise ValueError("BM25Index was created without a path")
+        with self._lock:
+            self._merge()
+            os.makedirs(self.path, exist_ok=True)
+            for name in ("offsets", "doc_ids", "tfs", "doc_lengths", "deleted"):
+                np.save(os.path.join(self.path, f"{name}.npy"), getattr(self, name))
+            with open(os.path.join(self.path, "documents.jsonl"), "w") as f:
+                for id_, (text, metadata) in zip(self.ids, self.documents):
+                    f.write(json.dumps({"id": id_, "text": text, "metadata": metadata}, default=str) + "\n")
+            with open(os.path.join(self.path, "vocabulary.json"), "w") as f:
+                json.dump(sorted(self.vocabulary, key=self.vocabulary.get), f)
+
+    def _load(self):
+        for name in ("offsets", "doc_ids", "tfs", "doc_lengths", "deleted"):
+            setattr(self, name, np.load(os.path.join(self.path, f"{name}.npy")))
+        with open(os.path.join(self.path, "vocabulary.json")) as f:
+            self.vocabulary = {term: term_id for term_id, term in enumerate(json.load(f))}
+        with open(os.path.join(self.path, "documents.jsonl")) as f:
+            for line in f:
+                record = json.loads(line)
+                self.ids.append(record["id"])
+                self.documents.append((record["text"], record["metadata"]))
+        self.metadata_index = MetadataIndex.from_metadatas((row, metadata) for row, (_, metadata) in enumerate(self.documents))
+        self._rows = {id_: row for row, id_ in enumerate(self.ids) if not self.deleted[row]}
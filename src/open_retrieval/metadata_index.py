@@ -0,0 +1,102 @@
+import json
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+
+
+def encode_value(value: Any) -> str:
+    """
+    Returns the key of a metadata value in the postings, so equal values of any JSON type match.
+    """
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+def is_simple_filter(filter: Any) -> bool:
+    """
+    Returns whether a filter only uses equality and list membership, the conditions a MetadataIndex can answer.
+    A None value is not, since it also matches documents that lack the field.
+    """
+    return isinstance(filter, dict) and not any(value is None or isinstance(value, dict) or str(name).startswith("$") for name, value in filter.items())
+
+
+class MetadataIndex:
+    """
+    An inverted index from metadata field to value to the sorted row ids that have that value.
+
+    Filters are answered by merging postings instead of testing every row: a list value is the union of the
+    postings of its items and several fields are intersected, so a filtered search only scores the matching rows.
+    """
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, np.ndarray]] = {}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.postings
+
+    @classmethod
+    def from_metadatas(cls, metadatas: Iterable[Tuple[int, Dict[str, Any]]]) -> "MetadataIndex":
+        """
+        Builds the index from (row id, metadata) pairs.
+        """
+        rows: Dict[str, Dict[str, List[int]]] = {}
+        for row, metadata in metadatas:
+            for name, value in metadata.items():
+                rows.setdefault(name, {}).setdefault(encode_value(value), []).append(row)
+        index = cls()
+        index.postings = {name: {value: np.unique(np.array(ids, dtype=np.int64)) for value, ids in values.items()} for name, values in rows.items()}
+        return index
+
+    def add_metadatas(self, metadatas: Iterable[Tuple[int, Dict[str, Any]]]):
+        """
+        Appends (row id, metadata) pairs to the postings. The rows must be larger than every row already indexed,
+        as in an append-only store, so the postings stay sorted without re-sorting them.
+        """
+        rows: Dict[str, Dict[str, List[int]]] = {}
+        for row, metadata in metadatas:
+            for name, value in metadata.items():
+                rows.setdefault(name, {}).setdefault(encode_value(value), []).append(row)
+        for name, values in rows.items():
+            field = self.postings.setdefault(name, {})
+            for value, ids in values.items():
+                ids = np.array(ids, dtype=np.int64)
+                field[value] = np.concatenate([field[value], ids]) if value in field else ids
+
+    def add_codes(self, name: str, codes: np.ndarray, values: Sequence[str]):
+        """
+        Adds the postings of a dictionary-encoded column, where codes[row] indexes values and -1 means missing.
+        """
+        codes = np.asarray(codes)
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(-1, len(values) + 1))
+        self.postings[name] = {value: order[bounds[code + 1]:bounds[code + 2]].astype(np.int64) for code, value in enumerate(values)}
+
+    def cardinality(self, name: str) -> int:
+        return len(self.postings.get(name, {}))
+
+    def rows(self, filter: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """
+        Returns the sorted row ids that match a filter, or None when there is no filter.
+
+        Args:
+            filter (Optional[Dict[str, Any]]): Metadata values the rows must match. A list value matches any of its items.
+
+        Returns:
+            Optional[np.ndarray]: The matching row ids.
+        """
+        if not filter:
+            return None
+        result = None
+        # intersect the most selective fields first
+        fields = sorted(filter.items(), key=lambda item: self._count(*item))
+        for name, value in fields:
+            postings = self.postings.get(name, {})
+            wanted = value if isinstance(value, list) else [value]
+            matched = [postings[key] for key in map(encode_value, wanted) if key in postings]
+            rows = np.unique(np.concatenate(matched)) if len(matched) > 1 else matched[0] if matched else np.empty(0, dtype=np.int64)
+            result = rows if result is None else np.intersect1d(result, rows, assume_unique=True)
+            if len(result) == 0:
+                break
+        return result
+
+    def _count(self, name: str, value: Any) -> int:
+        postings = self.postings.get(name, {})
+        wanted = value if isinstance(value, list) else [value]
+        return sum(len(postings.get(encode_value(item), ())) for item in wanted)
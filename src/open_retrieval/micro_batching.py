@@ -0,0 +1,80 @@
+import asyncio
+from concurrent.futures import Executor
+from typing import Callable, Generic, List, Optional, Set, Tuple, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MicroBatcher(Generic[T, R]):
+    """
+    Coalesces items submitted concurrently from coroutines into batches processed by a single call.
+
+    The first item of a batch starts a timer of `max_wait` seconds; every item submitted before it fires,
+    up to `max_batch_size`, joins the same batch. The batch function runs in the given executor so the
+    event loop is never blocked by CPU-bound work such as embedding or reranking.
+
+    Args:
+        process_batch (Callable[[List[T]], List[R]]): Processes a batch of items, returning one result per item.
+        max_batch_size (int): The maximum number of items per batch.
+        max_wait (float): The number of seconds to wait for more items before processing a batch.
+        executor (Optional[Executor]): The executor the batch function runs in. Defaults to the event loop's default executor.
+    """
+    def __init__(self, process_batch: Callable[[List[T]], List[R]], max_batch_size: int = 32, max_wait: float = 0.005, executor: Optional[Executor] = None):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.executor = executor
+        self.batches = 0
+        self.items = 0
+        self._pending: List[Tuple[T, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # the event loop only keeps weak references to tasks, so running batches are kept here until they finish
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, item: T) -> R:
+        """
+        Adds an item to the current batch and waits for its result.
+
+        Args:
+            item (T): The item.
+
+        Returns:
+            R: The result of the item.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[T, asyncio.Future]]):
+        self.batches += 1
+        self.items += len(batch)
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.executor, self.process_batch, [item for item, _ in batch])
+            if len(results) != len(batch):
+                # zip would leave the callers of the missing results waiting forever
+                raise ValueError(f"process_batch returned {len(results)} results for a batch of {len(batch)} items")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,567 @@
+import os
+import json
+import uuid
+import tempfile
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from langchain.docstore.document import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from .metadata_index import MetadataIndex, encode_value
+
+QUANTIZATIONS = ("int8", "binary")
+# number of set bits of every byte value, for hamming distances between packed sign bits
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    A first-party vector store backed by memory-mapped NumPy arrays.
+
+    The embeddings are stored as a float32 or float16 matrix on disk, the chunk texts and ids as
+    byte blobs with end offsets, and every metadata field as a dictionary-encoded column of int32 codes.
+    Opening a store only reads a small JSON header and memory-maps the files, so it costs the same for
+    any corpus size, and only the rows that make it into the results are turned into Documents.
+
+    Search is an exact blocked matrix multiply over the (optionally pre-filtered) rows, or, once
+    build_ivf has been called, a scan of the nprobe inverted lists closest to the query. Filters are
+    resolved through an inverted index of the metadata columns, built per field on first use, so only the
+    matching rows are scored. A filtered IVF search whose probed lists hold fewer than k matching rows
+    scans all the matching rows instead, so it still returns k results when k rows match.
+
+    With quantization, every vector also gets a compact code: int8 scalar codes with a per-row scale
+    (4x smaller than float32) or packed sign bits compared by hamming distance (32x smaller). Searches
+    then scan the codes for a shortlist of rescore_factor * k rows and rescore only the shortlist
+    against the full-precision memory-mapped vectors, so only the codes have to stay in RAM.
+
+    Args:
+        path (str): The directory where the store is persisted.
+        embedding (Embeddings): The embedding function.
+        dtype (str): The storage precision of the embeddings, float32 or float16.
+        metric (str): The similarity metric, one of cosine, ip or l2. Scores are always higher-is-better.
+        nprobe (int): The number of inverted lists scanned per query when an IVF quantizer has been built.
+        block_size (int): The number of rows scored per matrix multiply.
+        quantization (Optional[str]): The compact codes searched before rescoring, int8 or binary. Only used when the store is created.
+        rescore_factor (int): The number of shortlisted rows per result that are rescored with full precision.
+    """
+    def __init__(self, path: str, embedding: Embeddings, dtype: str = "float32", metric: str = "cosine", nprobe: int = 8, block_size: int = 16384, quantization: Optional[str] = None, rescore_factor: int = 4):
+        if dtype not in ("float32", "float16"):
+            raise ValueError('Invalid dtype value: Expecting one of float32 or float16')
+        if metric not in ("cosine", "ip", "l2"):
+            raise ValueError('Invalid metric value: Expecting one of cosine, ip or l2')
+        if quantization is not None and quantization not in QUANTIZATIONS:
+            raise ValueError('Invalid quantization value: Expecting one of int8 or binary')
+        self.path = path
+        self.embedding = embedding
+        self.nprobe = nprobe
+        self.block_size = block_size
+        self.rescore_factor = rescore_factor
+        self.generation = 0
+        self._lock = threading.RLock()
+        self._values: Dict[str, List[str]] = {}
+        self._value_codes: Dict[str, Dict[str, int]] = {}
+        self._id_rows: Optional[Dict[str, int]] = None
+        self._ivf_order = None
+        self._ivf_bounds = None
+        self._metadata_index = MetadataIndex()
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(self._file("header.json")):
+            with open(self._file("header.json")) as f:
+                self.header = json.load(f)
+        else:
+            self.header = {"dimension": None, "dtype": dtype, "metric": metric, "count": 0, "deleted": 0, "columns": {}, "ivf": None, "quantization": quantization}
+        self._map()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    @property
+    def metric(self) -> str:
+        return self.header["metric"]
+
+    @property
+    def count(self) -> int:
+        return self.header["count"]
+
+    @property
+    def quantization(self) -> Optional[str]:
+        return self.header.get("quantization")
+
+    def __len__(self) -> int:
+        return self.header["count"] - self.header["deleted"]
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _memmap(self, name: str, dtype, shape, mode: str = "r"):
+        if shape[0] == 0:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(self._file(name), dtype=dtype, mode=mode, shape=shape)
+
+    def _map(self):
+        count, dimension = self.count, self.header["dimension"]
+        self._vectors = self._memmap("vectors.bin", self.header["dtype"], (count, dimension or 0))
+        self._text_ends = self._memmap("text_ends.bin", np.int64, (count,))
+        self._texts = self._memmap("texts.bin", np.uint8, (int(self._text_ends[-1]) if count else 0,))
+        self._id_ends = self._memmap("id_ends.bin", np.int64, (count,))
+        self._ids = self._memmap("ids.bin", np.uint8, (int(self._id_ends[-1]) if count else 0,))
+        self._deleted = self._memmap("deleted.bin", np.uint8, (count,), mode="r+")
+        self._codes = {name: self._memmap(f"column_{i}.codes.bin", np.int32, (count,)) for name, i in self.header["columns"].items()}
+        if self.header["ivf"]:
+            self._centroids = np.load(self._file("ivf_centroids.npy"))
+            self._ivf_lists = self._memmap("ivf_lists.bin", np.int32, (count,))
+        if self.quantization == "int8":
+            self._int8_codes = self._memmap("int8_codes.bin", np.int8, (count, dimension or 0))
+            self._int8_scales = self._memmap("int8_scales.bin", np.float32, (count,))
+        elif self.quantization == "binary":
+            self._binary_codes = self._memmap("binary_codes.bin", np.uint8, (count, ((dimension or 0) + 7) // 8))
+        self._ivf_order = None
+        self._metadata_index = MetadataIndex()
+
+    def _append(self, name: str, array: np.ndarray):
+        with open(self._file(name), "ab") as f:
+            f.write(np.ascontiguousarray(array).tobytes())
+
+    def _save_header(self):
+        with open(self._file("header.json.tmp"), "w") as f:
+            json.dump(self.header, f)
+        os.replace(self._file("header.json.tmp"), self._file("header.json"))
+
+    def _column_values(self, name: str) -> List[str]:
+        if name not in self._values:
+            with open(self._file(f"column_{self.header['columns'][name]}.values.json")) as f:
+                self._values[name] = json.load(f)
+            self._value_codes[name] = {value: code for code, value in enumerate(self._values[name])}
+        return self._values[name]
+
+    def _encode(self, value: Any) -> str:
+        return encode_value(value)
+
+    def _prepare(self, vectors) -> np.ndarray:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix[None, :]
+        if self.metric == "cosine":
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = matrix / np.where(norms == 0, 1, norms)
+        return matrix
+
+    def add_embeddings(self, texts: List[str], embeddings: List[List[float]], metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None) -> List[str]:
+        """
+        Appends precomputed embeddings with their texts and metadata to the store.
+
+        Args:
+            texts (List[str]): The chunk texts.
+            embeddings (List[List[float]]): The embeddings of the texts.
+            metadatas (Optional[List[dict]]): The metadata of every text.
+            ids (Optional[List[str]]): The ids of the texts. Random ids are generated when not provided.
+
+        Returns:
+            List[str]: The ids of the added texts.
+        """
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        matrix = self._prepare(embeddings)
+        with self._lock:
+            if self.header["dimension"] is None:
+                self.header["dimension"] = matrix.shape[1]
+            elif matrix.shape[1] != self.header["dimension"]:
+                raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match the store dimension {self.header['dimension']}")
+            count, n = self.count, len(texts)
+
+            self._append("vectors.bin", matrix.astype(self.header["dtype"]))
+            for blob, ends, values in (("texts.bin", "text_ends.bin", texts), ("ids.bin", "id_ends.bin", ids)):
+                encoded = [value.encode("utf-8") for value in values]
+                offset = int(self._memmap(ends, np.int64, (count,))[-1]) if count else 0
+                self._append(blob, np.frombuffer(b"".join(encoded), dtype=np.uint8))
+                self._append(ends, offset + np.cumsum([len(value) for value in encoded], dtype=np.int64))
+            self._append("deleted.bin", np.zeros(n, dtype=np.uint8))
+
+            names = list(self.header["columns"]) + sorted({key for metadata in metadatas for key in metadata} - set(self.header["columns"]))
+            for name in names:
+                if name not in self.header["columns"]:
+                    self.header["columns"][name] = len(self.header["columns"])
+                    self._values[name], self._value_codes[name] = [], {}
+                    self._append(f"column_{self.header['columns'][name]}.codes.bin", np.full(count, -1, dtype=np.int32))
+                self._column_values(name)
+                codes, value_codes, new_values = np.full(n, -1, dtype=np.int32), self._value_codes[name], False
+                for row, metadata in enumerate(metadatas):
+                    if name in metadata:
+                        encoded = self._encode(metadata[name])
+                        if encoded not in value_codes:
+                            value_codes[encoded] = len(self._values[name])
+                            self._values[name].append(encoded)
+                            new_values = True
+                        codes[row] = value_codes[encoded]
+                index = self.header["columns"][name]
+                self._append(f"column_{index}.codes.bin", codes)
+                if new_values or not os.path.exists(self._file(f"column_{index}.values.json")):
+                    with open(self._file(f"column_{index}.values.json"), "w") as f:
+                        json.dump(self._values[name], f)
+
+            if self.header["ivf"]:
+                self._append("ivf_lists.bin", self._assign(matrix, self._centroids))
+            if self.quantization:
+                self._append_codes(matrix)
+
+            self.header["count"] = count + n
+            self._save_header()
+            self._map()
+            if self._id_rows is not None:
+                self._id_rows.update({id_: count + row for row, id_ in enumerate(ids)})
+            self.generation += 1
+        return ids
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        """
+        Embeds texts and appends them to the store.
+
+        Args:
+            texts (Iterable[str]): The chunk texts.
+            metadatas (Optional[List[dict]]): The metadata of every text.
+            ids (Optional[List[str]]): The ids of the texts.
+
+        Returns:
+            List[str]: The ids of the added texts.
+        """
+        texts = list(texts)
+        return self.add_embeddings(texts, self.embedding.embed_documents(texts), metadatas=metadatas, ids=ids)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """
+        Marks the rows of the given ids as deleted. Deleted rows are never returned by searches.
+
+        Args:
+            ids (Optional[List[str]]): The ids to delete.
+
+        Returns:
+            Optional[bool]: True if every id was found.
+        """
+        if not ids:
+            return False
+        with self._lock:
+            id_rows = self._row_ids()
+            rows = [id_rows.pop(id_) for id_ in ids if id_ in id_rows]
+            newly_deleted = [row for row in rows if not self._deleted[row]]
+            if newly_deleted:
+                self._deleted[newly_deleted] = 1
+                self._deleted.flush()
+                self.header["deleted"] += len(newly_deleted)
+                self._save_header()
+                self.generation += 1
+        return len(rows) == len(ids)
+
+    def _row_ids(self) -> Dict[str, int]:
+        if self._id_rows is None:
+            self._id_rows = {}
+            for row in range(self.count):
+                if not self._deleted[row]:
+                    self._id_rows[self._blob(self._ids, self._id_ends, row)] = row
+        return self._id_rows
+
+    def _blob(self, blob, ends, row: int) -> str:
+        start = int(ends[row - 1]) if row else 0
+        return bytes(blob[start:int(ends[row])]).decode("utf-8")
+
+    def _document(self, row: int) -> Document:
+        metadata = {}
+        for name, codes in self._codes.items():
+            code = int(codes[row])
+            if code >= 0:
+                metadata[name] = json.loads(self._column_values(name)[code])
+        return Document(page_content=self._blob(self._texts, self._text_ends, row), metadata=metadata)
+
+    def _filter_rows(self, filter: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        if not filter:
+            return None
+        for name in filter:
+            if name not in self._codes:
+                return np.empty(0, dtype=np.int64)
+            if name not in self._metadata_index:
+                self._metadata_index.add_codes(name, self._codes[name], self._column_values(name))
+        return self._metadata_index.rows(filter)
+
+    def _score(self, vectors: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        block = np.asarray(vectors, dtype=np.float32)
+        scores = queries @ block.T
+        if self.metric == "l2":
+            scores = 2 * scores - (block * block).sum(axis=1)[None, :] - (queries * queries).sum(axis=1)[:, None]
+        return scores
+
+    def _float_scores(self, queries: np.ndarray, index) -> np.ndarray:
+        return self._score(self._vectors[index], queries)
+
+    def _int8_scores(self, queries: np.ndarray, index) -> np.ndarray:
+        return self._score(self._int8_codes[index].astype(np.float32) * self._int8_scales[index][:, None], queries)
+
+    def _binary_scores(self, queries: np.ndarray, index) -> np.ndarray:
+        query_codes = np.packbits(queries > 0, axis=1)
+        distances = POPCOUNT[self._binary_codes[index][None, :, :] ^ query_codes[:, None, :]].sum(axis=2, dtype=np.int32)
+        return -distances.astype(np.float32)
+
+    def _append_codes(self, matrix: np.ndarray):
+        if self.quantization == "int8":
+            scales = np.abs(matrix).max(axis=1) / 127
+            scales[scales == 0] = 1
+            self._append("int8_codes.bin", np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8))
+            self._append("int8_scales.bin", scales.astype(np.float32))
+        else:
+            self._append("binary_codes.bin", np.packbits(matrix > 0, axis=1))
+
+    def _scan(self, queries: np.ndarray, k: int, rows: Optional[np.ndarray] = None, scorer=None) -> List[List[Tuple[int, float]]]:
+        scorer = scorer or self._float_scores
+        m = len(queries)
+        best_scores = np.empty((m, 0), dtype=np.float32)
+        best_rows = np.empty((m, 0), dtype=np.int64)
+        total = self.count if rows is None else len(rows)
+        for start in range(0, total, self.block_size):
+            end = min(start + self.block_size, total)
+            if rows is None:
+                block_rows = np.arange(start, end)
+                scores = scorer(queries, slice(start, end))
+            else:
+                block_rows = rows[start:end]
+                scores = scorer(queries, block_rows)
+            if self.header["deleted"]:
+                scores[:, self._deleted[block_rows].astype(bool)] = -np.inf
+            best_scores = np.hstack([best_scores, scores])
+            best_rows = np.hstack([best_rows, np.broadcast_to(block_rows, (m, len(block_rows)))])
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+
+        results = []
+        for scores, rows_ in zip(best_scores, best_rows):
+            order = np.argsort(-scores, kind="stable")
+            results.append([(int(rows_[i]), float(scores[i])) for i in order if np.isfinite(scores[i])])
+        return results
+
+    def _search(self, queries: np.ndarray, k: int, filter: Optional[Dict[str, Any]] = None, nprobe: Optional[int] = None) -> List[List[Tuple[int, float]]]:
+        if k <= 0 or self.count == 0:
+            return [[] for _ in queries]
+        rows = self._filter_rows(filter)
+        # a selective filter is cheaper to scan exactly than the probed lists
+        if not self.header["ivf"] or (rows is not None and len(rows) <= self.block_size):
+            return self._rescored_scan(queries, k, rows)
+        results = []
+        for query in queries:
+            probed = self._ivf_rows(query, nprobe or self.nprobe)
+            candidates = probed if rows is None else np.intersect1d(probed, rows, assume_unique=True)
+            if rows is not None and self._live(candidates) < k:
+                candidates = rows
+            results.extend(self._rescored_scan(query[None, :], k, candidates))
+        return results
+
+    def _live(self, rows: np.ndarray) -> int:
+        return len(rows) - int(self._deleted[rows].sum()) if self.header["deleted"] else len(rows)
+
+    def _rescored_scan(self, queries: np.ndarray, k: int, rows: Optional[np.ndarray] = None) -> List[List[Tuple[int, float]]]:
+        if not self.quantization:
+            return self._scan(queries, k, rows)
+        scorer = self._int8_scores if self.quantization == "int8" else self._binary_scores
+        shortlists = self._scan(queries, k * max(self.rescore_factor, 1), rows, scorer=scorer)
+        return [self._scan(query[None, :], k, np.sort(np.array([row for row, _ in hits], dtype=np.int64)))[0] for query, hits in zip(queries, shortlists)]
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Tuple[Document, float]]:
+        """
+        Returns the k most similar chunks of a query embedding with their scores, higher is more similar.
+
+        Args:
+            embedding (List[float]): The query embedding.
+            k (int): The number of results.
+            filter (Optional[Dict[str, Any]]): Metadata values the results must match. A list value matches any of its items.
+
+        Returns:
+            List[Tuple[Document, float]]: The results and their scores.
+        """
+        with self._lock:
+            hits = self._search(self._prepare(embedding), k, filter, kwargs.get("nprobe"))[0]
+            return [(self._document(row), score) for row, score in hits]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, filter, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k, filter, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter, **kwargs)]
+
+    def similarity_search_by_vectors(self, embeddings: List[List[float]], k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[List[Document]]:
+        """
+        Searches several query embeddings at once with a single matrix multiply per block.
+
+        Args:
+            embeddings (List[List[float]]): The query embeddings.
+            k (int): The number of results per query.
+            filter (Optional[Dict[str, Any]]): Metadata values the results must match.
+
+        Returns:
+            List[List[Document]]: The results of every query.
+        """
+        with self._lock:
+            hits = self._search(self._prepare(embeddings), k, filter, kwargs.get("nprobe"))
+            return [[self._document(row) for row, _ in query_hits] for query_hits in hits]
+
+    def _select_relevance_score_fn(self):
+        if self.metric == "l2":
+            return lambda score: 1.0 - np.sqrt(max(-score, 0.0)) / np.sqrt(2)
+        return lambda score: score
+
+    def _assign(self, matrix: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        return np.argmax(self._score(centroids, matrix), axis=1).astype(np.int32)
+
+    def build_ivf(self, nlist: int, iterations: int = 10, sample_size: Optional[int] = None, seed: int = 0):
+        """
+        Trains an IVF coarse quantizer with k-means and assigns every row to its closest inverted list.
+
+        After this, searches only scan the nprobe lists closest to each query. Rows added later are
+        assigned to the existing lists.
+
+        Args:
+            nlist (int): The number of inverted lists.
+            iterations (int): The number of k-means iterations.
+            sample_size (Optional[int]): The number of rows used for training. Defaults to 256 per list.
+            seed (int): The random seed.
+        """
+        with self._lock:
+            live = np.flatnonzero(self._deleted == 0)
+            if len(live) < nlist:
+                raise ValueError(f"build_ivf needs at least {nlist} rows, the store has {len(live)}")
+            rng = np.random.default_rng(seed)
+            sample = np.sort(rng.choice(live, size=min(len(live), sample_size or 256 * nlist), replace=False))
+            data = np.asarray(self._vectors[sample], dtype=np.float32)
+            centroids = data[rng.choice(len(data), size=nlist, replace=False)].copy()
+            for _ in range(iterations):
+                assignment = self._assign(data, centroids)
+                for list_id in range(nlist):
+                    members = data[assignment == list_id]
+                    centroids[list_id] = members.mean(axis=0) if len(members) else data[rng.integers(len(data))]
+                centroids = self._prepare(centroids) if self.metric == "cosine" else centroids
+
+            np.save(self._file("ivf_centroids.npy"), centroids)
+            lists = np.concatenate([self._assign(np.asarray(self._vectors[start:start + self.block_size], dtype=np.float32), centroids) for start in range(0, self.count, self.block_size)])
+            with open(self._file("ivf_lists.bin"), "wb") as f:
+                f.write(lists.tobytes())
+            self.header["ivf"] = {"nlist": nlist}
+            self._save_header()
+            self._map()
+
+    def _ivf_rows(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        if self._ivf_order is None:
+            self._ivf_order = np.argsort(self._ivf_lists, kind="stable")
+            self._ivf_bounds = np.searchsorted(self._ivf_lists[self._ivf_order], np.arange(len(self._centroids) + 1))
+        scores = self._score(self._centroids, query[None, :])[0]
+        probed = np.argsort(-scores)[:nprobe]
+        return np.sort(np.concatenate([self._ivf_order[self._ivf_bounds[i]:self._ivf_bounds[i + 1]] for i in probed]))
+
+    def quantize(self, quantization: Optional[str]):
+        """
+        Builds (or drops, with None) the compact codes of every row, so searches scan the codes and rescore a shortlist.
+
+        Args:
+            quantization (Optional[str]): int8, binary or None.
+        """
+        if quantization is not None and quantization not in QUANTIZATIONS:
+            raise ValueError('Invalid quantization value: Expecting one of int8 or binary')
+        with self._lock:
+            for name in ("int8_codes.bin", "int8_scales.bin", "binary_codes.bin"):
+                if os.path.exists(self._file(name)):
+                    os.remove(self._file(name))
+            self.header["quantization"] = quantization
+            if quantization:
+                for start in range(0, self.count, self.block_size):
+                    self._append_codes(np.asarray(self._vectors[start:start + self.block_size], dtype=np.float32))
+            self._save_header()
+            self._map()
+            self.generation += 1
+
+    def memory_footprint(self) -> Dict[str, int]:
+        """
+        Returns the bytes used by the store on disk, split by component, and the bytes a search keeps hot in memory.
+
+        Returns:
+            Dict[str, int]: The bytes of the vectors, codes, texts, metadata and ivf files, their total, and the resident bytes (the codes when quantized, otherwise the vectors).
+        """
+        def size(*names):
+            return sum(os.path.getsize(self._file(name)) for name in names if os.path.exists(self._file(name)))
+
+        columns = [f"column_{i}.{suffix}" for i in self.header["columns"].values() for suffix in ("codes.bin", "values.json")]
+        footprint = {
+            "vectors": size("vectors.bin"),
+            "codes": size("int8_codes.bin", "int8_scales.bin", "binary_codes.bin"),
+            "texts": size("texts.bin", "text_ends.bin", "ids.bin", "id_ends.bin", "deleted.bin"),
+            "metadata": size(*columns),
+            "ivf": size("ivf_centroids.npy", "ivf_lists.bin"),
+        }
+        footprint["total"] = sum(footprint.values())
+        footprint["resident"] = footprint["codes"] if self.quantization else footprint["vectors"]
+        return footprint
+
+    def recall_at_k(self, query_embeddings: Optional[List[List[float]]] = None, k: int = 10, sample_size: int = 100, seed: int = 0, **kwargs: Any) -> float:
+        """
+        Measures the recall@k of the store's search (quantized and/or IVF) against an exact float search.
+
+        Args:
+            query_embeddings (Optional[List[List[float]]]): The query embeddings. Defaults to a sample of the stored vectors.
+            k (int): The number of results compared per query.
+            sample_size (int): The number of stored vectors sampled when no queries are given.
+            seed (int): The random seed of the sample.
+            **kwargs: Search arguments such as nprobe.
+
+        Returns:
+            float: The fraction of the exact top k results that the search returns.
+        """
+        with self._lock:
+            if query_embeddings is None:
+                live = np.flatnonzero(self._deleted == 0)
+                sample = np.sort(np.random.default_rng(seed).choice(live, size=min(sample_size, len(live)), replace=False))
+                queries = np.asarray(self._vectors[sample], dtype=np.float32)
+            else:
+                queries = self._prepare(query_embeddings)
+            exact = self._scan(queries, k)
+            approximate = self._search(queries, k, nprobe=kwargs.get("nprobe"))
+            found = sum(len({row for row, _ in a} & {row for row, _ in e}) for a, e in zip(approximate, exact))
+            return found / max(sum(len(e) for e in exact), 1)
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None, path: Optional[str] = None, **kwargs: Any) -> "NumpyVectorStore":
+        """
+        Creates a store from texts, embedding them with the given embedding function.
+
+        Args:
+            texts (List[str]): The chunk texts.
+            embedding (Embeddings): The embedding function.
+            metadatas (Optional[List[dict]]): The metadata of every text.
+            ids (Optional[List[str]]): The ids of the texts.
+            path (Optional[str]): The directory where the store is persisted. Defaults to a temporary directory.
+            **kwargs: Additional arguments passed to the constructor.
+
+        Returns:
+            NumpyVectorStore: The store.
+        """
+        store = cls(path or tempfile.mkdtemp(prefix="numpy_store_"), embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+    @classmethod
+    def load(cls, path: str, embedding: Embeddings, **kwargs: Any) -> "NumpyVectorStore":
+        """
+        Opens a persisted store.
+
+        Args:
+            path (str): The directory of the store.
+            embedding (Embeddings): The embedding function.
+            **kwargs: Additional arguments passed to the constructor.
+
+        Returns:
+            NumpyVectorStore: The store.
+        """
+        if not os.path.exists(os.path.join(path, "header.json")):
+            raise ValueError(f"No numpy vector store found in {path}")
+        return cls(path, embedding, **kwargs)
@@ -0,0 +1,237 @@
+import re
+from collections import deque
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from langchain.docstore.document import Document
+
+Span = Tuple[int, int]
+
+
+class OffsetTextSplitter:
+    """
+    Base class of the first-party splitters, which work on (start, end) character offsets into the source text.
+
+    No intermediate strings are created while splitting: a chunk's text is only sliced out of the source when
+    its Document is emitted, and every chunk records its offsets as `start_index` and `end_index` metadata.
+    """
+    def split_spans(self, text: str) -> Iterator[Span]:
+        """
+        Yields the (start, end) offsets of the chunks of a text.
+        """
+        raise NotImplementedError
+
+    def split_text(self, text: str) -> List[str]:
+        return [text[start:end] for start, end in self.split_spans(text)]
+
+    def iter_documents(self, docs: Iterable[Document], extra_metadata: Optional[Dict] = None) -> Iterator[Document]:
+        """
+        Lazily splits Documents into chunk Documents.
+
+        Args:
+            docs (Iterable[Document]): The Documents to split.
+            extra_metadata (Optional[Dict]): Extra metadata added to every chunk.
+
+        Yields:
+            Document: The chunks, each with its own copy of the parent metadata plus its start and end offsets.
+        """
+        for doc in docs:
+            yield from _chunk_documents(doc, self.split_spans(doc.page_content), extra_metadata)
+
+
+def _chunk_documents(doc: Document, spans: Iterable[Span], extra_metadata: Optional[Dict]) -> Iterator[Document]:
+    base = {**doc.metadata, **(extra_metadata or {})}
+    text = doc.page_content
+    for start, end in spans:
+        yield Document(page_content=text[start:end], metadata=dict(base, start_index=start, end_index=end))
+
+
+def _strip(text: str, start: int, end: int) -> Span:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _merge(text: str, pieces: Iterable[Span], chunk_size: int, chunk_overlap: int) -> Iterator[Span]:
+    """
+    Greedily merges consecutive pieces into chunks of at most chunk_size characters, carrying the trailing
+    pieces of a chunk over to the next one while they fit in chunk_overlap characters.
+    """
+    window: deque = deque()
+    for start, end in pieces:
+        if window and end - window[0][0] > chunk_size:
+            span = _strip(text, window[0][0], window[-1][1])
+            if span[1] > span[0]:
+                yield span
+            while window and (window[-1][1] - window[0][0] > chunk_overlap or end - window[0][0] > chunk_size):
+                window.popleft()
+        window.append((start, end))
+    if window:
+        span = _strip(text, window[0][0], window[-1][1])
+        if span[1] > span[0]:
+            yield span
+
+
+class RecursiveOffsetSplitter(OffsetTextSplitter):
+    """
+    Splits on the first separator that occurs in the text and recursively on the next separators for pieces
+    that are still longer than chunk_size, then merges the pieces back into chunks of at most chunk_size characters.
+    An empty separator splits an oversized piece into fixed windows.
+
+    Args:
+        chunk_size (int): The maximum number of characters per chunk.
+        chunk_overlap (int): The maximum number of characters shared by consecutive chunks.
+        separators (Sequence[str]): The separators, tried in order.
+    """
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200, separators: Sequence[str] = ("\n\n", "\n", " ", "")):
+        if chunk_overlap > chunk_size:
+            raise ValueError(f"chunk_overlap {chunk_overlap} is larger than chunk_size {chunk_size}")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = list(separators)
+
+    def _pieces(self, text: str, start: int, end: int, separators: List[str]) -> Iterator[Span]:
+        if end - start <= self.chunk_size or not separators:
+            yield start, end
+            return
+        index = next((i for i, separator in enumerate(separators) if separator == "" or text.find(separator, start, end) != -1), None)
+        if index is None:
+            yield start, end
+            return
+        separator, rest = separators[index], separators[index + 1:]
+        if separator == "":
+            for position in range(start, end, self.chunk_size):
+                yield position, min(position + self.chunk_size, end)
+            return
+        position = start
+        while position < end:
+            found = text.find(separator, position, end)
+            piece_end = end if found == -1 else found + len(separator)
+            if piece_end - position > self.chunk_size:
+                yield from self._pieces(text, position, piece_end, rest)
+            else:
+                yield position, piece_end
+            position = piece_end
+
+    def split_spans(self, text: str) -> Iterator[Span]:
+        return _merge(text, self._pieces(text, 0, len(text), self.separators), self.chunk_size, self.chunk_overlap)
+
+
+class CharacterOffsetSplitter(RecursiveOffsetSplitter):
+    """
+    Splits on a single separator and merges the pieces into chunks of at most chunk_size characters.
+    Pieces longer than chunk_size are kept whole.
+
+    Args:
+        chunk_size (int): The maximum number of characters per chunk.
+        chunk_overlap (int): The maximum number of characters shared by consecutive chunks.
+        separator (str): The separator.
+    """
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200, separator: str = "\n\n"):
+        super().__init__(chunk_size=chunk_size, chunk_overlap=chunk_overlap, separators=[separator])
+
+
+class TokenOffsetSplitter(OffsetTextSplitter):
+    """
+    Splits a text into windows of chunk_size whitespace-delimited tokens, consecutive windows sharing chunk_overlap tokens.
+
+    Args:
+        chunk_size (int): The number of tokens per chunk.
+        chunk_overlap (int): The number of tokens shared by consecutive chunks.
+    """
+    TOKEN = re.compile(r"\S+")
+
+    def __init__(self, chunk_size: int = 256, chunk_overlap: int = 0):
+        if chunk_overlap >= chunk_size:
+            raise ValueError(f"chunk_overlap {chunk_overlap} must be smaller than chunk_size {chunk_size}")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def split_spans(self, text: str) -> Iterator[Span]:
+        return _windows((match.span() for match in self.TOKEN.finditer(text)), self.chunk_size, self.chunk_overlap)
+
+
+def _windows(tokens: Iterable[Span], chunk_size: int, chunk_overlap: int) -> Iterator[Span]:
+    """
+    Groups token spans into windows of chunk_size tokens, consecutive windows sharing chunk_overlap tokens.
+    """
+    window: deque = deque()
+    new_tokens = 0
+    for token in tokens:
+        window.append(token)
+        new_tokens += 1
+        if len(window) == chunk_size:
+            yield window[0][0], window[-1][1]
+            for _ in range(chunk_size - chunk_overlap):
+                window.popleft()
+            new_tokens = 0
+    if new_tokens:
+        yield window[0][0], window[-1][1]
+
+
+@lru_cache(maxsize=8)
+def load_tokenizer(model_name: str):
+    """
+    Loads the fast tokenizer of a HuggingFace model once per process.
+    """
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(model_name, use_fast=True, trust_remote_code=True)
+
+
+class ModelTokenSplitter(OffsetTextSplitter):
+    """
+    Splits a text into windows of the embedding model's own tokens, so every chunk fits the model window.
+
+    Texts are tokenized in batches by the model's fast tokenizer and chunk boundaries are taken from its offset
+    mapping. The chunk size is capped at the model's maximum length minus the special tokens the model adds.
+
+    Args:
+        model_name (str): The HuggingFace name of the embedding model.
+        chunk_size (Optional[int]): The number of tokens per chunk. Defaults to the model window.
+        chunk_overlap (int): The number of tokens shared by consecutive chunks.
+        batch_size (int): The number of texts tokenized per call.
+        tokenizer (Optional[Any]): A fast tokenizer to use instead of loading the model's.
+    """
+    def __init__(self, model_name: str = "BAAI/bge-large-en-v1.5", chunk_size: Optional[int] = None, chunk_overlap: int = 0, batch_size: int = 32, tokenizer: Optional[Any] = None):
+        self.tokenizer = tokenizer or load_tokenizer(model_name)
+        if not getattr(self.tokenizer, "is_fast", True):
+            raise ValueError(f"{model_name} has no fast tokenizer, which is required for offset mapping")
+        self.max_tokens = self.model_window(self.tokenizer)
+        self.chunk_size = min(chunk_size, self.max_tokens) if chunk_size else self.max_tokens
+        if chunk_overlap >= self.chunk_size:
+            raise ValueError(f"chunk_overlap {chunk_overlap} must be smaller than chunk_size {self.chunk_size}")
+        self.chunk_overlap = chunk_overlap
+        self.batch_size = batch_size
+
+    @staticmethod
+    def model_window(tokenizer) -> int:
+        """
+        Returns the number of text tokens that fit the model window once special tokens are added.
+        """
+        max_length = tokenizer.model_max_length
+        if max_length > 100_000:
+            # Tokenizers without a configured window report a huge sentinel value
+            max_length = 512
+        return max_length - tokenizer.num_special_tokens_to_add(pair=False)
+
+    def _offsets(self, texts: List[str]) -> List[List[Span]]:
+        encoding = self.tokenizer(texts, add_special_tokens=False, return_offsets_mapping=True, return_attention_mask=False, verbose=False)
+        return [[(start, end) for start, end in offsets if end > start] for offsets in encoding["offset_mapping"]]
+
+    def split_spans(self, text: str) -> Iterator[Span]:
+        return _windows(self._offsets([text])[0], self.chunk_size, self.chunk_overlap)
+
+    def iter_documents(self, docs: Iterable[Document], extra_metadata: Optional[Dict] = None) -> Iterator[Document]:
+        batch: List[Document] = []
+        for doc in docs:
+            batch.append(doc)
+            if len(batch) == self.batch_size:
+                yield from self._emit(batch, extra_metadata)
+                batch = []
+        if batch:
+            yield from self._emit(batch, extra_metadata)
+
+    def _emit(self, docs: List[Document], extra_metadata: Optional[Dict]) -> Iterator[Document]:
+        for doc, offsets in zip(docs, self._offsets([doc.page_content for doc in docs])):
+            yield from _chunk_documents(doc, _windows(offsets, self.chunk_size, self.chunk_overlap), extra_metadata)
@@ -0,0 +1,176 @@
+import time
+import random
+import contextvars
+import logging
+import threading
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from langchain_core.embeddings import Embeddings
+from .instrumentation import instrumented, span
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+@dataclass
+class OllamaMetrics:
+    """
+    The throughput of an OllamaEmbeddingClient.
+
+    Attributes:
+        texts (int): The texts embedded.
+        requests (int): The HTTP requests that succeeded.
+        retries (int): The requests that were retried after a connection error, a timeout or a 429/5xx response.
+        failures (int): The requests that failed after their last retry.
+        seconds (float): The wall time spent in embed calls.
+        request_seconds (float): The sum of the latencies of the successful requests.
+    """
+    texts: int = 0
+    requests: int = 0
+    retries: int = 0
+    failures: int = 0
+    seconds: float = 0.0
+    request_seconds: float = 0.0
+
+    @property
+    def texts_per_second(self) -> float:
+        return self.texts / self.seconds if self.seconds else 0.0
+
+    @property
+    def mean_request_seconds(self) -> float:
+        return self.request_seconds / self.requests if self.requests else 0.0
+
+
+class OllamaEmbeddingClient(Embeddings):
+    """
+    An Ollama embedding client that embeds many texts per request over a pool of keep-alive connections.
+
+    Texts are sent in batches of batch_size to the /api/embed endpoint, with at most max_concurrency requests
+    in flight. Connection errors, timeouts and 429/5xx responses are retried with exponential backoff and jitter.
+    Servers older than /api/embed are detected on the first 404 that is not about a missing model, and served
+    one text per request from /api/embeddings, still concurrently and over the same pool.
+
+    Args:
+        model (str): The name of the Ollama model.
+        base_url (str): The URL of the Ollama server.
+        batch_size (int): The number of texts per request.
+        max_concurrency (int): The maximum number of concurrent requests, and the size of the connection pool.
+        max_retries (int): The number of retries of a failed request.
+        backoff (float): The delay before the first retry in seconds, doubled on every retry.
+        timeout (float): The timeout of a request in seconds.
+        keep_alive (Optional[str]): How long Ollama keeps the model loaded after a request, e.g. 5m.
+        truncate (bool): Whether Ollama truncates texts longer than the model context instead of failing.
+        options (Optional[Dict[str, Any]]): Model options such as num_ctx or num_thread.
+        query_prefix (str): A prefix added to queries, e.g. "search_query: " for nomic-embed-text.
+        document_prefix (str): A prefix added to documents, e.g. "search_document: " for nomic-embed-text.
+    """
+    def __init__(self, model: str = "llama2", base_url: str = "http://localhost:11434", batch_size: int = 64, max_concurrency: int = 4, max_retries: int = 3, backoff: float = 0.5, timeout: float = 60, keep_alive: Optional[str] = None, truncate: bool = True, options: Optional[Dict[str, Any]] = None, query_prefix: str = "", document_prefix: str = ""):
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.truncate = truncate
+        self.options = options
+        self.query_prefix = query_prefix
+        self.document_prefix = document_prefix
+        self.metrics = OllamaMetrics()
+        self.logger = logging.getLogger(__name__)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._legacy = False
+        self._metrics_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self.session.close()
+
+    def _post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        import requests
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                response = self.session.post(f"{self.base_url}{path}", json=payload, timeout=self.timeout)
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    with self._metrics_lock:
+                        self.metrics.requests += 1
+                        self.metrics.request_seconds += time.perf_counter() - start
+                    return response.json()
+                error: Exception = requests.HTTPError(f"{response.status_code} {response.text}", response=response)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            if attempt == self.max_retries:
+                with self._metrics_lock:
+                    self.metrics.failures += 1
+                raise ValueError(f"Error raised by inference endpoint: {error}")
+            with self._metrics_lock:
+                self.metrics.retries += 1
+            time.sleep(self.backoff * 2 ** attempt * (0.5 + random.random()))
+
+    def _payload(self, **fields: Any) -> Dict[str, Any]:
+        payload = {"model": self.model, **fields}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        if self.options:
+            payload["options"] = self.options
+        return payload
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        import requests
+        with span("ollama.request", batch_size=len(texts)):
+            if not self._legacy:
+                try:
+                    return self._post("/api/embed", self._payload(input=texts, truncate=self.truncate))["embeddings"]
+                except requests.HTTPError as e:
+                    # Ollama also answers 404 for a model that has not been pulled
+                    body = e.response.text if e.response is not None else ""
+                    if e.response is None or e.response.status_code != 404 or "model" in body.lower():
+                        raise ValueError(f"Error raised by inference endpoint: {e} {body}")
+                    self.logger.info(f"{self.base_url} has no /api/embed endpoint, embedding one text per request")
+                    self._legacy = True
+            return [self._post("/api/embeddings", self._payload(prompt=text))["embedding"] for text in texts]
+
+    def _map(self, fn, items: List[Any]) -> List[Any]:
+        if len(items) == 1 or self.max_concurrency == 1:
+            return [fn(item) for item in items]
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="open_retrieval_ollama")
+        # run in copies of the caller's context so instrumentation spans keep their parent
+        futures = [self._executor.submit(contextvars.copy_context().run, fn, item) for item in items]
+        return [future.result() for future in futures]
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds texts in concurrent batches, returning the embeddings in the order of texts.
+        """
+        start = time.perf_counter()
+        if self._legacy:
+            embeddings = self._map(lambda text: self._embed_batch([text])[0], texts)
+        else:
+            batches = self._map(self._embed_batch, [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)])
+            embeddings = [embedding for batch in batches for embedding in batch]
+        with self._metrics_lock:
+            self.metrics.texts += len(texts)
+            self.metrics.seconds += time.perf_counter() - start
+        return embeddings
+
+    @instrumented("embeddings.ollama", lambda result, self, texts: {"items": len(texts)})
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed([self.document_prefix + text for text in texts])
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed([self.query_prefix + text])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self.embed([self.query_prefix + text for text in texts])
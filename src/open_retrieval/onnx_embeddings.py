@@ -0,0 +1,143 @@
+import os
+import logging
+from typing import Any, Dict, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from .offset_splitters import load_tokenizer
+
+POOLINGS = ("cls", "mean")
+
+
+def default_cache_dir() -> str:
+    return os.path.join(os.path.expanduser("~"), ".cache", "open_retrieval", "onnx")
+
+
+def export_onnx(model_name: str, output_dir: str, quantize: bool = False) -> str:
+    """
+    Exports a HuggingFace encoder to ONNX with optimum, optionally with int8 dynamic quantization of its weights,
+    and saves its tokenizer next to it. The export is skipped when the graph already exists.
+
+    Args:
+        model_name (str): The name of the HuggingFace model.
+        output_dir (str): The directory the graph and tokenizer are written to.
+        quantize (bool): Whether to also write an int8 dynamically quantized graph.
+
+    Returns:
+        str: The path of the graph to load.
+    """
+    model_path = os.path.join(output_dir, "model.onnx")
+    if not os.path.exists(model_path):
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        ORTModelForFeatureExtraction.from_pretrained(model_name, export=True, trust_remote_code=True).save_pretrained(output_dir)
+        load_tokenizer(model_name).save_pretrained(output_dir)
+    if not quantize:
+        return model_path
+    quantized_path = os.path.join(output_dir, "model_int8.onnx")
+    if not os.path.exists(quantized_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+    return quantized_path
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    A CPU embedding engine that runs an exported ONNX Runtime graph of a HuggingFace encoder.
+
+    Texts are tokenized once without padding and sorted by token length, so every batch holds texts of
+    similar length and is only padded to its own longest text instead of the longest text of a random batch.
+    The embeddings are written back in the original order of the texts.
+
+    Args:
+        model_name (str): The name of the HuggingFace model.
+        cache_dir (Optional[str]): The directory exported graphs are cached in. Defaults to ~/.cache/open_retrieval/onnx.
+        quantize (bool): Whether to run the int8 dynamically quantized graph.
+        intra_op_threads (Optional[int]): The threads used inside an operator. Defaults to the number of CPUs.
+        inter_op_threads (int): The threads used to run independent operators in parallel.
+        batch_size (int): The maximum number of texts per inference call.
+        max_length (int): The maximum number of tokens per text, longer texts are truncated.
+        pooling (str): How token states are turned into an embedding, cls or mean.
+        normalize (bool): Whether embeddings are scaled to unit length.
+        query_instruction (str): A prefix added to queries, e.g. the retrieval instruction of BGE models.
+        session: An onnxruntime InferenceSession to use instead of exporting the model.
+        tokenizer: A fast tokenizer to use instead of the tokenizer of the model.
+    """
+    def __init__(self, model_name: str = "BAAI/bge-large-en-v1.5", cache_dir: Optional[str] = None, quantize: bool = False, intra_op_threads: Optional[int] = None, inter_op_threads: int = 1, batch_size: int = 32, max_length: int = 512, pooling: str = "cls", normalize: bool = True, query_instruction: str = "", session: Any = None, tokenizer: Any = None):
+        if pooling not in POOLINGS:
+            raise ValueError('Invalid pooling value: Expecting one of cls or mean')
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.pooling = pooling
+        self.normalize = normalize
+        self.query_instruction = query_instruction
+        self.logger = logging.getLogger(__name__)
+        if session is None:
+            import onnxruntime as ort
+            output_dir = os.path.join(cache_dir or default_cache_dir(), model_name.replace("/", "--"))
+            model_path = export_onnx(model_name, output_dir, quantize=quantize)
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = intra_op_threads or os.cpu_count() or 1
+            options.inter_op_num_threads = inter_op_threads
+            options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+            tokenizer = tokenizer or load_tokenizer(output_dir)
+        self.session = session
+        self.tokenizer = tokenizer or load_tokenizer(model_name)
+        self.input_names = {node.name for node in session.get_inputs()}
+
+    def _feeds(self, token_ids: List[List[int]]) -> Dict[str, np.ndarray]:
+        length = max(len(ids) for ids in token_ids)
+        input_ids = np.full((len(token_ids), length), self.tokenizer.pad_token_id or 0, dtype=np.int64)
+        attention_mask = np.zeros((len(token_ids), length), dtype=np.int64)
+        for row, ids in enumerate(token_ids):
+            input_ids[row, :len(ids)] = ids
+            attention_mask[row, :len(ids)] = 1
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        return feeds
+
+    def _pool(self, hidden: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        if self.pooling == "cls":
+            embeddings = hidden[:, 0]
+        else:
+            mask = attention_mask[:, :, None].astype(hidden.dtype)
+            embeddings = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1)
+        if self.normalize:
+            embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embeds texts in length-sorted batches.
+
+        Args:
+            texts (List[str]): The texts.
+
+        Returns:
+            np.ndarray: The embeddings, one row per text in the order of texts.
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        token_ids = self.tokenizer(list(texts), truncation=True, max_length=self.max_length, padding=False)["input_ids"]
+        order = np.argsort([len(ids) for ids in token_ids], kind="stable")
+        result = None
+        for start in range(0, len(order), self.batch_size):
+            rows = order[start:start + self.batch_size]
+            feeds = self._feeds([token_ids[row] for row in rows])
+            hidden = self.session.run(None, feeds)[0]
+            embeddings = self._pool(hidden, feeds["attention_mask"])
+            if result is None:
+                result = np.empty((len(texts), embeddings.shape[1]), dtype=np.float32)
+            result[rows] = embeddings
+        return result
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed([self.query_instruction + text])[0].tolist()
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self.embed([self.query_instruction + text for text in texts]).tolist()
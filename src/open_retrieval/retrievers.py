@@ -1,28 +1,510 @@
-from rerankers import Reranker
-from typing import Optional, Dict
+import json
+import time
+import hashlib
+import asyncio
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import TYPE_CHECKING, Optional, Dict, Iterator, List, Tuple, Union, Callable, Any
+from langchain.docstore.document import Document
+from .caches import LRUCache, index_version
+from .colbert_store import ColBERTStore
+from .embedding_cache import embed_queries, normalize_text
+from .fusion import content_hash, reciprocal_rank_fusion, weighted_score_fusion
+from .instrumentation import annotate, instrumented, span
+from .lexical_index import BM25Index
+from .micro_batching import MicroBatcher
+from .utils.classifier import is_related
+
+if TYPE_CHECKING:
+    from rerankers import Reranker
+
+
+def ranker_name(ranker: Any) -> str:
+    """
+    Returns the identity of a reranker in the rerank cache: its class and model name, or the instance when it has no model name.
+    """
+    model = getattr(ranker, "model", None)
+    name = getattr(ranker, "model_name", None) or (model if isinstance(model, str) else getattr(model, "name_or_path", None))
+    return f"{type(ranker).__name__}:{name or id(ranker)}"
+
 class Retriever:
-    def __init__(self, vector_index, ranker: Optional[Reranker] = None):
+    def __init__(self, vector_index, ranker: Optional["Reranker"] = None, lexical_index: Optional[BM25Index] = None, cache: Optional[LRUCache] = None, query_cache: Optional[LRUCache] = None, max_workers: int = 4, max_batch_size: int = 32, max_wait: float = 0.005, rephrase_cache: Optional[LRUCache] = None, classifier=None, rerank_cache: Optional[LRUCache] = None, rerank_batch_size: Optional[int] = None, rerank_token_budget: Optional[int] = None, colbert_store: Optional[ColBERTStore] = None):
+        """
+        A class for retrieving the chunks related to a query from a vector index.
+
+        Args:
+            vector_index: The vector index to search.
+            ranker (Optional[Reranker]): The reranker used by ranked_retrieval.
+            lexical_index (Optional[BM25Index]): The BM25 index used by hybrid_retrieval.
+            cache (Optional[LRUCache]): Caches retrieval results per (normalized query, parameters, filter, index version).
+            query_cache (Optional[LRUCache]): Caches query embeddings per normalized query.
+            max_workers (int): The number of threads the async methods offload embedding, search and reranking to.
+            max_batch_size (int): The maximum number of concurrent async requests coalesced into one embedding or rerank batch.
+            max_wait (float): The number of seconds an async request waits for others to join its batch.
+            rephrase_cache (Optional[LRUCache]): Caches the rephrased queries of multi_query_retrieval per normalized query, skipping the LLM round trip.
+            classifier (Optional[Classifier]): The LLM relevance classifier used by filtered_retrieval.
+            rerank_cache (Optional[LRUCache]): Caches reranker scores per (reranker, query hash, chunk hash), so only unseen chunks are reranked. The positions returned by rank-only rerankers are not cached.
+            rerank_batch_size (Optional[int]): The maximum number of chunks per reranker call. Everything is reranked in one call when None, and always for rank-only rerankers.
+            rerank_token_budget (Optional[int]): The maximum number of query plus chunk words per reranker call.
+            colbert_store (Optional[ColBERTStore]): Precomputed ColBERT token embeddings of the chunks. When set, reranking encodes only the query and scores the chunks by MaxSim against their stored matrices instead of calling the ranker.
+        """
         self.vector_database = vector_index
         self.reranker = ranker
-        
+        self.lexical_index = lexical_index
+        self.cache = cache
+        self.query_cache = query_cache
+        self.max_workers = max_workers
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.rephrase_cache = rephrase_cache
+        self.classifier = classifier
+        self.rerank_cache = rerank_cache
+        self.rerank_batch_size = rerank_batch_size
+        self.rerank_token_budget = rerank_token_budget
+        self.colbert_store = colbert_store
+        self.stage_timings: Dict[str, float] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._embed_batcher: Optional[MicroBatcher] = None
+        self._rerank_batcher: Optional[MicroBatcher] = None
+        self._rank_only = False
+
+    @instrumented("retriever.naive_retrieval", lambda result, *args, **kwargs: {"items": len(result)})
     def naive_retrieval(self, query: str, top_k: int = 5, filter: Optional[Dict[str, str]] = None ):
         """
         Naive Retrieval
         """
-        top_k_results = self.vector_database.similarity_search(query=query, k=top_k, filter=filter)
-        return [doc.page_content for doc  in top_k_results]
-    
+        def retrieve():
+            top_k_results = self._dense_search(query, top_k, filter)
+            return [doc.page_content for doc  in top_k_results]
+        return self._cached("naive", query, (top_k,), filter, retrieve)
+
+    @instrumented("retriever.ranked_retrieval", lambda result, *args, **kwargs: {"items": len(result)})
     def ranked_retrieval(self, query: str, top_k: int = 15, ranked_top_k: int = 5, filter: Optional[Dict[str, str]] = None):
         """
         Retrieval With reranking
         """
-        docs =self.vector_database.similarity_search(query=query, k=top_k, filter = filter)
-        data = self.reranker.rank(query = query, docs = [doc.page_content for doc in docs])
-      
-        # Sort results by rank
-        sorted_results = sorted(data.results, key=lambda x: x.rank)
+        def retrieve():
+            docs = self._dense_search(query, top_k, filter)
+            return self._rerank(query, docs, ranked_top_k)
+        return self._cached("ranked", query, (top_k, ranked_top_k), filter, retrieve)
+
+    async def anaive_retrieval(self, query: str, top_k: int = 5, filter: Optional[Dict[str, str]] = None):
+        """
+        Async Naive Retrieval. Concurrent calls are embedded together in micro-batches and searched in a bounded thread pool.
+        """
+        async def retrieve():
+            docs = await self._adense_search(query, top_k, filter)
+            return [doc.page_content for doc in docs]
+        return await self._acached("naive", query, (top_k,), filter, retrieve)
+
+    async def aranked_retrieval(self, query: str, top_k: int = 15, ranked_top_k: int = 5, filter: Optional[Dict[str, str]] = None):
+        """
+        Async Retrieval With reranking. Concurrent calls are embedded and reranked together in micro-batches.
+        """
+        async def retrieve():
+            docs = await self._adense_search(query, top_k, filter)
+            return await self._batchers()[1].submit((query, docs, ranked_top_k))
+        return await self._acached("ranked", query, (top_k, ranked_top_k), filter, retrieve)
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="retriever")
+        return self._executor
+
+    def _batchers(self):
+        if self._embed_batcher is None:
+            self._pool()
+            self._embed_batcher = MicroBatcher(self._embed_queries, self.max_batch_size, self.max_wait, self._executor)
+            self._rerank_batcher = MicroBatcher(lambda items: [self._rerank(*item) for item in items], self.max_batch_size, self.max_wait, self._executor)
+        return self._embed_batcher, self._rerank_batcher
+
+    async def _adense_search(self, query: str, k: int, filter: Optional[Dict[str, str]]) -> List[Document]:
+        embed_batcher, _ = self._batchers()
+        vector = await embed_batcher.submit(query)
+        search = partial(self.vector_database.similarity_search_by_vector, vector, k=k, filter=filter)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, search)
+
+    async def _acached(self, kind: str, query: str, params: tuple, filter: Optional[Dict[str, str]], retrieve) -> List[Any]:
+        if self.cache is None:
+            return await retrieve()
+        key = self._cache_key(kind, query, params, filter)
+        result = self.cache.get(key)
+        if result is None:
+            start = time.perf_counter()
+            result = await retrieve()
+            self.cache.set(key, result, cost=time.perf_counter() - start)
+        return list(result)
+
+    def cache_stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns the statistics of the result, query embedding and rephrase caches.
+
+        Returns:
+            Dict[str, Dict[str, float]]: The hits, misses, hit rate and latency saved of every configured cache.
+        """
+        stats = {}
+        if self.cache is not None:
+            stats["results"] = self.cache.stats()
+        if self.query_cache is not None:
+            stats["query_embeddings"] = self.query_cache.stats()
+        if self.rephrase_cache is not None:
+            stats["rephrases"] = self.rephrase_cache.stats()
+        if self.rerank_cache is not None:
+            stats["rerank_scores"] = self.rerank_cache.stats()
+        return stats
+
+    def _cached(self, kind: str, query: str, params: tuple, filter: Optional[Dict[str, str]], retrieve: Callable[[], List[Any]]) -> List[Any]:
+        if self.cache is None:
+            return retrieve()
+        computed = []
+
+        def compute():
+            computed.append(True)
+            return retrieve()
+        result = list(self.cache.get_or_compute(self._cache_key(kind, query, params, filter), compute))
+        annotate(cache_hit=not computed)
+        return result
+
+    def _cache_key(self, kind: str, query: str, params: tuple, filter: Optional[Dict[str, str]]) -> tuple:
+        versions = (index_version(self.vector_database), index_version(self.lexical_index) if self.lexical_index is not None else None)
+        return (kind, normalize_text(query), params, json.dumps(filter, sort_keys=True, default=str), versions)
+
+    @instrumented("retriever.search", lambda result, *args, **kwargs: {"items": len(result)})
+    def _dense_search(self, query: str, k: int, filter: Optional[Dict[str, str]]) -> List[Document]:
+        if self.query_cache is None:
+            return self.vector_database.similarity_search(query=query, k=k, filter=filter)
+        return self.vector_database.similarity_search_by_vector(self._embed_queries([query])[0], k=k, filter=filter)
+
+    def hybrid_retrieval(self, query: str, top_k: int = 5, filter: Optional[Dict[str, str]] = None, fusion: str = "rrf", alpha: float = 0.5, candidates: Optional[int] = None, rrf_k: int = 60):
+        """
+        Retrieval fusing dense similarity search with BM25 lexical search.
+
+        Returns:
+            List[str]: The top_k texts. See hybrid_retrieval_with_scores for the arguments.
+        """
+        return [doc.page_content for doc, _ in self.hybrid_retrieval_with_scores(query, top_k, filter, fusion, alpha, candidates, rrf_k)]
+
+    def hybrid_retrieval_with_scores(self, query: str, top_k: int = 5, filter: Optional[Dict[str, str]] = None, fusion: str = "rrf", alpha: float = 0.5, candidates: Optional[int] = None, rrf_k: int = 60) -> List[Tuple[Document, float]]:
+        """
+        Hybrid retrieval that returns the chunks, with their metadata, and their fused scores.
+
+        Args:
+            query (str): The query.
+            top_k (int): The number of results.
+            filter (Optional[Dict[str, str]]): Metadata values the results must match.
+            fusion (str): The fusion method, rrf (reciprocal rank fusion) or weighted (min-max normalized score fusion).
+            alpha (float): The weight of the dense scores in weighted fusion, the lexical scores get 1 - alpha.
+            candidates (Optional[int]): The number of results fetched from each retriever before fusion. Defaults to 4 * top_k.
+            rrf_k (int): The rank smoothing constant of reciprocal rank fusion.
+
+        Returns:
+            List[Tuple[Document, float]]: The top_k chunks and their fused scores, best first.
+        """
+        if self.lexical_index is None:
+            raise ValueError("hybrid_retrieval requires a lexical_index")
+        if fusion not in ("rrf", "weighted"):
+            raise ValueError('Invalid fusion value: Expecting one of rrf or weighted')
+        candidates = candidates or 4 * top_k
+
+        def retrieve():
+            lexical = self.lexical_index.search(query, k=candidates, filter=filter)
+            if fusion == "rrf":
+                dense = self._dense_search(query, candidates, filter)
+                fused = reciprocal_rank_fusion([dense, [doc for doc, _ in lexical]], k=rrf_k)
+            else:
+                dense = self.vector_database.similarity_search_with_relevance_scores(query, k=candidates, filter=filter)
+                fused = weighted_score_fusion([dense, lexical], weights=[alpha, 1 - alpha])
+            return fused[:top_k]
+        return self._cached("hybrid_scores", query, (top_k, fusion, alpha, candidates, rrf_k), filter, retrieve)
+
+    def multi_query_retrieval(self, query: str, rephrasor=None, rephrased_queries: Optional[List[str]] = None, top_k: int = 5, ranked_top_k: int = 5, filter: Optional[Dict[str, str]] = None, rerank: bool = False, rrf_k: int = 60):
+        """
+        Retrieval fanning out over rephrasings of the query and fusing the results with reciprocal rank fusion.
+
+        All query variants are embedded in one batch and searched concurrently; chunks found by several
+        variants are deduplicated by content hash before fusion and optional reranking against the original query.
+
+        Args:
+            query (str): The query.
+            rephrasor (Optional[Rephrasor]): Produces the rephrased queries when they are neither given nor cached.
+            rephrased_queries (Optional[List[str]]): Precomputed rephrasings of the query.
+            top_k (int): The number of results fetched per query variant.
+            ranked_top_k (int): The number of results returned.
+            filter (Optional[Dict[str, str]]): Metadata values the results must match.
+            rerank (bool): Whether to rerank the fused results with the ranker.
+            rrf_k (int): The rank smoothing constant of reciprocal rank fusion.
+
+        Returns:
+            List[str]: The ranked_top_k texts.
+        """
+        variants = list(dict.fromkeys([query] + self._rephrase(query, rephrasor, rephrased_queries)))
+        vectors = self._embed_queries(variants)
+        rankings = list(self._pool().map(lambda vector: self.vector_database.similarity_search_by_vector(vector, k=top_k, filter=filter), vectors))
+        fused = [doc for doc, _ in reciprocal_rank_fusion(rankings, k=rrf_k)]
+        if rerank:
+            return self._rerank(query, fused, ranked_top_k)
+        return [doc.page_content for doc in fused[:ranked_top_k]]
+
+    def _rephrase(self, query: str, rephrasor, rephrased_queries: Optional[List[str]]) -> List[str]:
+        if rephrased_queries is not None:
+            return list(rephrased_queries)
+        key = normalize_text(query)
+        if self.rephrase_cache is not None and key in self.rephrase_cache:
+            return self.rephrase_cache.get(key)
+        if rephrasor is None:
+            raise ValueError("multi_query_retrieval requires a rephrasor when the rephrased queries are neither given nor cached")
+        start = time.perf_counter()
+        rephrased = list(rephrasor.predict_json(query)["rephrased_queries"])
+        if self.rephrase_cache is not None:
+            self.rephrase_cache.set(key, rephrased, cost=time.perf_counter() - start)
+        return rephrased
+
+    def filtered_retrieval(self, query: str, top_k: int = 15, ranked_top_k: int = 5, filter: Optional[Dict[str, str]] = None, max_concurrency: int = 8):
+        """
+        Retrieval followed by LLM relevance filtering of the candidates with the classifier.
+
+        The candidates are classified in parallel, in retrieval order, and classification stops as soon as
+        ranked_top_k relevant chunks are found. The duration of every stage is stored in stage_timings.
+
+        Args:
+            query (str): The query.
+            top_k (int): The number of candidates fetched before filtering.
+            ranked_top_k (int): The number of relevant results returned.
+            filter (Optional[Dict[str, str]]): Metadata values the results must match.
+            max_concurrency (int): The maximum number of concurrent classifier calls.
+
+        Returns:
+            List[str]: Up to ranked_top_k texts judged relevant, in retrieval order.
+        """
+        if self.classifier is None:
+            raise ValueError("filtered_retrieval requires a classifier")
+        start = time.perf_counter()
+        contents = [doc.page_content for doc in self._dense_search(query, top_k, filter)]
+        searched = time.perf_counter()
+        verdicts = self.classifier.batch_predict_json(query, contents, max_concurrency=max_concurrency, min_relevant=ranked_top_k)
+        self.stage_timings = {"search": searched - start, "classify": time.perf_counter() - searched}
+        return [content for content, verdict in zip(contents, verdicts) if is_related(verdict)][:ranked_top_k]
+
+    @instrumented("retriever.naive_retrieval_batch", lambda result, self, queries, *args, **kwargs: {"items": sum(map(len, result)), "batch_size": len(queries)})
+    def naive_retrieval_batch(self, queries: List[str], top_k: int = 5, filters: Optional[Union[Dict[str, str], List[Optional[Dict[str, str]]]]] = None):
+        """
+        Naive Retrieval for a list of queries, embedding all queries in one batched call.
+
+        Args:
+            queries (List[str]): The queries.
+            top_k (int): The number of results per query.
+            filters: A filter applied to every query, or a list with one filter (or None) per query.
+
+        Returns:
+            List[List[str]]: The top_k texts of every query.
+        """
+        results = self._search_batch(queries, top_k, filters)
+        return [[doc.page_content for doc in docs] for docs in results]
+
+    @instrumented("retriever.ranked_retrieval_batch", lambda result, self, queries, *args, **kwargs: {"items": sum(map(len, result)), "batch_size": len(queries)})
+    def ranked_retrieval_batch(self, queries: List[str], top_k: int = 15, ranked_top_k: int = 5, filters: Optional[Union[Dict[str, str], List[Optional[Dict[str, str]]]]] = None):
+        """
+        Retrieval with reranking for a list of queries, embedding all queries in one batched call.
+
+        Args:
+            queries (List[str]): The queries.
+            top_k (int): The number of candidates fetched per query before reranking.
+            ranked_top_k (int): The number of results kept per query after reranking.
+            filters: A filter applied to every query, or a list with one filter (or None) per query.
+
+        Returns:
+            List[List[str]]: The ranked_top_k texts of every query.
+        """
+        results = self._search_batch(queries, top_k, filters)
+        return [self._rerank(query, docs, ranked_top_k) for query, docs in zip(queries, results)]
+
+    def ranked_retrieval_with_scores(self, query: str, top_k: int = 15, ranked_top_k: int = 5, filter: Optional[Dict[str, str]] = None, adaptive: bool = False, initial_candidates: Optional[int] = None, step: Optional[int] = None, score_gap: float = 0.1) -> List[Tuple[Document, float]]:
+        """
+        Retrieval with reranking that returns the chunks, with their metadata, and their reranker scores.
+
+        In adaptive mode the top_k candidates are fetched with their dense relevance scores but only the first
+        initial_candidates are reranked. The pool grows by step candidates at a time while the next candidate's
+        dense score is within score_gap of the weakest dense score among the current ranked_top_k, i.e. while
+        the tail could still plausibly enter the final results.
+
+        Args:
+            query (str): The query.
+            top_k (int): The maximum number of candidates fetched before reranking.
+            ranked_top_k (int): The number of results kept after reranking.
+            filter (Optional[Dict[str, str]]): Metadata values the results must match.
+            adaptive (bool): Whether to grow the candidate pool adaptively instead of reranking all top_k candidates.
+            initial_candidates (Optional[int]): The number of candidates reranked first in adaptive mode. Defaults to 2 * ranked_top_k.
+            step (Optional[int]): The number of candidates added per expansion in adaptive mode. Defaults to ranked_top_k.
+            score_gap (float): The dense relevance score gap beyond which the tail is not reranked in adaptive mode.
+
+        Returns:
+            List[Tuple[Document, float]]: The ranked_top_k chunks and their reranker scores, best first.
+        """
+        def retrieve():
+            if not adaptive:
+                return self._rerank_with_scores(query, self._dense_search(query, top_k, filter), ranked_top_k)
+            candidates = self.vector_database.similarity_search_with_relevance_scores(query, k=top_k, filter=filter)
+            docs, dense = [doc for doc, _ in candidates], [score for _, score in candidates]
+            size = min(len(docs), initial_candidates or 2 * ranked_top_k)
+            scores = self._rerank_scores(query, docs[:size])
+            while size < len(docs):
+                top = sorted(range(size), key=lambda i: -scores[i])[:ranked_top_k]
+                if dense[size] < min(dense[i] for i in top) - score_gap:
+                    break
+                added = docs[size:size + (step or ranked_top_k)]
+                size += len(added)
+                # the positions of rank-only rerankers only compare within one call, so they rerank the whole pool
+                scores = self._rerank_scores(query, docs[:size]) if self._rank_only else scores + self._rerank_scores(query, added)
+            annotate(candidates_reranked=size)
+            order = sorted(range(size), key=lambda i: -scores[i])[:ranked_top_k]
+            return [(docs[i], scores[i]) for i in order]
+        return self._cached("ranked_scores", query, (top_k, ranked_top_k, adaptive, initial_candidates, step, score_gap), filter, retrieve)
+
+    def _rerank(self, query: str, docs: List[Document], ranked_top_k: int) -> List[str]:
+        return [doc.page_content for doc, _ in self._rerank_with_scores(query, docs, ranked_top_k)]
+
+    def _rerank_with_scores(self, query: str, docs: List[Document], ranked_top_k: int) -> List[Tuple[Document, float]]:
+        scores = self._rerank_scores(query, docs)
+        order = sorted(range(len(docs)), key=lambda i: -scores[i])
+        return [(docs[i], scores[i]) for i in order[:ranked_top_k]]
+
+    def _rerank_scores(self, query: str, docs: List[Document]) -> List[float]:
+        """
+        Scores chunks against a query with the reranker, serving known (query, chunk) pairs from the rerank cache
+        and scoring the rest in batches. Scores of different batches are compared directly, which holds for
+        pointwise rerankers such as cross-encoders and ColBERT. Rank-only rerankers score every chunk in one
+        call and their positions are not cached.
+        """
+        query_hash = hashlib.sha256(normalize_text(query).encode("utf-8")).hexdigest()
+        ranker = self._ranker_key()
+        keys = [(ranker, query_hash, content_hash(doc)) for doc in docs]
+        scores: Dict[tuple, float] = {}
+        if self.rerank_cache is not None:
+            for key in keys:
+                score = self.rerank_cache.get(key)
+                if score is not None:
+                    scores[key] = score
+        missing, seen = [], set(scores)
+        for i, key in enumerate(keys):
+            if key not in seen:
+                seen.add(key)
+                missing.append(i)
+        for indices, batch_scores, cost, cacheable in self._score_batches(query, docs, missing):
+            for i, score in zip(indices, batch_scores):
+                scores[keys[i]] = score
+                if cacheable and self.rerank_cache is not None:
+                    self.rerank_cache.set(keys[i], score, cost=cost)
+        return [scores[key] for key in keys]
+
+    def _ranker_key(self) -> str:
+        if self.colbert_store is not None:
+            encoder = self.colbert_store.encoder
+            return "colbert_store:" + ranker_name(encoder.ranker if encoder is not None else None)
+        return ranker_name(self.reranker)
+
+    def _score_batches(self, query: str, docs: List[Document], indices: List[int]) -> Iterator[Tuple[List[int], List[float], float, bool]]:
+        """
+        Scores the chunks at the given indices, yielding the indices, scores, per-chunk cost and cacheability of every reranker call.
+        """
+        if not indices:
+            return
+        if self.colbert_store is not None:
+            with span("retriever.rerank", batch_size=len(indices)):
+                start = time.perf_counter()
+                batch_scores = self.colbert_store.score(query, [docs[i] for i in indices])
+            yield indices, batch_scores, (time.perf_counter() - start) / len(indices), True
+            return
+        for batch in self._rerank_batches(query, [docs[i] for i in indices]):
+            batch = [indices[i] for i in batch]
+            data, cost = self._rank(query, docs, batch)
+            if any(result.score is None for result in data.results):
+                # rank-only rerankers return positions, which only compare within one call
+                self._rank_only = True
+                if len(batch) < len(indices):
+                    batch = indices
+                    data, cost = self._rank(query, docs, batch)
+                batch_scores = [0.0] * len(batch)
+                for result in data.results:
+                    batch_scores[result.document.doc_id] = -float(result.rank)
+                yield batch, batch_scores, cost, False
+                return
+            batch_scores = [0.0] * len(batch)
+            for result in data.results:
+                batch_scores[result.document.doc_id] = float(result.score)
+            yield batch, batch_scores, cost, True
+
+    def _rank(self, query: str, docs: List[Document], batch: List[int]):
+        with span("retriever.rerank", batch_size=len(batch)):
+            start = time.perf_counter()
+            data = self.reranker.rank(query=query, docs=[docs[i].page_content for i in batch], doc_ids=list(range(len(batch))))
+        return data, (time.perf_counter() - start) / len(batch)
+
+    def _rerank_batches(self, query: str, docs: List[Document]) -> List[List[int]]:
+        batch_size = self.rerank_batch_size or len(docs) or 1
+        query_tokens = len(query.split())
+        batches: List[List[int]] = []
+        current: List[int] = []
+        tokens = 0
+        for i, doc in enumerate(docs):
+            doc_tokens = query_tokens + len(doc.page_content.split())
+            if current and (len(current) == batch_size or (self.rerank_token_budget and tokens + doc_tokens > self.rerank_token_budget)):
+                batches.append(current)
+                current, tokens = [], 0
+            current.append(i)
+            tokens += doc_tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    @instrumented("retriever.embed_queries", lambda result, self, queries: {"batch_size": len(queries)})
+    def _embed_queries(self, queries: List[str]) -> List[List[float]]:
+        embedding_function = self.vector_database.embeddings
+        if self.query_cache is None:
+            return embed_queries(embedding_function, queries)
+
+        keys = [normalize_text(query) for query in queries]
+        vectors = [self.query_cache.get(key) for key in keys]
+        missing = list(dict.fromkeys(key for key, vector in zip(keys, vectors) if vector is None))
+        if missing:
+            start = time.perf_counter()
+            computed = dict(zip(missing, embed_queries(embedding_function, missing)))
+            cost = (time.perf_counter() - start) / len(missing)
+            for key, vector in computed.items():
+                self.query_cache.set(key, vector, cost=cost)
+            vectors = [computed[key] if vector is None else vector for key, vector in zip(keys, vectors)]
+        return vectors
+
+    @instrumented("retriever.search_batch", lambda result, self, queries, *args, **kwargs: {"items": sum(map(len, result)), "batch_size": len(queries)})
+    def _search_batch(self, queries: List[str], top_k: int, filters) -> List[List[Document]]:
+        if filters is None or isinstance(filters, dict):
+            filters = [filters] * len(queries)
+        if len(filters) != len(queries):
+            raise ValueError("Expecting one filter per query")
+
+        vectors = self._embed_queries(queries)
+        from langchain_community.vectorstores import FAISS
+        if isinstance(self.vector_database, FAISS) and all(f is None for f in filters):
+            return self._faiss_search_batch(vectors, top_k)
+        if hasattr(self.vector_database, "similarity_search_by_vectors"):
+            # one vectorized search per distinct filter
+            groups: Dict[str, List[int]] = {}
+            for i, f in enumerate(filters):
+                groups.setdefault(json.dumps(f, sort_keys=True, default=str), []).append(i)
+            results: List[List[Document]] = [[] for _ in queries]
+            for positions in groups.values():
+                group_results = self.vector_database.similarity_search_by_vectors([vectors[i] for i in positions], k=top_k, filter=filters[positions[0]])
+                for i, docs in zip(positions, group_results):
+                    results[i] = docs
+            return results
+        return [self.vector_database.similarity_search_by_vector(vector, k=top_k, filter=f) for vector, f in zip(vectors, filters)]
 
-        # Extract the text fields from the top 5 Result objects
-        top_5_texts = [result.text for result in sorted_results[:ranked_top_k]]
-        return  top_5_texts
+    def _faiss_search_batch(self, vectors: List[List[float]], top_k: int) -> List[List[Document]]:
+        import faiss
 
+        store = self.vector_database
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if store._normalize_L2:
+            faiss.normalize_L2(matrix)
+        _, indices = store.index.search(matrix, top_k)
+        return [[store.docstore.search(store.index_to_docstore_id[i]) for i in row if i != -1] for row in indices]
@@ -0,0 +1,294 @@
+import os
+import json
+import heapq
+import hashlib
+import threading
+import contextvars
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from langchain.docstore.document import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from .index_manifest import IndexManifest, SyncReport, chunk_id
+from .metadata_index import encode_value
+from .caches import bump_index_version
+from .instrumentation import annotate, instrumented
+
+SHARDABLE_STORES = ('chroma', 'faiss', 'qdrant', 'numpy')
+# stores whose scored search already returns similarities, the others return distances or raw scores
+SIMILARITY_STORES = ('qdrant',)
+
+
+def shard_of(key: str, num_shards: int) -> int:
+    """
+    Returns the shard of a chunk id or an encoded metadata value. The hash is stable across processes.
+    """
+    return int.from_bytes(hashlib.sha1(key.encode("utf-8")).digest()[:8], "big") % num_shards
+
+
+class ShardedVectorIndex(VectorStore):
+    """
+    A vector index partitioned across independent shards of a chroma, faiss, qdrant or numpy index.
+
+    Chunks are assigned to a shard by a hash of their chunk id, or of a metadata value when shard_key
+    is set, so all the chunks of a file_name land in the same shard. Every shard is written through an
+    IndexWriter into its own directory, so shards are built in parallel, persisted independently and updated
+    incrementally, and every qdrant shard gets the storage folder its local client locks.
+    The layout is recorded in `shards.json`, and a shard is only opened the first time a search needs
+    it: a query filtered on the shard key touches only the shards that can hold its values.
+
+    Searches run on every routed shard concurrently in a thread pool and the per-shard top-k lists are
+    merged with a heap. Scores are relevance scores (higher is better) so that shards of any backend merge.
+
+    Args:
+        path (str): The directory where the shards and the layout are persisted.
+        embedding (Embeddings): The embedding function.
+        vector_store (str): The backend of every shard, one of chroma, faiss, qdrant or numpy.
+        num_shards (int): The number of shards.
+        shard_key (Optional[str]): The metadata field that chunks are partitioned by. Defaults to the chunk id.
+        max_workers (Optional[int]): The number of threads that build and search shards. Defaults to one per shard, up to the CPU count.
+        **store_kwargs: Additional arguments passed to every shard.
+    """
+    def __init__(self, path: str, embedding: Embeddings, vector_store: str = "faiss", num_shards: int = 4, shard_key: Optional[str] = None, max_workers: Optional[int] = None, **store_kwargs: Any):
+        if vector_store not in SHARDABLE_STORES:
+            raise ValueError('Invalid vector_store value for sharding: Expecting one of chroma, faiss, qdrant or numpy')
+        if num_shards < 1:
+            raise ValueError("num_shards must be at least 1")
+        self.path = path
+        self.embedding = embedding
+        self.store_kwargs = store_kwargs
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(self._layout_file):
+            with open(self._layout_file) as f:
+                layout = json.load(f)
+            if (layout["vector_store"], layout["num_shards"], layout["shard_key"]) != (vector_store, num_shards, shard_key):
+                raise ValueError(f"Index {path} holds {layout['num_shards']} {layout['vector_store']} shards keyed by {layout['shard_key'] or 'chunk id'}, rebuild it to change the layout")
+            self.counts: List[int] = layout["counts"]
+        else:
+            self.counts = [0] * num_shards
+        self.vector_store = vector_store
+        self.num_shards = num_shards
+        self.shard_key = shard_key
+        self.max_workers = max_workers or min(num_shards, os.cpu_count() or 1)
+        self._shards: Dict[int, VectorStore] = {}
+        self._shard_locks = [threading.Lock() for _ in range(num_shards)]
+        self._write_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    @property
+    def _layout_file(self) -> str:
+        return os.path.join(self.path, "shards.json")
+
+    def _shard_name(self, shard: int) -> str:
+        return f"shard_{shard:03d}"
+
+    def _shard_dir(self, shard: int) -> str:
+        return os.path.join(self.path, self._shard_name(shard))
+
+    def _save_layout(self):
+        with open(self._layout_file + ".tmp", "w") as f:
+            json.dump({"vector_store": self.vector_store, "num_shards": self.num_shards, "shard_key": self.shard_key, "counts": self.counts}, f)
+        os.replace(self._layout_file + ".tmp", self._layout_file)
+
+    def _submit(self, fn, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="open_retrieval_shard")
+        # run in a copy of the caller's context so instrumentation spans keep their parent
+        return self._executor.submit(contextvars.copy_context().run, fn, *args)
+
+    def close(self):
+        """
+        Stops the worker threads and closes the open shards. The index can still be used afterwards, a new pool
+        is started and the shards are reopened on demand.
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        for shard in list(self._shards):
+            self._release(shard)
+
+    def _release(self, shard: int):
+        store = self._shards.pop(shard, None)
+        # a local qdrant client locks its storage folder until it is closed
+        if self.vector_store == 'qdrant' and store is not None and hasattr(getattr(store, "client", None), "close"):
+            store.client.close()
+
+    def shard_for(self, doc: Document) -> int:
+        """
+        Returns the shard a chunk is stored in.
+        """
+        if self.shard_key is None:
+            return shard_of(chunk_id(doc), self.num_shards)
+        return shard_of(encode_value(doc.metadata.get(self.shard_key)), self.num_shards)
+
+    def shard(self, shard: int) -> Optional[VectorStore]:
+        """
+        Returns a shard, opening it on first use, or None when the shard is empty.
+        """
+        if shard in self._shards:
+            return self._shards[shard]
+        if not self.counts[shard]:
+            return None
+        with self._shard_locks[shard]:
+            if shard not in self._shards:
+                from .vector_databases import VectorDatabase
+                self._shards[shard] = VectorDatabase(self.vector_store).create_index(self.embedding, self._shard_name(shard), index_dir=self._shard_dir(shard), **self.store_kwargs)
+        return self._shards[shard]
+
+    def _writer(self, shard: int):
+        from .vector_databases import VectorDatabase
+        return VectorDatabase(self.vector_store).index_writer(self.embedding, self._shard_name(shard), index_dir=self._shard_dir(shard), **self.store_kwargs)
+
+    def _write_shard(self, shard: int, docs: List[Document], ids: List[str]) -> Tuple[Optional[VectorStore], SyncReport, int]:
+        with self._shard_locks[shard]:
+            if self.vector_store == 'qdrant':
+                # the writer reopens the shard, which the open client would keep locked
+                self._release(shard)
+            writer = self._writer(shard)
+            writer.add(docs)
+            writer.delete([id_ for id_ in ids if id_ in writer.manifest.chunks])
+            vector_index, report = writer.close()
+            return vector_index, report, len(writer.manifest.chunks)
+
+    def _write(self, groups: Dict[int, Tuple[List[Document], List[str]]]) -> SyncReport:
+        total = SyncReport()
+        with self._write_lock:
+            futures = {shard: self._submit(self._write_shard, shard, docs, ids) for shard, (docs, ids) in groups.items()}
+            for shard, future in futures.items():
+                vector_index, report, count = future.result()
+                if vector_index is not None:
+                    self._shards[shard] = vector_index
+                self.counts[shard] = count
+                total.added += report.added
+                total.skipped += report.skipped
+                total.removed += report.removed
+            self._save_layout()
+        bump_index_version(self)
+        return total
+
+    def add_documents(self, documents: List[Document], **kwargs: Any) -> List[str]:
+        """
+        Embeds and inserts the chunks that are not indexed yet, building the shards in parallel.
+
+        Args:
+            documents (List[Document]): The chunks to write.
+
+        Returns:
+            List[str]: The chunk ids.
+        """
+        self.sync(documents)
+        return [chunk_id(doc) for doc in documents]
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        return self.add_documents([Document(page_content=text, metadata=metadata) for text, metadata in zip(texts, metadatas)])
+
+    def sync(self, documents: List[Document]) -> SyncReport:
+        """
+        Writes chunks to their shards, skipping the ones that are already indexed.
+
+        Args:
+            documents (List[Document]): The chunks to write.
+
+        Returns:
+            SyncReport: The number of chunks added and skipped.
+        """
+        groups: Dict[int, Tuple[List[Document], List[str]]] = {}
+        for doc in documents:
+            groups.setdefault(self.shard_for(doc), ([], []))[0].append(doc)
+        return self._write(groups)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """
+        Deletes chunks by chunk id.
+
+        Args:
+            ids (Optional[List[str]]): The ids of the chunks to delete.
+
+        Returns:
+            Optional[bool]: True when the chunks were deleted.
+        """
+        if ids is None:
+            raise ValueError("No ids provided to delete.")
+        groups: Dict[int, Tuple[List[Document], List[str]]] = {}
+        if self.shard_key is None:
+            for id_ in ids:
+                groups.setdefault(shard_of(id_, self.num_shards), ([], []))[1].append(id_)
+        else:
+            # chunks are partitioned by metadata, so the shard manifests tell where an id lives
+            for shard in range(self.num_shards):
+                if self.counts[shard]:
+                    manifest = IndexManifest(os.path.join(self._shard_dir(shard), f"{self._shard_name(shard)}.manifest.json"))
+                    wanted = [id_ for id_ in ids if id_ in manifest.chunks]
+                    if wanted:
+                        groups[shard] = ([], wanted)
+        self._write(groups)
+        return True
+
+    def _route(self, filter: Optional[Dict[str, Any]]) -> List[int]:
+        shards: Set[int] = {shard for shard in range(self.num_shards) if self.counts[shard]}
+        if self.shard_key is not None and filter and self.shard_key in filter and not isinstance(filter[self.shard_key], dict):
+            value = filter[self.shard_key]
+            shards &= {shard_of(encode_value(item), self.num_shards) for item in (value if isinstance(value, list) else [value])}
+        return sorted(shards)
+
+    def _search_shard(self, shard: int, embeddings: List[List[float]], k: int, filter: Optional[Dict[str, Any]], kwargs: Dict[str, Any]) -> List[List[Tuple[Document, float]]]:
+        store = self.shard(shard)
+        relevance = (lambda score: score) if self.vector_store in SIMILARITY_STORES else store._select_relevance_score_fn()
+        # chroma only exposes a search by vector with scores under this name
+        search = getattr(store, "similarity_search_with_score_by_vector", None) or store.similarity_search_by_vector_with_relevance_scores
+        return [[(doc, relevance(score)) for doc, score in search(embedding, k=k, filter=filter, **kwargs)] for embedding in embeddings]
+
+    @instrumented("sharded_index.search", lambda result, self, embeddings, *args, **kwargs: {"batch_size": len(embeddings)})
+    def similarity_search_with_score_by_vectors(self, embeddings: List[List[float]], k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[List[Tuple[Document, float]]]:
+        """
+        Searches the routed shards concurrently for a batch of query embeddings and merges their results.
+
+        Args:
+            embeddings (List[List[float]]): The query embeddings.
+            k (int): The number of documents to return per query.
+            filter (Optional[Dict[str, Any]]): Metadata values the results must match.
+
+        Returns:
+            List[List[Tuple[Document, float]]]: The documents and relevance scores of every query, best first.
+        """
+        shards = self._route(filter)
+        annotate(shards=len(shards))
+        futures = [self._submit(self._search_shard, shard, embeddings, k, filter, kwargs) for shard in shards]
+        per_shard = [future.result() for future in futures]
+        return [list(islice(heapq.merge(*(hits[i] for hits in per_shard), key=lambda hit: -hit[1]), k)) for i in range(len(embeddings))]
+
+    def similarity_search_by_vectors(self, embeddings: List[List[float]], k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[List[Document]]:
+        return [[doc for doc, _ in hits] for hits in self.similarity_search_with_score_by_vectors(embeddings, k, filter, **kwargs)]
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vectors([embedding], k, filter, **kwargs)[0]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, filter, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k, filter, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: score
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, path: Optional[str] = None, **kwargs: Any) -> "ShardedVectorIndex":
+        """
+        Creates a sharded index at path and writes the texts to it.
+        """
+        if path is None:
+            raise ValueError("ShardedVectorIndex needs a path to persist its shards")
+        index = cls(path, embedding, **kwargs)
+        index.add_texts(texts, metadatas)
+        return index
@@ -1,7 +1,16 @@
 import logging
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Iterable, Iterator
 from langchain.docstore.document import Document
 from langchain.text_splitter import HTMLHeaderTextSplitter, CharacterTextSplitter, MarkdownHeaderTextSplitter, RecursiveCharacterTextSplitter,NLTKTextSplitter
+from .instrumentation import instrumented
+from .offset_splitters import CharacterOffsetSplitter, ModelTokenSplitter, RecursiveOffsetSplitter, TokenOffsetSplitter
+
+OFFSET_SPLITTERS = {
+    "fast_character": CharacterOffsetSplitter,
+    "fast_recursive": RecursiveOffsetSplitter,
+    "fast_token": TokenOffsetSplitter,
+    "model_token": ModelTokenSplitter,
+}
 
 class TextSplitter:
     """
@@ -59,13 +68,12 @@ class TextSplitter:
                 documents = splitter.create_documents(texts)
 
             for document in documents:
-                document.metadata = doc.metadata
-                if extra_metadata:
-                    document.metadata.update(extra_metadata)
+                document.metadata = {**doc.metadata, **(extra_metadata or {})}
 
             results.extend(documents)
         return results
 
+    @instrumented("text_splitter.split", lambda result, self, data, *args, **kwargs: {"items": len(result), "batch_size": len(data), "splitter": self.splitter})
     def split(self, data: List[Document], chunk_size: int = 1000, chunk_overlap: int = 200, extra_metadata: Optional[Dict] = None):
         """
         Splits a list of Documents into smaller Documents based on the selected splitter.
@@ -79,6 +87,9 @@ class TextSplitter:
         Returns:
             List[Document]: A list of split Documents.
         """
+        if self.splitter in OFFSET_SPLITTERS:
+            return list(self.iter_split(data, chunk_size=chunk_size, chunk_overlap=chunk_overlap, extra_metadata=extra_metadata))
+
         if self.splitter == "htmlheader":
             #https://python.langchain.com/docs/modules/data_connection/document_transformers/HTML_header_metadata
             splitter = HTMLHeaderTextSplitter(headers_to_split_on= self.splitter_args)
@@ -105,4 +116,30 @@ class TextSplitter:
             return self.modify_splitter(data=data, splitter=splitter, extra_metadata=extra_metadata)
         
         else:
-            raise ValueError('Invalid splitter value: Expecting one of htmlheader, character, markdownheader, recursive, or token')
\ No newline at end of file
+            raise ValueError('Invalid splitter value: Expecting one of htmlheader, character, markdownheader, recursive, token, fast_character, fast_recursive, fast_token or model_token')
+
+    def iter_split(self, data: Iterable[Document], chunk_size: int = 1000, chunk_overlap: int = 200, extra_metadata: Optional[Dict] = None) -> Iterator[Document]:
+        """
+        Lazily splits Documents, yielding chunks one at a time.
+
+        The fast_character, fast_recursive, fast_token and model_token splitters stream their chunks and
+        record the start_index and end_index character offsets of every chunk in its source Document. The
+        other splitters split the whole input first.
+
+        model_token sizes chunks with the tokenizer of the embedding model given as the model_name splitter
+        argument, capping chunk_size at the model window.
+
+        Args:
+            data (Iterable[Document]): The Documents to split.
+            chunk_size (int, optional): The size of each chunk, in tokens for fast_token and model_token. Defaults to 1000.
+            chunk_overlap (int, optional): The overlap between chunks. Defaults to 200.
+            extra_metadata (Optional[Dict]): Extra metadata added to every chunk.
+
+        Yields:
+            Document: The split Documents.
+        """
+        if self.splitter in OFFSET_SPLITTERS:
+            splitter = OFFSET_SPLITTERS[self.splitter](chunk_size=chunk_size, chunk_overlap=chunk_overlap, **dict(self.splitter_args or {}))
+            yield from splitter.iter_documents(data, extra_metadata=extra_metadata)
+        else:
+            yield from self.split(list(data), chunk_size=chunk_size, chunk_overlap=chunk_overlap, extra_metadata=extra_metadata)
@@ -1,30 +1,105 @@
+import hashlib
+import logging
 from operator import itemgetter
+from typing import List, Optional
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.pydantic_v1 import BaseModel, Field
+from ..caches import LRUCache
+from ..instrumentation import instrumented
 
 class ClassifierOutput(BaseModel):
     """a list of rephrased queries string"""
     related: bool = Field(...,description="can the content be used to answer the question or not?")
 
+def _hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
 class Classifier:
-    def __init__(self, llm, prompt):
+    def __init__(self, llm, prompt, cache: Optional[LRUCache] = None):
         self.model = llm
         self.parser = JsonOutputParser(pydantic_object = ClassifierOutput)
         self.custom_prompt = PromptTemplate(template = prompt, 
                                            input_variables = ["question", "content"],   
                                            partial_variables = {"format_instructions": self.parser.get_format_instructions()},                              
         )
+        self.cache = cache if cache is not None else LRUCache(max_entries=10_000)
+        self.logger = logging.getLogger(__name__)
+        self.chain = self._chain()
 
-    def predict_json(self, question, content):
-
+    def _chain(self):
         chain = (
-            {"query": itemgetter("question")}
-            | {"content": itemgetter("content")}
+            {"question": itemgetter("question"), "content": itemgetter("content")}
             | self.custom_prompt
             | self.model 
             | self.parser
         )
-        chain = chain.with_retry()
-        return chain.invoke({"question": question, "content": content})
-    
\ No newline at end of file
+        return chain.with_retry()
+
+    @instrumented("classifier.predict_json")
+    def predict_json(self, question, content):
+        return self.chain.invoke({"question": question, "content": content})
+
+    async def apredict_json(self, question, content):
+        return await self.chain.ainvoke({"question": question, "content": content})
+
+    def batch_predict_json(self, question: str, contents: List[str], max_concurrency: int = 8, min_relevant: Optional[int] = None) -> List[Optional[dict]]:
+        """
+        Classifies many contents against one question, running up to max_concurrency LLM calls in parallel.
+
+        Verdicts are cached per (question hash, content hash). The contents are classified in order, in waves of
+        max_concurrency, and classification stops once min_relevant contents have been judged related.
+
+        Args:
+            question (str): The question.
+            contents (List[str]): The contents to classify.
+            max_concurrency (int): The maximum number of concurrent LLM calls.
+            min_relevant (Optional[int]): Stop once this many contents are related. Classifies everything when None.
+
+        Returns:
+            List[Optional[dict]]: The verdict of every content, None for contents that were not classified or failed.
+        """
+        verdicts, pending = self._cached_verdicts(question, contents)
+        for start in range(0, len(pending), max_concurrency):
+            if self._enough(verdicts, min_relevant):
+                break
+            wave = pending[start:start + max_concurrency]
+            outputs = self.chain.batch([{"question": question, "content": contents[i]} for i in wave], config={"max_concurrency": max_concurrency}, return_exceptions=True)
+            self._record(question, contents, wave, outputs, verdicts)
+        return verdicts
+
+    async def abatch_predict_json(self, question: str, contents: List[str], max_concurrency: int = 8, min_relevant: Optional[int] = None) -> List[Optional[dict]]:
+        """
+        Async counterpart of batch_predict_json.
+        """
+        verdicts, pending = self._cached_verdicts(question, contents)
+        for start in range(0, len(pending), max_concurrency):
+            if self._enough(verdicts, min_relevant):
+                break
+            wave = pending[start:start + max_concurrency]
+            outputs = await self.chain.abatch([{"question": question, "content": contents[i]} for i in wave], config={"max_concurrency": max_concurrency}, return_exceptions=True)
+            self._record(question, contents, wave, outputs, verdicts)
+        return verdicts
+
+    def _cached_verdicts(self, question: str, contents: List[str]):
+        question_hash = _hash(question)
+        verdicts = [self.cache.get((question_hash, _hash(content))) for content in contents]
+        return verdicts, [i for i, verdict in enumerate(verdicts) if verdict is None]
+
+    def _enough(self, verdicts: List[Optional[dict]], min_relevant: Optional[int]) -> bool:
+        return min_relevant is not None and sum(is_related(verdict) for verdict in verdicts) >= min_relevant
+
+    def _record(self, question: str, contents: List[str], wave: List[int], outputs: list, verdicts: List[Optional[dict]]):
+        question_hash = _hash(question)
+        for i, output in zip(wave, outputs):
+            if isinstance(output, Exception):
+                self.logger.error(f"Error classifying content {i}: {output}")
+                continue
+            verdicts[i] = output
+            self.cache.set((question_hash, _hash(contents[i])), output)
+
+def is_related(verdict: Optional[dict]) -> bool:
+    """
+    Returns whether a classifier verdict judged the content related to the question.
+    """
+    return bool(verdict) and verdict.get("related") is True
@@ -3,6 +3,7 @@ from typing import List
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.pydantic_v1 import BaseModel, Field
+from ..instrumentation import instrumented
 
 class RephrasedQuery(BaseModel):
     """a list of rephrased queries string"""
@@ -17,14 +18,19 @@ class Rephrasor:
                                            partial_variables = {"format_instructions": self.parser.get_format_instructions()},                              
         )
 
-    def predict_json(self, page_text):
-
+    def _chain(self):
         chain = (
             {"query": itemgetter("query")}
             | self.custom_prompt
             | self.model 
             | self.parser
         )
-        chain = chain.with_retry()
-        return chain.invoke({"query": page_text})
+        return chain.with_retry()
+
+    @instrumented("rephrasor.predict_json")
+    def predict_json(self, page_text):
+        return self._chain().invoke({"query": page_text})
+
+    async def apredict_json(self, page_text):
+        return await self._chain().ainvoke({"query": page_text})
     
\ No newline at end of file
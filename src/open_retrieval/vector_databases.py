@@ -1,8 +1,13 @@
 import os
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from langchain.docstore.document import Document
-from langchain_community.vectorstores import FAISS, Chroma, Milvus, Qdrant, DocArrayInMemorySearch
-from qdrant_client import QdrantClient
+from .index_manifest import IndexManifest, SyncReport, chunk_id
+from .numpy_store import NumpyVectorStore
+from .lexical_index import BM25Index
+from .caches import bump_index_version, track_writes
+from .instrumentation import instrumented
+
+NUMPY_STORE_KWARGS = ('dtype', 'metric', 'nprobe', 'block_size', 'quantization', 'rescore_factor')
 
 class VectorDatabase:
     def __init__(self, vector_store):
@@ -16,6 +21,13 @@ class VectorDatabase:
         self.vector_store = vector_store
         
 
+    def _persist_directory(self, index_name: str, index_dir: Optional[str] = None) -> str:
+        if index_dir:
+            os.makedirs(index_dir, exist_ok=True)
+            return os.path.join(index_dir, index_name)
+        return index_name
+
+    @instrumented("vector_database.create_index", lambda result, self, embedding_function, index_name, docs=None, *args, **kwargs: {"items": len(docs or []), "vector_store": self.vector_store})
     def create_index(self, embedding_function: str, index_name: str, docs: Optional[List[Document]]=None, index_dir: Optional[str] = None, **kwargs):
         """
         Creates an index for the given documents using the specified embedding function.
@@ -25,35 +37,38 @@ class VectorDatabase:
             docs (List[Document]): The list of documents to index.
             index_name (str): The name of the index you would like to save the embeddings
             index_dir (Optional[str]): The directory to store the index in.
-            **kwargs: Additional arguments specific to the vector store being used.
+            **kwargs: Additional arguments specific to the vector store being used. Pass num_shards, and optionally shard_key and max_workers, to partition a chroma, faiss, qdrant or numpy index across shards.
 
         Returns:
             The index object.
         """
-        if index_dir:
-            if os.path.exists(index_dir):
-                persist_directory = os.path.join(index_dir, index_name)
-            else:
-                os.makedirs(index_dir)
-                persist_directory = os.path.join(index_dir, index_name)
-        else:
-            persist_directory = index_name
+        persist_directory = self._persist_directory(index_name, index_dir)
+
+        if kwargs.get('num_shards'):
+            from .sharded_index import ShardedVectorIndex
+            shard_kwargs = {key: value for key, value in kwargs.items() if key not in ('num_shards', 'shard_key', 'max_workers')}
+            vector_index = ShardedVectorIndex(persist_directory, embedding_function, self.vector_store, kwargs['num_shards'], kwargs.get('shard_key'), kwargs.get('max_workers'), **shard_kwargs)
+            if docs and not any(vector_index.counts):
+                vector_index.add_documents(docs)
+            return vector_index
 
         def index_exists(index_path: str):
             return os.path.exists(index_path)
 
         if self.vector_store == 'chroma':
+            from langchain_community.vectorstores import Chroma
 
             if index_exists(persist_directory):
                 vector_index = Chroma(persist_directory=persist_directory, embedding_function=embedding_function )
             else:
                 vector_index = Chroma.from_documents(docs, embedding_function, persist_directory=persist_directory)
                 vector_index.persist()
-            return vector_index
+            return track_writes(vector_index)
 
 
 
         elif self.vector_store == 'milvus':
+            from langchain_community.vectorstores import Milvus
             host = kwargs.get('host','localhost')
             port = kwargs.get('port', 19530)
             if index_exists(persist_directory):
@@ -62,40 +77,240 @@ class VectorDatabase:
                 vector_index = Milvus.from_documents(docs, embedding_function, collection_name=index_name,
                                                     connection_args={'host': host,
                                                                     'port': port})
-            return vector_index
+            return track_writes(vector_index)
 
         elif self.vector_store == 'qdrant':
+            from langchain_community.vectorstores import Qdrant
+            from qdrant_client import QdrantClient
             qdrant_environment = kwargs.get('environment', 'disk')
             if qdrant_environment == 'memory':
                 vector_index = Qdrant.from_documents(docs, embedding_function, collection_name=index_name,
                                                       location=":memory:")
-                return vector_index
+                return track_writes(vector_index)
             elif qdrant_environment == 'disk':
-                if index_exists(os.path.join(index_dir, index_name)):
+                if index_exists(os.path.join(index_dir, "collection", index_name)):
                     client = QdrantClient(path = index_dir)
-                    Qdrant(client = client, collection_name = index_name, embeddings=embedding_function)
+                    vector_index = Qdrant(client = client, collection_name = index_name, embeddings=embedding_function)
                 else:
                     vector_index = Qdrant.from_documents(docs, embedding_function, collection_name=index_name,
                                                       path=index_dir)
-                return vector_index
+                return track_writes(vector_index)
 
             else:
                 raise ValueError(
                     'Invalid environment value: Expecting one of memory, disk, on_premise or cloud')
 
         elif self.vector_store == 'array':
+            from langchain_community.vectorstores import DocArrayInMemorySearch
             vector_index = DocArrayInMemorySearch.from_documents(docs, embedding_function, index_name=persist_directory)
-            return vector_index
+            return track_writes(vector_index)
 
         elif self.vector_store == 'faiss':
+            from .filtered_faiss import PrefilteredFAISS
+            faiss_kwargs = {'partition_fields': kwargs['partition_fields']} if 'partition_fields' in kwargs else {}
             if index_exists(os.path.join(index_dir, index_name)):
-                vector_index = FAISS.load_local(persist_directory, embeddings=embedding_function, allow_dangerous_deserialization=True)
+                vector_index = PrefilteredFAISS.load_local(persist_directory, embeddings=embedding_function, allow_dangerous_deserialization=True, **faiss_kwargs)
             else:
-                vector_index = FAISS.from_documents(docs, embedding_function)
+                vector_index = PrefilteredFAISS.from_documents(docs, embedding_function, **faiss_kwargs)
                 vector_index.save_local(persist_directory)
             return vector_index
 
+        elif self.vector_store == 'numpy':
+            store_kwargs = {key: kwargs[key] for key in NUMPY_STORE_KWARGS if key in kwargs}
+            if index_exists(os.path.join(persist_directory, "header.json")):
+                vector_index = NumpyVectorStore.load(persist_directory, embedding_function, **store_kwargs)
+                if 'quantization' in kwargs and kwargs['quantization'] != vector_index.quantization:
+                    vector_index.quantize(kwargs['quantization'])
+            else:
+                vector_index = NumpyVectorStore.from_documents(docs, embedding_function, path=persist_directory, **store_kwargs)
+                if kwargs.get('ivf_nlist'):
+                    vector_index.build_ivf(kwargs['ivf_nlist'])
+            return vector_index
+
         else:
             raise ValueError(
-                'Invalid vector_store value: Expecting one of chroma, milvus, qdrant, faiss or array')
+                'Invalid vector_store value: Expecting one of chroma, milvus, qdrant, faiss, array or numpy')
         
+
+    def sync_index(self, embedding_function, index_name: str, docs: List[Document], index_dir: Optional[str] = None, keep_sources: Optional[List[str]] = None, **kwargs) -> Tuple[object, SyncReport]:
+        """
+        Brings a persisted index in line with a new set of documents, embedding only the chunks that changed.
+
+        The chunks are diffed against a manifest of content hashes stored next to the index as
+        `<index_name>.manifest.json`: new chunks are embedded and inserted, chunks that are no longer
+        present are deleted and unchanged chunks are skipped.
+
+        Args:
+            embedding_function: The embedding function to use.
+            index_name (str): The name of the index.
+            docs (List[Document]): The current set of documents.
+            index_dir (Optional[str]): The directory the index is stored in.
+            keep_sources (Optional[List[str]]): Sources whose indexed chunks are kept even though they are not part of docs, e.g. files that were not reloaded because IndexManifest.stale_sources reported them unchanged.
+            **kwargs: Additional arguments specific to the vector store being used.
+
+        Returns:
+            Tuple[object, SyncReport]: The index object and the number of chunks added, skipped and removed.
+        """
+        writer = self.index_writer(embedding_function=embedding_function, index_name=index_name, index_dir=index_dir, **kwargs)
+        if writer.vector_index is None and not docs:
+            raise ValueError("sync_index needs documents to build a new index")
+
+        current = {chunk_id(doc) for doc in docs}
+        kept = set(keep_sources or [])
+        writer.delete([id_ for id_, source in writer.manifest.chunks.items() if id_ not in current and source not in kept])
+        writer.add(docs)
+        return writer.close()
+
+    def create_lexical_index(self, index_name: str, docs: Optional[List[Document]] = None, index_dir: Optional[str] = None) -> BM25Index:
+        """
+        Opens or creates the BM25 lexical index persisted alongside a vector index as `<index_name>.bm25`, adding any chunks it does not contain yet.
+
+        Args:
+            index_name (str): The name of the vector index.
+            docs (Optional[List[Document]]): The chunks to add.
+            index_dir (Optional[str]): The directory the index is stored in.
+
+        Returns:
+            BM25Index: The lexical index.
+        """
+        lexical_index = BM25Index(self._persist_directory(index_name, index_dir) + ".bm25")
+        if docs:
+            lexical_index.add_documents(docs)
+            lexical_index.save()
+        return lexical_index
+
+    def index_writer(self, embedding_function, index_name: str, index_dir: Optional[str] = None, **kwargs) -> "IndexWriter":
+        """
+        Opens a chroma, faiss, qdrant or numpy index for incremental writes, creating it on the first batch if it does not exist.
+
+        Args:
+            embedding_function: The embedding function to use.
+            index_name (str): The name of the index.
+            index_dir (Optional[str]): The directory the index is stored in.
+            **kwargs: Additional arguments specific to the vector store being used. Pass lexical=True to keep the BM25 lexical index of the vector index in sync.
+
+        Returns:
+            IndexWriter: The writer, call close() on it to persist the index and its manifest.
+        """
+        return IndexWriter(self, embedding_function, index_name, index_dir, **kwargs)
+
+
+class IndexWriter:
+    """
+    Writes chunks to a chroma, faiss, qdrant or numpy index in batches and records them in the index manifest.
+
+    Chunks that are already in the manifest are skipped, so writing the same documents twice only embeds them once.
+
+    Args:
+        vector_database (VectorDatabase): The vector database that owns the index.
+        embedding_function: The embedding function to use.
+        index_name (str): The name of the index.
+        index_dir (Optional[str]): The directory the index is stored in.
+        **kwargs: Additional arguments specific to the vector store being used.
+    """
+    def __init__(self, vector_database: VectorDatabase, embedding_function, index_name: str, index_dir: Optional[str] = None, **kwargs):
+        vector_store = vector_database.vector_store
+        if vector_store not in ('chroma', 'faiss', 'qdrant', 'numpy'):
+            raise ValueError('Invalid vector_store value for incremental indexing: Expecting one of chroma, faiss, qdrant or numpy')
+        if vector_store == 'qdrant' and kwargs.get('environment', 'disk') != 'disk':
+            raise ValueError('Incremental indexing requires a qdrant index persisted to disk')
+
+        self.vector_database = vector_database
+        self.embedding_function = embedding_function
+        self.index_name = index_name
+        self.index_dir = index_dir
+        self.persist_directory = vector_database._persist_directory(index_name, index_dir)
+        self.manifest = IndexManifest(os.path.join(index_dir or '', f"{index_name}.manifest.json"))
+        self.store_kwargs = {key: kwargs[key] for key in NUMPY_STORE_KWARGS if key in kwargs}
+        self.report = SyncReport()
+        self.lexical_index = vector_database.create_lexical_index(index_name, index_dir=index_dir) if kwargs.pop('lexical', False) else None
+
+        index_path = os.path.join(index_dir or '', "collection", index_name) if vector_store == 'qdrant' else self.persist_directory
+        if os.path.exists(index_path):
+            if not self.manifest.exists():
+                raise ValueError(f"Index {index_name} was created without a manifest. Delete it to rebuild it incrementally")
+            self.vector_index = vector_database.create_index(embedding_function=embedding_function, index_name=index_name, index_dir=index_dir, **kwargs)
+        else:
+            self.manifest.chunks, self.manifest.sources = {}, {}
+            self.vector_index = None
+
+    def add(self, docs: List[Document]) -> int:
+        """
+        Embeds and inserts the chunks that are not indexed yet.
+
+        Args:
+            docs (List[Document]): The chunks to write.
+
+        Returns:
+            int: The number of chunks added.
+        """
+        new, lexical = {}, {}
+        for doc in docs:
+            id_ = chunk_id(doc)
+            if id_ not in self.manifest.chunks:
+                new.setdefault(id_, doc)
+            if self.lexical_index is not None and id_ not in self.lexical_index:
+                lexical.setdefault(id_, doc)
+        self.report.skipped += len(docs) - len(new)
+        if lexical:
+            self.lexical_index.add_documents(list(lexical.values()), ids=list(lexical.keys()))
+        if not new:
+            return 0
+
+        ids, new_docs = list(new.keys()), list(new.values())
+        if self.vector_index is None:
+            self.vector_index = self._build(new_docs, ids)
+        else:
+            self.vector_index.add_documents(new_docs, ids=ids)
+        bump_index_version(self.vector_index)
+        self.manifest.update(new, [])
+        self.report.added += len(new)
+        return len(new)
+
+    def delete(self, ids: List[str]) -> int:
+        """
+        Deletes chunks from the index by chunk id.
+
+        Args:
+            ids (List[str]): The ids of the chunks to delete.
+
+        Returns:
+            int: The number of chunks removed.
+        """
+        if not ids:
+            return 0
+        self.vector_index.delete(ids=ids)
+        bump_index_version(self.vector_index)
+        if self.lexical_index is not None:
+            self.lexical_index.delete(ids)
+        self.manifest.update({}, ids)
+        self.report.removed += len(ids)
+        return len(ids)
+
+    def close(self) -> Tuple[object, SyncReport]:
+        """
+        Persists the index and its manifest.
+
+        Returns:
+            Tuple[object, SyncReport]: The index object and the number of chunks added, skipped and removed.
+        """
+        if self.vector_database.vector_store == 'faiss' and self.vector_index is not None:
+            self.vector_index.save_local(self.persist_directory)
+        if self.lexical_index is not None:
+            self.lexical_index.save()
+        self.manifest.save()
+        return self.vector_index, self.report
+
+    def _build(self, docs: List[Document], ids: List[str]):
+        vector_store = self.vector_database.vector_store
+        if vector_store == 'chroma':
+            from langchain_community.vectorstores import Chroma
+            return track_writes(Chroma.from_documents(docs, self.embedding_function, ids=ids, persist_directory=self.persist_directory))
+        elif vector_store == 'faiss':
+            from .filtered_faiss import PrefilteredFAISS
+            return PrefilteredFAISS.from_documents(docs, self.embedding_function, ids=ids)
+        elif vector_store == 'numpy':
+            return NumpyVectorStore.from_documents(docs, self.embedding_function, ids=ids, path=self.persist_directory, **self.store_kwargs)
+        else:
+            from langchain_community.vectorstores import Qdrant
+            return track_writes(Qdrant.from_documents(docs, self.embedding_function, ids=ids, collection_name=self.index_name, path=self.index_dir))
@@ -0,0 +1,243 @@
+import os
+import time
+import queue
+import asyncio
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass, field
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from langchain.docstore.document import Document
+from .document_cache import decode_documents, encode_documents, read_body, read_header, write_entry
+
+DEFAULT_CLASSES = ("post-content", "post-title", "post-header")
+_DONE = object()
+
+
+def parse_html(html: str, url: str, classes: Optional[Sequence[str]] = DEFAULT_CLASSES) -> List[Document]:
+    """
+    Extracts the text of a page, keeping only the elements with one of the given classes like WebBaseLoader does
+    with its SoupStrainer. Runs inside the worker processes of the WebLoader.
+
+    Args:
+        html (str): The page.
+        url (str): The URL of the page, stored as the source of the document.
+        classes (Optional[Sequence[str]]): The CSS classes of the elements that are kept. None keeps the whole page.
+
+    Returns:
+        List[Document]: The document of the page.
+    """
+    import bs4
+    strainer = bs4.SoupStrainer(class_=tuple(classes)) if classes else None
+    soup = bs4.BeautifulSoup(html, "html.parser", parse_only=strainer)
+    # the same metadata as WebBaseLoader, which also reads it from the strained soup
+    metadata = {"source": url}
+    if soup.title is not None:
+        metadata["title"] = soup.title.get_text()
+    description = soup.find("meta", attrs={"name": "description"})
+    if description is not None:
+        metadata["description"] = description.get("content", "No description found.")
+    html_tag = soup.find("html")
+    if html_tag is not None:
+        metadata["language"] = html_tag.get("lang", "No language found.")
+    return [Document(page_content=soup.get_text(), metadata=metadata)]
+
+
+@dataclass
+class WebLoadReport:
+    """
+    The outcome of a bulk URL load.
+
+    Attributes:
+        fetched (int): The pages downloaded and parsed.
+        not_modified (int): The pages the server reported unchanged since the last load.
+        failed_urls (List[str]): The URLs that could not be fetched.
+        documents (int): The number of documents produced.
+    """
+    fetched: int = 0
+    not_modified: int = 0
+    failed_urls: List[str] = field(default_factory=list)
+    documents: int = 0
+
+
+class RateLimiter:
+    """
+    Spaces out the start of requests so no more than `rate` start per second.
+    """
+    def __init__(self, rate: Optional[float]):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def wait(self):
+        if not self.interval:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            now = time.monotonic()
+            if self._next > now:
+                await asyncio.sleep(self._next - now)
+            self._next = max(now, self._next) + self.interval
+
+
+class WebLoader:
+    """
+    Loads many URLs concurrently and streams their documents as the pages complete.
+
+    Pages are fetched by one aiohttp session whose connection pool is shared by every request, with at most
+    max_connections requests in flight (max_per_host per host) and an optional requests_per_second limit.
+    HTML is parsed in a process pool with the SoupStrainer filtering of DocumentLoader, so parsing does not
+    hold up the downloads.
+
+    With a cache_dir, the ETag and Last-Modified validators and the documents of every page are stored, and
+    later loads send conditional requests: a page the server reports unchanged (304) is skipped, or served
+    from the cache when skip_unchanged is False.
+
+    Args:
+        cache_dir (Optional[str]): The directory where the validators and documents of every page are stored.
+        max_connections (int): The maximum number of concurrent requests.
+        max_per_host (int): The maximum number of concurrent requests per host.
+        requests_per_second (Optional[float]): The maximum number of requests started per second.
+        timeout (float): The timeout of a request in seconds.
+        parse_workers (Optional[int]): The number of parser processes. Defaults to the number of CPUs.
+        classes (Optional[Sequence[str]]): The CSS classes of the elements that are kept. None keeps the whole page.
+        headers (Optional[Dict[str, str]]): Headers sent with every request.
+        skip_unchanged (bool): Whether pages the server reports unchanged are left out of the results.
+    """
+    def __init__(self, cache_dir: Optional[str] = None, max_connections: int = 32, max_per_host: int = 8, requests_per_second: Optional[float] = None, timeout: float = 30, parse_workers: Optional[int] = None, classes: Optional[Sequence[str]] = DEFAULT_CLASSES, headers: Optional[Dict[str, str]] = None, skip_unchanged: bool = True):
+        self.cache_dir = cache_dir
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.requests_per_second = requests_per_second
+        self.timeout = timeout
+        self.parse_workers = parse_workers or os.cpu_count() or 1
+        self.classes = classes
+        self.headers = headers or {}
+        self.skip_unchanged = skip_unchanged
+        self.logger = logging.getLogger(__name__)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry(self, url: str) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        return os.path.join(self.cache_dir, f"{hashlib.sha1(url.encode('utf-8')).hexdigest()}.page")
+
+    async def _fetch(self, session, limiter: RateLimiter, executor: Executor, url: str, report: WebLoadReport) -> List[Document]:
+        import aiohttp
+        entry = self._entry(url)
+        cached = read_header(entry) if entry else None
+        headers = dict(self.headers)
+        if cached is not None:
+            if cached[0].get("etag"):
+                headers["If-None-Match"] = cached[0]["etag"]
+            if cached[0].get("last_modified"):
+                headers["If-Modified-Since"] = cached[0]["last_modified"]
+        await limiter.wait()
+        try:
+            async with session.get(url, headers=headers) as response:
+                if response.status == 304 and cached is not None:
+                    report.not_modified += 1
+                    return [] if self.skip_unchanged else decode_documents(read_body(entry, cached[1]))
+                response.raise_for_status()
+                html = await response.text()
+                validators = {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.logger.error(f"Error loading the url {url}: {e}")
+            report.failed_urls.append(url)
+            return []
+
+        docs = await asyncio.get_running_loop().run_in_executor(executor, parse_html, html, url, self.classes)
+        report.fetched += 1
+        if entry and (validators["etag"] or validators["last_modified"]):
+            write_entry(entry, {"url": url, **validators}, encode_documents(docs))
+        return docs
+
+    async def aiter_documents(self, urls: Iterable[str], report: Optional[WebLoadReport] = None) -> AsyncIterator[Document]:
+        """
+        Fetches and parses the URLs concurrently, yielding the documents of every page as soon as it is parsed.
+
+        Args:
+            urls (Iterable[str]): The URLs to load.
+            report (Optional[WebLoadReport]): A report updated with the number of pages fetched, unchanged and failed.
+
+        Yields:
+            Document: The documents of every page.
+        """
+        import aiohttp
+        report = report if report is not None else WebLoadReport()
+        limiter = RateLimiter(self.requests_per_second)
+        semaphore = asyncio.Semaphore(self.max_connections)
+        connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.max_per_host)
+
+        async def bounded(url: str) -> List[Document]:
+            async with semaphore:
+                return await self._fetch(session, limiter, executor, url, report)
+
+        with ProcessPoolExecutor(max_workers=self.parse_workers) as executor:
+            async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
+                tasks = [asyncio.ensure_future(bounded(url)) for url in dict.fromkeys(urls)]
+                try:
+                    for task in asyncio.as_completed(tasks):
+                        for doc in await task:
+                            report.documents += 1
+                            yield doc
+                finally:
+                    for task in tasks:
+                        task.cancel()
+
+    def iter_documents(self, urls: Iterable[str], report: Optional[WebLoadReport] = None) -> Iterator[Document]:
+        """
+        Synchronous version of aiter_documents: runs the event loop in a background thread and yields the documents as they complete.
+        """
+        documents: queue.Queue = queue.Queue(maxsize=1024)
+        stop = threading.Event()
+
+        async def produce():
+            async for doc in self.aiter_documents(urls, report):
+                # block a helper thread rather than the event loop while the consumer catches up
+                await asyncio.to_thread(documents.put, doc)
+                if stop.is_set():
+                    break
+
+        def run():
+            try:
+                asyncio.run(produce())
+                documents.put(_DONE)
+            except BaseException as e:
+                documents.put(e)
+
+        producer = threading.Thread(target=run, daemon=True)
+        producer.start()
+        try:
+            while True:
+                item = documents.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            while producer.is_alive():
+                try:
+                    documents.get_nowait()
+                except queue.Empty:
+                    producer.join(0.01)
+
+    def load(self, urls: Iterable[str]) -> Tuple[List[Document], WebLoadReport]:
+        """
+        Loads every URL.
+
+        Args:
+            urls (Iterable[str]): The URLs to load.
+
+        Returns:
+            Tuple[List[Document], WebLoadReport]: The documents and the number of pages fetched, unchanged and failed.
+        """
+        report = WebLoadReport()
+        docs = list(self.iter_documents(urls, report))
+        self.logger.info(f"Loaded {report.fetched + report.not_modified} urls: {report.fetched} fetched, {report.not_modified} unchanged, {len(report.failed_urls)} failed")
+        return docs, report
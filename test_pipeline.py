@@ -8,12 +8,10 @@ from src.open_retrieval.vector_databases import VectorDatabase
 from src.open_retrieval.retrievers import Retriever
 from rerankers import Reranker
 
-def retrieval_pipeline(query: str, data_path: str,loader: str, splitter: str, vector_database:str, embedding_function: str, retrieval_type: str, index_name: str, filter_field: Optional[str]=None) -> List[str]:
+def build_index(data_path: str, loader: DocumentLoader, splitter: TextSplitter, vector_database: VectorDatabase, embedding_function, index_name: str, index_dir: str = 'tests/index/'):
     """
-    Takes in a query and a list of documents paths and returns a list of top 5 documents that are related to the query
+    Loads, splits and indexes every document in data_path, or opens the index if it already exists
     """
-    index_dir = 'tests/index/'
-
     if not os.path.exists(os.path.join(index_dir,index_name)):
         all_documents = []
         for filename in os.listdir(data_path):
@@ -23,22 +21,23 @@ def retrieval_pipeline(query: str, data_path: str,loader: str, splitter: str, ve
             extra_metadata = {"file_name": filename.split('.')[0]}
             documents = splitter.split(data, chunk_size = 800, chunk_overlap=0, extra_metadata=extra_metadata)
             all_documents.extend(documents)
-        
-        vector_index = vector_database.create_index(embedding_function=embedding_function,docs=all_documents, index_name=index_name,index_dir=index_dir)
-    else:
-        vector_index = vector_database.create_index(embedding_function=embedding_function, index_name=index_name,index_dir=index_dir)
 
-    if filter_field:
-        filter_params = {'file_name': filter_field}
+        return vector_database.create_index(embedding_function=embedding_function,docs=all_documents, index_name=index_name,index_dir=index_dir)
+    return vector_database.create_index(embedding_function=embedding_function, index_name=index_name,index_dir=index_dir)
+
+def retrieval_pipeline(queries: List[str], vector_index, retrieval_type: str, ranker: Optional[Reranker] = None, filter_fields: Optional[List[Optional[str]]] = None) -> List[List[str]]:
+    """
+    Takes in a list of queries and returns the top 5 documents related to each query, retrieving all queries in one batch
+    """
+    filters = [{'file_name': field} if isinstance(field, str) else None for field in filter_fields] if filter_fields else None
 
     if retrieval_type == 'naive':
         retriever = Retriever(vector_index=vector_index)
-        results = retriever.naive_retrieval(query = query, top_k=5, filter = filter_params )
+        return retriever.naive_retrieval_batch(queries, top_k=5, filters=filters)
     elif retrieval_type == 'ranked':
         retriever = Retriever(vector_index=vector_index, ranker = ranker)
-        results = retriever.ranked_retrieval( query=query, top_k=15, ranked_top_k=5, filter = filter_params )
-    
-    return results
+        return retriever.ranked_retrieval_batch(queries, top_k=15, ranked_top_k=5, filters=filters)
+    raise ValueError('Invalid retrieval_type value: Expecting one of naive or ranked')
 
 if __name__ == "__main__":
     csv_path = 'data/Test.csv'
@@ -57,8 +56,9 @@ if __name__ == "__main__":
     embedding_provider = EmbeddingProvider(embedding_provider=embedding_provider)
     embedding_function = embedding_provider.get_embedding_function()
 
-    df = pd.read_csv(csv_path)   
-    results = df.apply(lambda row: retrieval_pipeline(query=row['Query text'],data_path=data_path, loader=loader, splitter=splitter, vector_database=vector_database, embedding_function=embedding_function,index_name=index_name, retrieval_type=retrieval_type, filter_field=row['Document Title']), axis=1)
+    df = pd.read_csv(csv_path)
+    vector_index = build_index(data_path=data_path, loader=loader, splitter=splitter, vector_database=vector_database, embedding_function=embedding_function, index_name=index_name)
+    results = pd.Series(retrieval_pipeline(queries=df['Query text'].tolist(), vector_index=vector_index, retrieval_type=retrieval_type, ranker=ranker, filter_fields=df['Document Title'].tolist()), index=df.index)
     results_df = pd.DataFrame({
         'Query No': df['Query No'],
         'Query text': df['Query text'],
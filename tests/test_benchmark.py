@@ -0,0 +1,64 @@
+import os
+import sys
+import json
+import pytest
+import pandas as pd
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from src.open_retrieval.benchmark import BenchmarkConfig, StageTimer, relevance_metrics, run_benchmark
+
+class TestBenchmark:
+    @pytest.fixture
+    def data_path(self, tmp_path):
+        data_path = tmp_path / "data"
+        data_path.mkdir()
+        for name in ("alpha", "beta"):
+            pd.DataFrame({"topic": [f"{name} topic {i}" for i in range(20)]}).to_csv(data_path / f"{name}.csv", index=False)
+        return str(data_path)
+
+    @pytest.fixture
+    def queries(self):
+        return pd.DataFrame({"Query text": ["topic: alpha topic 3", "topic: beta topic 7"], "Document Title": ["alpha", "beta"]})
+
+    def test_relevance_metrics(self):
+        metrics = relevance_metrics([["a", "b"], ["c", "b"], ["c", "c"]], ["a", "b", "b"], k=2)
+        assert metrics["recall@2"] == pytest.approx(2 / 3)
+        assert metrics["mrr"] == pytest.approx((1 + 0.5) / 3)
+
+    def test_stage_timer_percentiles(self):
+        timer = StageTimer()
+        for seconds in (0.001, 0.002, 0.003, 0.1):
+            timer.add("search", seconds)
+        summary = timer.summary()["search"]
+        assert summary["count"] == 4
+        assert summary["p50_ms"] == pytest.approx(2.5)
+        assert summary["p99_ms"] > summary["p95_ms"] > summary["p50_ms"]
+
+    @pytest.mark.parametrize("vector_store", ["faiss", "numpy"])
+    def test_run_benchmark(self, data_path, queries, vector_store):
+        config = BenchmarkConfig(splitter="recursive", embedding_provider="fake", vector_store=vector_store, retrieval_type="naive")
+        result = run_benchmark(config, queries, data_path, top_k=3, embedding_function=DeterministicFakeEmbedding(size=16))
+        assert result["chunks"] == 40 and result["files"] == 2
+        assert result["recall@3"] == 1.0 and result["mrr"] == 1.0
+        assert {"load", "split", "embed", "index", "query_embed", "search"} <= set(result["stages"])
+        assert result["stages"]["search"]["count"] == 2
+        assert result["index_bytes"] > 0 and result["peak_rss_mb"] > 0
+        json.dumps(result)
+
+    def test_twin_files_are_credited_to_the_retrieved_file(self, data_path, queries, capsys, tmp_path, monkeypatch):
+        import shutil
+        from concurrent.futures import ThreadPoolExecutor
+        from src.open_retrieval import benchmark
+        shutil.copy(os.path.join(data_path, "beta.csv"), os.path.join(data_path, "gamma.csv"))
+        config = BenchmarkConfig(splitter="recursive", embedding_provider="fake", vector_store="numpy", retrieval_type="naive")
+        twins = pd.DataFrame({"Query text": ["topic: beta topic 7"], "Document Title": ["gamma"]})
+        result = run_benchmark(config, twins, data_path, top_k=3, use_filter=True, embedding_function=DeterministicFakeEmbedding(size=16))
+        assert result["recall@3"] == 1.0 and result["mrr"] == 1.0
+
+        empty = run_benchmark(config, twins.iloc[:0], data_path, top_k=3, embedding_function=DeterministicFakeEmbedding(size=16))
+        assert "search" not in empty["stages"]
+        monkeypatch.setattr(benchmark, "run_isolated", lambda config, args: empty)
+        monkeypatch.setattr(benchmark, "ProcessPoolExecutor", lambda max_workers, mp_context: ThreadPoolExecutor(max_workers))
+        benchmark.main(["--data", data_path, "--top-k", "3", "--output", str(tmp_path / "benchmark.json")])
+        assert "no queries" in capsys.readouterr().out
+
@@ -0,0 +1,62 @@
+import os
+import sys
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.open_retrieval.caches import LRUCache, bump_index_version, index_version, track_writes
+
+class TestLRUCache:
+    def test_lru_eviction(self):
+        cache = LRUCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert "b" not in cache
+        assert cache.get("a") == 1 and cache.get("c") == 3
+        assert cache.stats()["evictions"] == 1
+
+    def test_ttl_expiry(self):
+        cache = LRUCache(ttl=0.05)
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+        time.sleep(0.06)
+        assert cache.get("a") is None
+        assert cache.stats()["misses"] == 1
+
+    def test_memory_budget(self):
+        cache = LRUCache(max_bytes=200)
+        cache.set("a", "x" * 100)
+        cache.set("b", "y" * 100)
+        assert len(cache) == 1
+        assert cache.bytes <= 200
+
+    def test_latency_saved(self):
+        cache = LRUCache()
+        cache.get_or_compute("a", lambda: time.sleep(0.01) or 1)
+        cache.get_or_compute("a", lambda: 2)
+        stats = cache.stats()
+        assert stats["hits"] == 1 and stats["misses"] == 1
+        assert stats["latency_saved"] >= 0.01
+
+    def test_index_version(self):
+        class Index:
+            pass
+        index = Index()
+        version = index_version(index)
+        bump_index_version(index)
+        assert index_version(index) != version
+
+    def test_track_writes(self):
+        class Store:
+            def add_texts(self, texts):
+                return list(texts)
+
+            def delete(self, ids=None):
+                return True
+
+        store = track_writes(track_writes(Store()))
+        version = index_version(store)
+        assert store.add_texts(["a"]) == ["a"]
+        assert index_version(store) == (0, version[1] + 1)
+        store.delete(["a"])
+        assert index_version(store) == (0, version[1] + 2)
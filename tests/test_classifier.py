@@ -0,0 +1,33 @@
+import os
+import sys
+import asyncio
+import pytest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from langchain_community.llms.fake import FakeListLLM
+from src.open_retrieval.utils.classifier import Classifier
+from src.open_retrieval.utils.config import Config
+
+class TestClassifier:
+    @pytest.fixture
+    def classifier(self):
+        return Classifier(llm=FakeListLLM(responses=['{"related": true}', '{"related": false}']), prompt=Config.classifier_prompt)
+
+    def test_predict_json(self, classifier):
+        assert classifier.predict_json(question="What is taxed?", content="Sales tax is charged on taxable goods") == {"related": True}
+
+    def test_apredict_json(self, classifier):
+        assert asyncio.run(classifier.apredict_json(question="What is taxed?", content="Sales tax is charged on taxable goods")) == {"related": True}
+
+    def test_batch_predict_json_short_circuits_and_caches(self):
+        llm = FakeListLLM(responses=['{"related": true}'])
+        classifier = Classifier(llm=llm, prompt=Config.classifier_prompt)
+        contents = [f"content {i}" for i in range(6)]
+        verdicts = classifier.batch_predict_json("question", contents, max_concurrency=2, min_relevant=3)
+        assert verdicts[:4] == [{"related": True}] * 4
+        assert verdicts[4:] == [None, None]
+        assert classifier.batch_predict_json("question", contents[:4], min_relevant=3) == [{"related": True}] * 4
+        assert classifier.cache.stats()["hits"] == 4
+
+    def test_abatch_predict_json(self, classifier):
+        verdicts = asyncio.run(classifier.abatch_predict_json("question", ["a", "b"], max_concurrency=1))
+        assert verdicts == [{"related": True}, {"related": False}]
@@ -0,0 +1,113 @@
+import os
+import sys
+import zlib
+import pytest
+import numpy as np
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from langchain.docstore.document import Document
+from rerankers.documents import Document as RerankersDocument
+from rerankers.results import RankedResults, Result
+from src.open_retrieval.colbert_store import ColBERTEncoder, ColBERTStore, maxsim
+from src.open_retrieval.retrievers import Retriever
+from src.open_retrieval.caches import LRUCache
+from src.open_retrieval.instrumentation import collect_metrics
+
+
+class FakeColBERTRanker:
+    """
+    Mimics the encoding methods of the rerankers ColBERTRanker with a fixed token embedding table,
+    and scores like its _colbert_score so stored scores can be compared with live ones.
+    """
+    def __init__(self, dimension=8, query_length=6):
+        self.table = np.random.default_rng(0).normal(size=(64, dimension)).astype(np.float32)
+        self.query_length = query_length
+        self.encoded_documents = 0
+
+    def _ids(self, text):
+        return [1] + [zlib.crc32(word.encode("utf-8")) % 60 + 4 for word in text.split()]
+
+    def _pad(self, token_ids, length, pad_id):
+        input_ids = np.full((len(token_ids), length), pad_id)
+        attention_mask = np.zeros((len(token_ids), length), dtype=np.int64)
+        for row, ids in enumerate(token_ids):
+            input_ids[row, :len(ids)] = ids[:length]
+            attention_mask[row, :len(ids)] = 1
+        return {"input_ids": input_ids, "attention_mask": attention_mask}
+
+    def _query_encode(self, queries):
+        return self._pad([self._ids(query) for query in queries], self.query_length, pad_id=3)
+
+    def _document_encode(self, docs):
+        self.encoded_documents += len(docs)
+        token_ids = [self._ids(doc) for doc in docs]
+        return self._pad(token_ids, max(map(len, token_ids)), pad_id=0)
+
+    def _to_embs(self, encoding):
+        embs = self.table[encoding["input_ids"]]
+        return embs / np.linalg.norm(embs, axis=-1, keepdims=True)
+
+    def rank(self, query, docs, doc_ids=None):
+        query_encoding, docs_encoding = self._query_encode([query]), self._document_encode(docs)
+        token_scores = np.einsum("in,pjn->ipj", self._to_embs(query_encoding)[0], self._to_embs(docs_encoding))
+        token_scores = np.where(docs_encoding["attention_mask"][None] == 0, -1e4, token_scores)
+        scores = token_scores.max(-1).sum(0) / query_encoding["attention_mask"].sum()
+        order = sorted(range(len(docs)), key=lambda i: -scores[i])
+        return RankedResults([Result(RerankersDocument(text=docs[i], doc_id=doc_ids[i]), score=float(scores[i]), rank=r + 1) for r, i in enumerate(order)], query=query, has_scores=True)
+
+
+class TestColBERTStore:
+    @pytest.fixture
+    def docs(self):
+        return [Document(page_content=" ".join(f"word{(i * j) % 23}" for j in range(3 + i % 7)), metadata={"chunk": i}) for i in range(20)]
+
+    def test_stored_scores_match_the_ranker(self, docs, tmp_path):
+        ranker = FakeColBERTRanker()
+        store = ColBERTStore(str(tmp_path / "colbert"), encoder=ColBERTEncoder(ranker, batch_size=6))
+        assert store.add_documents(docs) == 20
+        assert store.add_documents(docs[:5]) == 0
+        assert store.get(store.key(docs[3])).dtype == np.float16
+        assert len(store.get(store.key(docs[3]))) == len(docs[3].page_content.split()) + 1
+
+        ranker.encoded_documents = 0
+        scores = store.score("word3 word5 word7", docs)
+        assert ranker.encoded_documents == 0
+        expected = {result.document.doc_id: result.score for result in ranker.rank("word3 word5 word7", [doc.page_content for doc in docs], doc_ids=list(range(20))).results}
+        assert np.allclose(scores, [expected[i] for i in range(20)], atol=1e-2)
+
+        reopened = ColBERTStore(str(tmp_path / "colbert"), encoder=ColBERTEncoder(ranker))
+        assert len(reopened) == 20 and reopened.tokens == store.tokens
+        assert np.array_equal(reopened.get(store.key(docs[7])), store.get(store.key(docs[7])))
+        new = Document(page_content="an unseen chunk")
+        assert reopened.score("word3", [new])[0] == pytest.approx(ranker.rank("word3", [new.page_content], doc_ids=[0]).results[0].score, abs=1e-5)
+        assert store.key(new) not in reopened
+
+    def test_maxsim_matches_brute_force(self):
+        rng = np.random.default_rng(1)
+        query = rng.normal(size=(5, 4)).astype(np.float32)
+        matrices = [rng.normal(size=(n, 4)).astype(np.float32) for n in (1, 7, 3)]
+        expected = [(matrix @ query.T).max(axis=0).sum() / 3 for matrix in matrices]
+        assert np.allclose(maxsim(query, 3, matrices), expected, atol=1e-5)
+
+    def test_rejects_non_colbert_rankers(self, tmp_path):
+        with pytest.raises(ValueError):
+            ColBERTEncoder(object())
+        with pytest.raises(ValueError):
+            ColBERTStore(str(tmp_path / "colbert")).add_documents([Document(page_content="text")])
+
+    def test_retriever_reranks_from_the_store(self, docs, tmp_path):
+        ranker = FakeColBERTRanker()
+        store = ColBERTStore(str(tmp_path / "colbert"), encoder=ColBERTEncoder(ranker))
+        store.add_documents(docs)
+        ranker.encoded_documents = 0
+
+        class FakeIndex:
+            def similarity_search(self, query, k=4, filter=None):
+                return docs[:k]
+
+        retriever = Retriever(vector_index=FakeIndex(), ranker=ranker, colbert_store=store, rerank_cache=LRUCache())
+        live = Retriever(vector_index=FakeIndex(), ranker=ranker)
+        with collect_metrics() as collector:
+            results = retriever.ranked_retrieval("word3 word9", top_k=15, ranked_top_k=5)
+        assert ranker.encoded_documents == 0
+        assert collector.stages["retriever.rerank"].calls == 1
+        assert results == live.ranked_retrieval("word3 word9", top_k=15, ranked_top_k=5)
@@ -0,0 +1,60 @@
+import os
+import sys
+import random
+import pytest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from langchain.docstore.document import Document
+from src.open_retrieval.deduplication import ChunkDeduplicator, deduplicate
+
+class TestChunkDeduplicator:
+    @pytest.fixture
+    def twins(self):
+        rng = random.Random(0)
+        words = [f"word{i}" for i in range(5000)]
+        docs = []
+        for i in range(100):
+            text = rng.choices(words, k=200)
+            docs.append(Document(page_content=" ".join(text), metadata={"source": f"paper_{i}.pdf"}))
+            text[rng.randrange(200)] = "edited"
+            docs.append(Document(page_content="\n".join(text), metadata={"source": f"paper_{i}.docx"}))
+        return docs
+
+    def test_exact_duplicates_keep_provenance(self):
+        docs = [Document(page_content="same  text", metadata={"source": "a.pdf"}), Document(page_content="same text", metadata={"source": "a.docx"}),
+                Document(page_content="other text", metadata={"source": "a.pdf"}), Document(page_content="same text\n", metadata={"source": "b.pdf"})]
+        kept, report = deduplicate(docs, method="exact")
+        assert [doc.page_content for doc in kept] == ["same  text", "other text"]
+        assert kept[0].metadata == {"source": "a.pdf", "duplicate_sources": "a.docx|b.pdf", "duplicate_count": 2}
+        assert docs[0].metadata == {"source": "a.pdf"}
+        assert (report.exact_duplicates, report.near_duplicates, report.embedding_calls_saved) == (2, 0, 2)
+
+    @pytest.mark.parametrize("method", ["minhash", "simhash"])
+    def test_near_duplicates(self, twins, method):
+        kept, report = deduplicate(twins, method=method, threshold=0.85)
+        assert report.near_duplicates >= 95
+        assert report.kept + report.removed == 200
+        assert all(doc.metadata["source"].endswith(".pdf") for doc in kept[:10])
+        assert kept[0].metadata["duplicate_sources"] == "paper_0.docx"
+
+    def test_state_spans_batches(self, twins):
+        deduplicator = ChunkDeduplicator(method="minhash")
+        first = deduplicator.deduplicate(twins[::2])
+        second = deduplicator.deduplicate(twins[1::2])
+        assert len(first) == 100 and len(second) <= 5
+        with pytest.raises(ValueError):
+            ChunkDeduplicator(method="bloom")
+
+    def test_scope_keeps_duplicates_of_other_files(self):
+        docs = [Document(page_content="same text", metadata={"file_name": "a.pdf"}), Document(page_content="same text", metadata={"file_name": "a.docx"}),
+                Document(page_content="same  text", metadata={"file_name": "a.docx"})]
+        kept, report = deduplicate(docs, method="minhash", scope="file_name")
+        assert [doc.metadata["file_name"] for doc in kept] == ["a.pdf", "a.docx"]
+        assert kept[1].metadata["duplicate_count"] == 1
+        assert report.exact_duplicates == 1
+
+    def test_provenance_does_not_change_the_chunk_id(self):
+        from src.open_retrieval.index_manifest import chunk_id
+        a, b, c = (Document(page_content="same text", metadata={"source": source}) for source in ("a.pdf", "a.docx", "b.pdf"))
+        kept, _ = deduplicate([a, b, c], method="exact")
+        assert kept[0].metadata["duplicate_count"] == 2
+        assert chunk_id(kept[0]) == chunk_id(a)
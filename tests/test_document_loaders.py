@@ -2,7 +2,9 @@ import os
 import sys
 import pytest
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from langchain.docstore.document import Document
 from src.open_retrieval.document_loaders import DocumentLoader
+from src.open_retrieval.document_cache import decode_documents, encode_documents
 
 class TestDocumentLoader:
     @pytest.fixture
@@ -50,3 +52,35 @@ class TestDocumentLoader:
         assert data is not None
 
     
+
+
+class TestDocumentCache:
+    @pytest.fixture
+    def data_dir(self, tmp_path):
+        data_dir = tmp_path / "data"
+        data_dir.mkdir()
+        for i in range(3):
+            (data_dir / f"table_{i}.csv").write_text("name,value\n" + "".join(f"row{j},{i * j}\n" for j in range(5)))
+        return data_dir
+
+    def test_documents_round_trip(self):
+        docs = [Document(page_content="a", metadata={"source": "x.pdf", "page": 1}), Document(page_content="b", metadata={"source": "x.pdf", "title": None}), Document(page_content="c")]
+        assert decode_documents(encode_documents(docs)) == docs
+
+    def test_cached_directory(self, data_dir, tmp_path):
+        document_loader = DocumentLoader(cache_dir=str(tmp_path / "cache"))
+        docs, report = document_loader.load_directory(str(data_dir))
+        assert (report.files, report.parsed, report.cache_hits) == (3, 3, 0)
+        assert len(docs) == 15
+
+        cached_docs, report = DocumentLoader(cache_dir=str(tmp_path / "cache")).load_directory(str(data_dir))
+        assert (report.parsed, report.cache_hits) == (0, 3)
+        assert cached_docs == docs
+
+        path = data_dir / "table_0.csv"
+        os.utime(path, (0, 0))
+        assert document_loader.load(str(path)) == docs[:5]
+        assert document_loader.cache.stats.rehashed == 1
+        path.write_text("name,value\nnew,1\n")
+        _, report = document_loader.load_directory(str(data_dir), skip_unchanged=True)
+        assert (report.parsed, report.skipped) == (1, 2)
@@ -0,0 +1,71 @@
+import os
+import sys
+import pytest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.open_retrieval.embedding_cache import CachedEmbeddings, EmbeddingCache, content_key
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(text)), float(text.count(' ')), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+class TestEmbeddingCache:
+    @pytest.fixture
+    def cache_dir(self, tmp_path):
+        return str(tmp_path / "embedding_cache")
+
+    def test_reembedding_unchanged_chunks_hits_cache(self, cache_dir):
+        embeddings = CountingEmbeddings()
+        cached = CachedEmbeddings(embeddings, EmbeddingCache(cache_dir), provider="huggingface", model_name="test")
+        first = cached.embed_documents(["a chunk", "another chunk"])
+        second = cached.embed_documents(["a chunk", "another  chunk", "a new chunk"])
+        assert embeddings.embedded == ["a chunk", "another chunk", "a new chunk"]
+        assert second[:2] == first
+        assert cached.cache.stats()["hits"] == 2
+
+    def test_cache_persists_across_instances(self, cache_dir):
+        embeddings = CountingEmbeddings()
+        CachedEmbeddings(embeddings, EmbeddingCache(cache_dir, dtype="float16"), provider="fastembed", model_name="test").embed_documents(["persisted chunk"])
+        reopened = CachedEmbeddings(embeddings, EmbeddingCache(cache_dir), provider="fastembed", model_name="test")
+        reopened.embed_documents(["persisted chunk"])
+        assert embeddings.embedded == ["persisted chunk"]
+        assert reopened.cache.dtype == "float16"
+
+    def test_least_recently_used_entries_are_evicted(self, cache_dir):
+        cache = EmbeddingCache(cache_dir, max_entries=2)
+        keys = [content_key("ollama", "test", text) for text in ["one", "two", "three"]]
+        cache.put_many(keys[:2], [[1.0], [2.0]])
+        cache.get_many([keys[0]])
+        cache.put_many(keys[2:], [[3.0]])
+        assert cache.get_many(keys)[1] is None
+        assert cache.stats()["evictions"] == 1
+        assert len(cache) == 2
+
+    def test_batch_hits_survive_eviction(self, cache_dir):
+        embeddings = CountingEmbeddings()
+        cached = CachedEmbeddings(embeddings, EmbeddingCache(cache_dir, max_entries=4), provider="huggingface", model_name="test")
+        cached.embed_documents(["a", "bb", "ccc", "dddd"])
+        texts = ["a", "bb", "eeeee", "ffffff", "ggggggg"]
+        assert cached.embed_documents(texts) == embeddings.embed_documents(texts)
+        assert cached.cache.get_many([content_key("huggingface", "test", text) for text in ["a", "bb"]])[0] is not None
+
+    def test_provider_shares_one_cache_per_directory(self, cache_dir):
+        from src.open_retrieval.embedding_providers import shared_embedding_cache, clear_model_registry
+        clear_model_registry()
+        assert shared_embedding_cache(cache_dir) is shared_embedding_cache(os.path.join(cache_dir, "."))
+        clear_model_registry()
+
+    def test_cache_key_includes_embedding_kwargs(self, cache_dir):
+        from src.open_retrieval.embedding_providers import EmbeddingProvider, clear_model_registry
+        provider = EmbeddingProvider("ollama")
+        names = [provider.get_embedding_function(model_name="nomic-embed-text", cache_dir=cache_dir, embedding_kwargs=embedding_kwargs, shared=False).model_name
+                 for embedding_kwargs in (None, {"document_prefix": "search_document: "}, {"document_prefix": "passage: "}, {"document_prefix": "passage: "})]
+        assert names[0] == "nomic-embed-text"
+        assert len(set(names)) == 3 and names[2] == names[3]
+        clear_model_registry()
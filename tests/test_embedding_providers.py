@@ -1,8 +1,11 @@
 import sys
 import os
+import time
+import subprocess
 import pytest
+from concurrent.futures import ThreadPoolExecutor
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from src.open_retrieval.embedding_providers import EmbeddingProvider
+from src.open_retrieval.embedding_providers import EmbeddingProvider, clear_model_registry
 
 class TestEmbeddingProvider:
     @pytest.fixture
@@ -28,3 +31,39 @@ class TestEmbeddingProvider:
     def test_get_embedding_function_ollama(self, ollama_embedding_provider):
         embedding_function = ollama_embedding_provider.get_embedding_function()
         assert embedding_function is not None 
+
+
+class TestModelRegistry:
+    @pytest.fixture(autouse=True)
+    def empty_registry(self):
+        clear_model_registry()
+        yield
+        clear_model_registry()
+
+    def test_registry_shares_models(self):
+        provider = EmbeddingProvider(embedding_provider="ollama")
+        first = provider.get_embedding_function(model_name="nomic-embed-text")
+        assert EmbeddingProvider(embedding_provider="ollama").get_embedding_function(model_name="nomic-embed-text") is first
+        assert provider.get_embedding_function(model_name="nomic-embed-text", embedding_kwargs={"base_url": "http://other:11434"}) is not first
+        assert provider.get_embedding_function(model_name="nomic-embed-text", shared=False) is not first
+
+    def test_registry_loads_once_under_concurrency(self, monkeypatch):
+        calls = []
+
+        def create(self, model_name=None, embedding_kwargs=None):
+            calls.append(model_name)
+            time.sleep(0.05)
+            return object()
+
+        monkeypatch.setattr(EmbeddingProvider, "_create_embedding_function", create)
+        provider = EmbeddingProvider(embedding_provider="huggingface")
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            models = list(executor.map(lambda _: provider.get_embedding_function(model_name="m"), range(8)))
+        assert calls == ["m"]
+        assert all(model is models[0] for model in models)
+
+    def test_backends_are_imported_lazily(self):
+        code = "import sys; import src.open_retrieval.vector_databases, src.open_retrieval.document_loaders, src.open_retrieval.embedding_providers, src.open_retrieval.retrievers; print(sorted(m for m in ('qdrant_client', 'chromadb', 'pymilvus', 'faiss', 'unstructured', 'rerankers', 'sentence_transformers') if m in sys.modules))"
+        root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+        output = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True).stdout
+        assert output.strip() == "[]"
@@ -0,0 +1,71 @@
+import os
+import sys
+import shutil
+import pytest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from src.open_retrieval.document_loaders import DocumentLoader
+from src.open_retrieval.text_splitters import TextSplitter
+from src.open_retrieval.vector_databases import VectorDatabase
+from src.open_retrieval.ingestion import IngestionPipeline
+from src.open_retrieval.deduplication import ChunkDeduplicator
+
+class TestIngestionPipeline:
+    @pytest.fixture
+    def data_path(self, tmp_path):
+        data_path = tmp_path / "data"
+        data_path.mkdir()
+        shutil.copy("tests/test_data/FuelConsumption.csv", data_path / "fuel_a.csv")
+        shutil.copy("tests/test_data/FuelConsumption.csv", data_path / "fuel_b.csv")
+        return str(data_path)
+
+    @pytest.fixture
+    def pipeline(self):
+        return IngestionPipeline(loader=DocumentLoader(), splitter=TextSplitter(splitter='recursive'), vector_database=VectorDatabase(vector_store='faiss'),
+                                 embedding_function=DeterministicFakeEmbedding(size=16), batch_size=100, max_workers=2, queue_size=50)
+
+    def test_run_faiss(self, pipeline, data_path, tmp_path):
+        index_dir = str(tmp_path / "index")
+        vector_index, report = pipeline.run(data_path, index_name='test_ingestion_faiss', index_dir=index_dir)
+        assert report.files == 2
+        assert report.added == report.chunks == len(vector_index.index_to_docstore_id)
+        assert report.batches == -(-report.chunks // 100)
+        assert {doc.metadata["file_name"] for doc in vector_index.docstore._dict.values()} == {"fuel_a", "fuel_b"}
+
+        _, report = pipeline.run(data_path, index_name='test_ingestion_faiss', index_dir=index_dir)
+        assert report.added == 0
+        assert report.skipped == report.chunks
+
+    def test_run_with_deduplication(self, data_path, tmp_path):
+        pipeline = IngestionPipeline(loader=DocumentLoader(), splitter=TextSplitter(splitter='recursive'), vector_database=VectorDatabase(vector_store='numpy'),
+                                     embedding_function=DeterministicFakeEmbedding(size=16), batch_size=100, max_workers=2, deduplicator=ChunkDeduplicator(method="exact"))
+        vector_index, report = pipeline.run(data_path, index_name='test_ingestion_dedup', index_dir=str(tmp_path / "index"))
+        assert report.duplicates >= report.chunks // 2
+        assert report.added == len(vector_index) == report.chunks - report.duplicates
+
+    def test_chunks_follow_file_order(self, pipeline, tmp_path):
+        data_path = tmp_path / "ordered"
+        data_path.mkdir()
+        shutil.copy("tests/test_data/FuelConsumption.csv", data_path / "a_large.csv")
+        for name in ("b_small", "c_small", "d_small"):
+            (data_path / f"{name}.csv").write_text("MODEL,FUEL\nbeetle,diesel\n")
+        (data_path / "e_notes.xyz").write_text("no loader")
+        file_paths = sorted(str(path) for path in data_path.iterdir())
+        file_names = [doc.metadata["file_name"] for doc in pipeline.iter_chunks(file_paths)]
+        assert file_names == sorted(file_names) and set(file_names) == {"a_large", "b_small", "c_small", "d_small"}
+
+        _, report = pipeline.run(str(data_path), index_name='test_ingestion_order', index_dir=str(tmp_path / "index"))
+        assert report.files == 4
+        assert report.failed_files == [str(data_path / "e_notes.xyz")]
+
+    def test_rerun_with_deduplication_adds_nothing(self, data_path, tmp_path):
+        index_dir = str(tmp_path / "index")
+        reports = []
+        # twins only share a deduplicate call, and get provenance, when the batches hold both files
+        for batch_size in (2000, 7):
+            pipeline = IngestionPipeline(loader=DocumentLoader(), splitter=TextSplitter(splitter='recursive'), vector_database=VectorDatabase(vector_store='numpy'),
+                                         embedding_function=DeterministicFakeEmbedding(size=16), batch_size=batch_size, max_workers=2, deduplicator=ChunkDeduplicator(method="minhash"))
+            reports.append(pipeline.run(data_path, index_name='test_ingestion_rerun', index_dir=index_dir)[1])
+        assert reports[0].added > 0 and reports[0].duplicates > 0
+        assert reports[1].added == 0
+        assert reports[1].skipped == reports[0].added
@@ -0,0 +1,65 @@
+import os
+import sys
+import pytest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from langchain.docstore.document import Document
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from src.open_retrieval.caches import LRUCache
+from src.open_retrieval.instrumentation import MetricsCollector, collect_metrics, enabled, instrumented, span
+from src.open_retrieval.retrievers import Retriever
+from src.open_retrieval.text_splitters import TextSplitter
+from src.open_retrieval.vector_databases import VectorDatabase
+
+class TestInstrumentation:
+    docs = [Document(page_content=f"chunk {i}", metadata={"file_name": f"file_{i % 2}"}) for i in range(20)]
+
+    def test_disabled_by_default(self):
+        calls = []
+
+        @instrumented("test.stage", lambda result, *args: calls.append(result) or {})
+        def stage(x):
+            with span("test.inner") as inner:
+                assert inner is None
+            return x
+        assert not enabled()
+        assert stage(3) == 3
+        assert calls == []
+
+    def test_pipeline_spans_and_metrics(self, tmp_path):
+        with collect_metrics() as metrics:
+            chunks = TextSplitter(splitter="fast_recursive").split(self.docs, chunk_size=100, chunk_overlap=0)
+            vector_index = VectorDatabase(vector_store='numpy').create_index(embedding_function=DeterministicFakeEmbedding(size=16), docs=chunks, index_name='test_numpy', index_dir=str(tmp_path))
+            retriever = Retriever(vector_index=vector_index, cache=LRUCache())
+            retriever.naive_retrieval("chunk 1", top_k=3)
+            retriever.naive_retrieval("chunk 1", top_k=3)
+            retriever.naive_retrieval_batch(["chunk 1", "chunk 2"], top_k=3)
+        assert not enabled()
+
+        stats = metrics.stats()
+        assert stats["text_splitter.split"]["items"] == 20
+        assert stats["text_splitter.split"]["mean_batch_size"] == 20
+        assert stats["vector_database.create_index"]["items"] == 20
+        assert stats["retriever.naive_retrieval"]["calls"] == 2
+        assert stats["retriever.naive_retrieval"]["cache_hit_rate"] == 0.5
+        assert stats["retriever.search"]["calls"] == 1
+        assert stats["retriever.embed_queries"]["mean_batch_size"] == 2
+
+        spans = {span["name"]: span for span in metrics.export_spans()}
+        batch, embed = spans["retriever.naive_retrieval_batch"], spans["retriever.embed_queries"]
+        assert embed["parentSpanId"] != "" and embed["traceId"] == batch["traceId"]
+        assert {"key": "batch_size", "value": {"intValue": "2"}} in batch["attributes"]
+
+        text = metrics.to_prometheus()
+        assert '# TYPE open_retrieval_stage_duration_seconds histogram' in text
+        assert 'open_retrieval_stage_duration_seconds_count{stage="retriever.naive_retrieval"} 2' in text
+        assert 'open_retrieval_stage_cache_hits_total{stage="retriever.naive_retrieval"} 1' in text
+
+    def test_errors_are_recorded(self):
+        @instrumented("test.failing")
+        def failing():
+            raise KeyError("missing")
+        with collect_metrics(MetricsCollector(max_spans=1)) as metrics:
+            with pytest.raises(KeyError):
+                failing()
+        assert metrics.stats()["test.failing"]["errors"] == 1
+        assert metrics.export_spans()[0]["status"] == {"code": "STATUS_CODE_ERROR", "message": "KeyError"}
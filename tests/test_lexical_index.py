@@ -0,0 +1,61 @@
+import os
+import sys
+import pytest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from langchain.docstore.document import Document
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from src.open_retrieval.lexical_index import BM25Index, tokenize
+from src.open_retrieval.vector_databases import VectorDatabase
+
+class TestBM25Index:
+    docs = [
+        Document(page_content="Sales Tax Act 2018 section 12.3 exemptions", metadata={"file_name": "sales_tax"}),
+        Document(page_content="The tax is charged on taxable goods", metadata={"file_name": "sales_tax"}),
+        Document(page_content="Measures relating to the reduction of demand for tobacco", metadata={"file_name": "who"}),
+        Document(page_content="Cyber security strategy for Canada", metadata={"file_name": "canada"}),
+    ]
+
+    @pytest.fixture
+    def bm25_index(self, tmp_path):
+        index = BM25Index(str(tmp_path / "test.bm25"))
+        index.add_documents(self.docs)
+        return index
+
+    def test_tokenize_keeps_section_numbers(self):
+        assert tokenize("Section 12.3 of the Act") == ["section", "12.3", "of", "the", "act"]
+
+    def test_search(self, bm25_index):
+        results = bm25_index.search("section 12.3 of the sales tax act", k=2)
+        assert results[0][0] == self.docs[0]
+        assert len(results) == 2
+        assert bm25_index.search("tobacco", k=5, filter={"file_name": "sales_tax"}) == []
+
+    def test_incremental_add_save_and_delete(self, bm25_index):
+        assert bm25_index.add_documents(self.docs) == 0
+        bm25_index.add_documents([Document(page_content="tobacco advertising bans", metadata={"file_name": "who"})], ids=["extra"])
+        bm25_index.save()
+        reopened = BM25Index(bm25_index.path)
+        assert len(reopened) == 5
+        assert len(reopened.search("tobacco", k=5)) == 2
+        reopened.delete(["extra"])
+        assert [doc for doc, _ in reopened.search("tobacco", k=5)] == [self.docs[2]]
+
+    def test_index_writer_keeps_lexical_index_in_sync(self, tmp_path):
+        vector_database = VectorDatabase(vector_store='numpy')
+        vector_database.sync_index(embedding_function=DeterministicFakeEmbedding(size=16), index_name='test_numpy', docs=self.docs, index_dir=str(tmp_path), lexical=True)
+        vector_database.sync_index(embedding_function=DeterministicFakeEmbedding(size=16), index_name='test_numpy', docs=self.docs[1:], index_dir=str(tmp_path), lexical=True)
+        lexical_index = vector_database.create_lexical_index('test_numpy', index_dir=str(tmp_path))
+        assert len(lexical_index) == 3
+        assert lexical_index.search("12.3", k=1) == []
+
+    def test_filters_are_answered_from_the_metadata_index(self, bm25_index, monkeypatch):
+        bm25_index.add_documents([Document(page_content="tobacco advertising bans", metadata={"file_name": "who", "year": 2005})], ids=["extra"])
+        monkeypatch.setattr(bm25_index, "_filter_mask", None)
+        assert len(bm25_index.search("tobacco", k=5, filter={"file_name": "who"})) == 2
+        assert [doc.page_content for doc, _ in bm25_index.search("tobacco", k=5, filter={"file_name": ["canada", "who"], "year": 2005})] == ["tobacco advertising bans"]
+        bm25_index.delete(["extra"])
+        assert [doc for doc, _ in bm25_index.search("tobacco", k=5, filter={"file_name": "who"})] == [self.docs[2]]
+        bm25_index.save()
+        reopened = BM25Index(bm25_index.path)
+        assert reopened.search("tax", k=5, filter={"file_name": "who"}) == []
+        assert len(reopened.search("tax", k=5, filter={"file_name": "sales_tax"})) == 2
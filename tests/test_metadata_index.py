@@ -0,0 +1,65 @@
+import os
+import sys
+import pytest
+import numpy as np
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from langchain.docstore.document import Document
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from src.open_retrieval.metadata_index import MetadataIndex
+from src.open_retrieval.numpy_store import NumpyVectorStore
+
+class TestMetadataIndex:
+    embedding_function = DeterministicFakeEmbedding(size=16)
+    docs = [Document(page_content=f"chunk {i}", metadata={"file_name": f"file_{i % 50}", "page": i % 4}) for i in range(500)]
+
+    def brute_force(self, query, k, filter, l2=False):
+        matrix = np.array(self.embedding_function.embed_documents([doc.page_content for doc in self.docs]))
+        vector = np.array(self.embedding_function.embed_query(query))
+        scores = -((matrix - vector) ** 2).sum(axis=1) if l2 else (matrix / np.linalg.norm(matrix, axis=1, keepdims=True)) @ (vector / np.linalg.norm(vector))
+        matching = [i for i, doc in enumerate(self.docs) if all(doc.metadata[name] in (value if isinstance(value, list) else [value]) for name, value in filter.items())]
+        return [self.docs[i] for i in sorted(matching, key=lambda i: -scores[i])[:k]]
+
+    def test_postings(self):
+        index = MetadataIndex.from_metadatas(enumerate(doc.metadata for doc in self.docs))
+        assert index.rows(None) is None
+        assert index.rows({"file_name": "file_3"}).tolist() == list(range(3, 500, 50))
+        assert index.rows({"file_name": ["file_3", "file_4"], "page": 0}).tolist() == [i for i in range(500) if i % 50 in (3, 4) and i % 4 == 0]
+        assert len(index.rows({"file_name": "missing"})) == 0
+        assert len(index.rows({"author": "x"})) == 0
+
+        codes = MetadataIndex()
+        codes.add_codes("page", np.array([1, -1, 0, 1], dtype=np.int32), ["0", "1"])
+        assert codes.rows({"page": 1}).tolist() == [0, 3]
+        assert codes.rows({"page": [0, 1]}).tolist() == [0, 2, 3]
+
+    def test_numpy_ivf_filter_returns_k(self, tmp_path):
+        store = NumpyVectorStore.from_documents(self.docs, self.embedding_function, path=str(tmp_path / "store"), nprobe=1, block_size=4)
+        store.build_ivf(16)
+        filter = {"file_name": "file_7"}
+        results = store.similarity_search("chunk 3", k=10, filter=filter)
+        assert results == self.brute_force("chunk 3", 10, filter)
+
+        store.add_texts(["extra chunk"], metadatas=[{"file_name": "file_7", "page": 9}])
+        assert len(store.similarity_search("chunk 3", k=11, filter=filter)) == 11
+        assert store.similarity_search("chunk 3", k=5, filter={"page": 9})[0].page_content == "extra chunk"
+
+    @pytest.mark.parametrize("filter", [{"file_name": "file_7"}, {"file_name": ["file_1", "file_2"], "page": 1}, {"page": 3}])
+    def test_prefiltered_faiss_matches_brute_force(self, filter):
+        pytest.importorskip("faiss")
+        from src.open_retrieval.filtered_faiss import PrefilteredFAISS
+        store = PrefilteredFAISS.from_documents(self.docs, self.embedding_function)
+        results = store.similarity_search("chunk 3", k=10, filter=filter)
+        assert results == self.brute_force("chunk 3", 10, filter, l2=True)
+
+    def test_prefiltered_faiss_invalidates_on_writes(self):
+        pytest.importorskip("faiss")
+        from src.open_retrieval.filtered_faiss import PrefilteredFAISS
+        store = PrefilteredFAISS.from_documents(self.docs, self.embedding_function, ids=[str(i) for i in range(500)])
+        assert len(store.similarity_search("chunk 3", k=20, filter={"file_name": "file_7"})) == 10
+        store.delete(["7", "57"])
+        results = store.similarity_search("chunk 3", k=20, filter={"file_name": "file_7"})
+        assert len(results) == 8
+        assert all(doc.metadata["file_name"] == "file_7" for doc in results)
+        store.add_texts(["extra chunk"], metadatas=[{"file_name": "file_7", "page": 0}])
+        assert len(store.similarity_search("chunk 3", k=20, filter={"file_name": "file_7"})) == 9
+        assert store.similarity_search("chunk 3", k=3, filter=lambda metadata: metadata["page"] == 0)
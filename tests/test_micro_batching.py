@@ -0,0 +1,26 @@
+import os
+import sys
+import asyncio
+import pytest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.open_retrieval.micro_batching import MicroBatcher
+
+class TestMicroBatcher:
+    def test_coalesces_concurrent_items(self):
+        batcher = MicroBatcher(lambda items: [item * 2 for item in items], max_batch_size=8, max_wait=0.05)
+
+        async def submit_all():
+            return await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+
+        assert asyncio.run(submit_all()) == [i * 2 for i in range(10)]
+        assert (batcher.batches, batcher.items) == (2, 10)
+        assert not batcher._tasks
+
+    def test_short_results_fail_every_caller(self):
+        batcher = MicroBatcher(lambda items: items[:-1], max_batch_size=3, max_wait=0.05)
+
+        async def submit_all():
+            return await asyncio.wait_for(asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True), timeout=5)
+
+        results = asyncio.run(submit_all())
+        assert all(isinstance(result, ValueError) for result in results)
@@ -0,0 +1,80 @@
+import os
+import sys
+import pytest
+import numpy as np
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from langchain.docstore.document import Document
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from src.open_retrieval.numpy_store import NumpyVectorStore
+from src.open_retrieval.vector_databases import VectorDatabase
+
+class TestNumpyVectorStore:
+    embedding_function = DeterministicFakeEmbedding(size=32)
+    docs = [Document(page_content=f"chunk {i}", metadata={"file_name": f"file_{i % 3}", "page": i}) for i in range(300)]
+
+    @pytest.fixture
+    def store(self, tmp_path):
+        return NumpyVectorStore.from_documents(self.docs, self.embedding_function, path=str(tmp_path / "store"), block_size=64)
+
+    def test_exact_search(self, store):
+        results = store.similarity_search_with_score("chunk 42", k=3)
+        assert results[0][0] == self.docs[42]
+        assert results[0][1] == pytest.approx(1.0, abs=1e-5)
+        assert [score for _, score in results] == sorted([score for _, score in results], reverse=True)
+
+    def test_search_matches_brute_force(self, store):
+        matrix = np.array(self.embedding_function.embed_documents([doc.page_content for doc in self.docs]))
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        query = np.array(self.embedding_function.embed_query("chunk 7"))
+        expected = np.argsort(-(matrix @ query))[:10]
+        assert store.similarity_search("chunk 7", k=10) == [self.docs[i] for i in expected]
+
+    def test_filter_and_delete(self, store):
+        ids = store.add_texts(["extra chunk"], metadatas=[{"file_name": "extra"}])
+        assert store.similarity_search("chunk 1", k=5, filter={"file_name": "extra"})[0].page_content == "extra chunk"
+        results = store.similarity_search("chunk 1", k=200, filter={"file_name": "file_1"})
+        assert len(results) == 100
+        assert all(doc.metadata["file_name"] == "file_1" for doc in results)
+        store.delete(ids)
+        assert store.similarity_search("chunk 1", k=5, filter={"file_name": "extra"}) == []
+
+    def test_reopen(self, store):
+        reopened = NumpyVectorStore.load(store.path, self.embedding_function)
+        assert len(reopened) == len(self.docs)
+        assert reopened.similarity_search("chunk 5", k=1) == [self.docs[5]]
+
+    def test_ivf_full_probe_matches_exact(self, store):
+        exact = store.similarity_search("chunk 9", k=5)
+        store.build_ivf(nlist=4)
+        assert store.similarity_search("chunk 9", k=5, nprobe=4) == exact
+        assert len(store.similarity_search("chunk 9", k=5, nprobe=1)) == 5
+
+    def test_create_index_numpy(self, tmp_path):
+        vector_database = VectorDatabase(vector_store='numpy')
+        vector_index = vector_database.create_index(embedding_function=self.embedding_function, docs=self.docs, index_name='test_numpy', index_dir=str(tmp_path), dtype='float16')
+        assert vector_index.similarity_search("chunk 3", k=1) == [self.docs[3]]
+        reopened = vector_database.create_index(embedding_function=self.embedding_function, index_name='test_numpy', index_dir=str(tmp_path))
+        assert reopened.header["dtype"] == "float16"
+
+    @pytest.mark.parametrize("quantization", ["int8", "binary"])
+    def test_quantized_search_rescores(self, tmp_path, quantization):
+        store = NumpyVectorStore.from_documents(self.docs, self.embedding_function, path=str(tmp_path / quantization), block_size=64, quantization=quantization, rescore_factor=8)
+        results = store.similarity_search_with_score("chunk 42", k=3)
+        assert results[0][0] == self.docs[42]
+        assert results[0][1] == pytest.approx(1.0, abs=1e-5)
+        store.add_texts(["extra chunk"], metadatas=[{"file_name": "extra"}])
+        assert store.similarity_search("extra chunk", k=1, filter={"file_name": "extra"})[0].page_content == "extra chunk"
+        assert store.recall_at_k(k=5) >= (0.95 if quantization == "int8" else 0.5)
+        footprint = store.memory_footprint()
+        assert footprint["resident"] == footprint["codes"] < footprint["vectors"]
+
+    def test_quantize_existing_index(self, tmp_path):
+        vector_database = VectorDatabase(vector_store='numpy')
+        vector_index = vector_database.create_index(embedding_function=self.embedding_function, docs=self.docs, index_name='test_numpy', index_dir=str(tmp_path))
+        assert vector_index.recall_at_k(k=5) == 1.0
+        full = vector_index.memory_footprint()
+        assert full["resident"] == full["vectors"]
+        quantized = vector_database.create_index(embedding_function=self.embedding_function, index_name='test_numpy', index_dir=str(tmp_path), quantization='int8')
+        assert quantized.quantization == 'int8'
+        assert quantized.memory_footprint()["codes"] * 3 < full["vectors"]
+        assert quantized.similarity_search("chunk 3", k=1) == [self.docs[3]]
@@ -0,0 +1,141 @@
+import os
+import sys
+import json
+import time
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.open_retrieval.ollama_embeddings import OllamaEmbeddingClient
+from src.open_retrieval.embedding_providers import EmbeddingProvider
+from src.open_retrieval.instrumentation import collect_metrics
+
+
+def fake_embedding(text):
+    return [float(len(text)), float(sum(map(ord, text)) % 97), 1.0]
+
+
+class StubOllama:
+    """
+    Mimics the /api/embed and /api/embeddings endpoints of an Ollama server.
+    """
+    def __init__(self, legacy=False, failures=0, delay=0.0, models=None):
+        self.legacy = legacy
+        self.models = models
+        self.failures = failures
+        self.delay = delay
+        self.requests = []
+        self.connections = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def handle(self, handler):
+        body = json.loads(handler.rfile.read(int(handler.headers["Content-Length"])))
+        with self.lock:
+            self.requests.append((handler.path, body))
+            self.connections.add(handler.client_address)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            fail = self.failures > 0
+            self.failures -= fail
+        try:
+            time.sleep(self.delay)
+            if fail:
+                return 503, {"error": "server busy"}
+            if self.models is not None and body["model"] not in self.models:
+                return 404, {"error": f'model "{body["model"]}" not found, try pulling it first'}
+            if handler.path == "/api/embed" and not self.legacy:
+                return 200, {"model": body["model"], "embeddings": [fake_embedding(text) for text in body["input"]]}
+            if handler.path == "/api/embeddings":
+                return 200, {"embedding": fake_embedding(body["prompt"])}
+            return 404, {"error": "not found"}
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+class TestOllamaEmbeddingClient:
+    @pytest.fixture
+    def serve(self):
+        servers = []
+
+        def start(stub):
+            class Handler(BaseHTTPRequestHandler):
+                protocol_version = "HTTP/1.1"
+
+                def do_POST(self):
+                    status, payload = stub.handle(self)
+                    data = json.dumps(payload).encode("utf-8")
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+
+                def log_message(self, *args):
+                    pass
+
+            httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+            threading.Thread(target=httpd.serve_forever, daemon=True).start()
+            servers.append(httpd)
+            return f"http://127.0.0.1:{httpd.server_address[1]}"
+
+        yield start
+        for httpd in servers:
+            httpd.shutdown()
+
+    def test_batches_concurrently_over_pooled_connections(self, serve):
+        stub = StubOllama(delay=0.05)
+        client = OllamaEmbeddingClient(model="nomic-embed-text", base_url=serve(stub), batch_size=10, max_concurrency=4)
+        texts = [f"chunk number {i}" * (i % 5 + 1) for i in range(100)]
+        for _ in range(2):
+            assert client.embed_documents(texts) == [fake_embedding(text) for text in texts]
+        client.close()
+
+        assert len(stub.requests) == 20
+        assert all(path == "/api/embed" and len(body["input"]) == 10 for path, body in stub.requests)
+        assert 1 < stub.max_in_flight <= 4
+        assert len(stub.connections) <= 4
+        assert client.metrics.texts == 200 and client.metrics.requests == 20
+        assert client.metrics.texts_per_second > 0
+
+    def test_retries_transient_failures(self, serve):
+        stub = StubOllama(failures=2)
+        client = OllamaEmbeddingClient(base_url=serve(stub), max_concurrency=1, backoff=0.01)
+        assert client.embed_query("hello") == fake_embedding("hello")
+        assert (client.metrics.retries, client.metrics.requests, client.metrics.failures) == (2, 1, 0)
+
+        stub.failures = 10
+        with pytest.raises(ValueError, match="503"):
+            client.embed_documents(["a", "b"])
+        assert client.metrics.failures == 1
+
+    def test_falls_back_to_legacy_endpoint(self, serve):
+        stub = StubOllama(legacy=True)
+        client = OllamaEmbeddingClient(base_url=serve(stub), batch_size=16, max_concurrency=3, query_prefix="search_query: ")
+        texts = [f"text {i}" for i in range(10)]
+        assert client.embed_documents(texts) == [fake_embedding(text) for text in texts]
+        assert client.embed_query("q") == fake_embedding("search_query: q")
+        assert [path for path, _ in stub.requests].count("/api/embed") == 1
+        assert [path for path, _ in stub.requests].count("/api/embeddings") == 11
+
+    def test_provider_reports_request_spans(self, serve):
+        stub = StubOllama()
+        embedding_function = EmbeddingProvider("ollama").get_embedding_function(model_name="nomic-embed-text", embedding_kwargs={"base_url": serve(stub), "batch_size": 4, "keep_alive": "10m"}, shared=False)
+        assert isinstance(embedding_function, OllamaEmbeddingClient)
+        with collect_metrics() as collector:
+            embedding_function.embed_documents([str(i) for i in range(10)])
+        assert collector.stages["ollama.request"].calls == 3
+        assert collector.stages["embeddings.ollama"].calls == 1
+        assert all(body["keep_alive"] == "10m" and body["model"] == "nomic-embed-text" for _, body in stub.requests)
+        assert sorted(text for _, body in stub.requests for text in body["input"]) == sorted(f"passage: {i}" for i in range(10))
+        assert embedding_function.embed_query("q") == fake_embedding("query: q")
+
+    def test_missing_model_is_not_a_legacy_server(self, serve):
+        stub = StubOllama(models={"nomic-embed-text"})
+        client = OllamaEmbeddingClient(model="missing", base_url=serve(stub), max_concurrency=1)
+        with pytest.raises(ValueError, match="try pulling it first"):
+            client.embed_documents(["a"])
+        assert not client._legacy
+        assert [path for path, _ in stub.requests] == ["/api/embed"]
@@ -0,0 +1,58 @@
+import os
+import sys
+import pytest
+import numpy as np
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.open_retrieval.onnx_embeddings import OnnxEmbeddings
+
+
+class FakeTokenizer:
+    pad_token_id = 0
+
+    def __call__(self, texts, truncation=True, max_length=512, padding=False):
+        return {"input_ids": [[101] + [len(word) + 1 for word in text.split()][:max_length - 1] for text in texts]}
+
+
+class FakeInput:
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeSession:
+    """
+    Returns a hidden state per token that only depends on the token id, like an encoder without attention.
+    """
+    def __init__(self, dimension=8):
+        self.dimension = dimension
+        self.shapes = []
+
+    def get_inputs(self):
+        return [FakeInput("input_ids"), FakeInput("attention_mask"), FakeInput("token_type_ids")]
+
+    def run(self, output_names, feeds):
+        assert set(feeds) == {"input_ids", "attention_mask", "token_type_ids"}
+        self.shapes.append(feeds["input_ids"].shape)
+        ids = feeds["input_ids"]
+        hidden = np.stack([np.sin(ids * (i + 1)) for i in range(self.dimension)], axis=-1).astype(np.float32)
+        return [hidden]
+
+
+class TestOnnxEmbeddings:
+    texts = ["word " * n for n in (30, 2, 15, 1, 30, 7, 3, 22, 2, 9)]
+
+    def test_length_buckets_restore_order(self):
+        session = FakeSession()
+        embeddings = OnnxEmbeddings(session=session, tokenizer=FakeTokenizer(), batch_size=3, pooling="mean")
+        vectors = np.array(embeddings.embed_documents(self.texts))
+        one_by_one = np.array([embeddings.embed_documents([text])[0] for text in self.texts])
+        np.testing.assert_allclose(vectors, one_by_one, rtol=1e-5, atol=1e-6)
+        np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, rtol=1e-5)
+        assert [shape[1] for shape in session.shapes[:4]] == [3, 10, 31, 31]
+        assert sum(rows * length for rows, length in session.shapes[:4]) < len(self.texts) * 31
+
+    def test_cls_pooling_and_query_instruction(self):
+        embeddings = OnnxEmbeddings(session=FakeSession(), tokenizer=FakeTokenizer(), pooling="cls", normalize=False, query_instruction="query: ")
+        assert embeddings.embed_query("a b") == embeddings.embed_documents(["query: a b"])[0]
+        assert embeddings.embed_documents(["a", "abc"])[0] == embeddings.embed_documents(["abc"])[0]
+        with pytest.raises(ValueError):
+            OnnxEmbeddings(session=FakeSession(), tokenizer=FakeTokenizer(), pooling="max")
@@ -1,14 +1,25 @@
 import os
 import sys
 import pytest
+import asyncio
 # from langchain_community.vectorstores import Milvus
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from langchain.docstore.document import Document
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_community.vectorstores import FAISS
 from src.open_retrieval.document_loaders import DocumentLoader
 from src.open_retrieval.embedding_providers import EmbeddingProvider
 from src.open_retrieval.text_splitters import TextSplitter
-from src.open_retrieval.vector_databases import VectorDatabase  
+from src.open_retrieval.vector_databases import VectorDatabase
 from src.open_retrieval.retrievers import Retriever
+from src.open_retrieval.caches import LRUCache
+from src.open_retrieval.embedding_cache import CachedEmbeddings, EmbeddingCache
+from src.open_retrieval.utils.classifier import Classifier
+from src.open_retrieval.utils.config import Config
+from langchain_community.llms.fake import FakeListLLM
 from rerankers import Reranker
+from rerankers.documents import Document as RerankersDocument
+from rerankers.results import RankedResults, Result
 class TestVectorDatabase:
     document_loader = DocumentLoader()
     text_splitter = TextSplitter(splitter='recursive')
@@ -37,3 +48,176 @@ class TestVectorDatabase:
         results = retriever.naive_retrieval( query='What are MEASURES RELATING TO THE REDUCTION OF THE SUPPLY OF TOBACCO', top_k=5 )
         assert len(results) == 5
 
+    @pytest.fixture
+    def fake_faiss_index(self):
+        docs = [Document(page_content=f"chunk {i}", metadata={"file_name": f"file_{i % 2}"}) for i in range(10)]
+        return FAISS.from_documents(docs, DeterministicFakeEmbedding(size=16))
+
+    def test_naive_retrieval_batch(self, fake_faiss_index):
+        retriever = Retriever(vector_index=fake_faiss_index)
+        queries = ["chunk 1", "chunk 4", "chunk 7"]
+        results = retriever.naive_retrieval_batch(queries, top_k=3)
+        assert results == [retriever.naive_retrieval(query, top_k=3) for query in queries]
+
+    def test_batched_paths_embed_queries_as_queries(self, tmp_path):
+        class PrefixedEmbeddings(DeterministicFakeEmbedding):
+            def embed_query(self, text):
+                return super().embed_query("query: " + text)
+
+        embeddings = CachedEmbeddings(PrefixedEmbeddings(size=16), EmbeddingCache(str(tmp_path / "cache")), provider="huggingface", model_name="test")
+        docs = [Document(page_content=f"chunk {i}", metadata={"file_name": f"file_{i % 2}"}) for i in range(10)]
+        index = FAISS.from_documents(docs, embeddings)
+        cached = len(embeddings.cache)
+        queries = ["chunk 1", "chunk 4", "chunk 7"]
+        expected = [Retriever(vector_index=index).naive_retrieval(query, top_k=3) for query in queries]
+        assert Retriever(vector_index=index).naive_retrieval_batch(queries, top_k=3) == expected
+        retriever = Retriever(vector_index=index, query_cache=LRUCache())
+        assert [retriever.naive_retrieval(query, top_k=3) for query in queries] == expected
+        assert len(embeddings.cache) == cached
+
+    def test_naive_retrieval_batch_with_filters(self, fake_faiss_index):
+        retriever = Retriever(vector_index=fake_faiss_index)
+        filters = [{"file_name": "file_0"}, None]
+        results = retriever.naive_retrieval_batch(["chunk 1", "chunk 2"], top_k=3, filters=filters)
+        assert results[0] == retriever.naive_retrieval("chunk 1", top_k=3, filter={"file_name": "file_0"})
+        assert results[1] == retriever.naive_retrieval("chunk 2", top_k=3)
+
+    def test_naive_retrieval_batch_numpy(self, tmp_path):
+        docs = [Document(page_content=f"chunk {i}", metadata={"file_name": f"file_{i % 2}"}) for i in range(10)]
+        vector_index = VectorDatabase(vector_store='numpy').create_index(embedding_function=DeterministicFakeEmbedding(size=16), docs=docs, index_name='test_numpy', index_dir=str(tmp_path))
+        retriever = Retriever(vector_index=vector_index)
+        filters = [{"file_name": "file_0"}, None, {"file_name": "file_0"}]
+        results = retriever.naive_retrieval_batch(["chunk 1", "chunk 2", "chunk 3"], top_k=3, filters=filters)
+        assert results == [retriever.naive_retrieval(query, top_k=3, filter=f) for query, f in zip(["chunk 1", "chunk 2", "chunk 3"], filters)]
+
+    def test_hybrid_retrieval(self, tmp_path):
+        docs = [Document(page_content=f"chunk {i}", metadata={"file_name": f"file_{i % 2}"}) for i in range(10)]
+        docs.append(Document(page_content="Sales Tax Act 2018 section 12", metadata={"file_name": "file_0"}))
+        vector_database = VectorDatabase(vector_store='numpy')
+        vector_index = vector_database.create_index(embedding_function=DeterministicFakeEmbedding(size=16), docs=docs, index_name='test_numpy', index_dir=str(tmp_path))
+        lexical_index = vector_database.create_lexical_index('test_numpy', docs=docs, index_dir=str(tmp_path))
+        retriever = Retriever(vector_index=vector_index, lexical_index=lexical_index)
+        for fusion in ("rrf", "weighted"):
+            results = retriever.hybrid_retrieval("sales tax act section 12", top_k=3, fusion=fusion, candidates=3)
+            assert "Sales Tax Act 2018 section 12" in results
+            assert len(results) == 3
+
+    def test_result_and_query_caches(self, tmp_path):
+        docs = [Document(page_content=f"chunk {i}", metadata={"file_name": f"file_{i % 2}"}) for i in range(10)]
+        vector_index = VectorDatabase(vector_store='numpy').create_index(embedding_function=DeterministicFakeEmbedding(size=16), docs=docs, index_name='test_numpy', index_dir=str(tmp_path))
+        retriever = Retriever(vector_index=vector_index, cache=LRUCache(ttl=60), query_cache=LRUCache())
+        first = retriever.naive_retrieval("chunk 1", top_k=3)
+        assert retriever.naive_retrieval("  chunk 1 ", top_k=3) == first
+        assert retriever.cache_stats()["results"]["hits"] == 1
+
+        vector_index.add_texts(["chunk 1"], metadatas=[{"file_name": "new"}])
+        assert len(retriever.naive_retrieval("chunk 1", top_k=11)) == 11
+        assert retriever.cache_stats()["results"]["misses"] == 2
+        assert retriever.cache_stats()["query_embeddings"]["hits"] == 1
+
+    def test_result_cache_sees_direct_faiss_writes(self, tmp_path):
+        docs = [Document(page_content="alpha", metadata={"file_name": "a"})]
+        vector_index = VectorDatabase(vector_store='faiss').create_index(embedding_function=DeterministicFakeEmbedding(size=16), docs=docs, index_name='test_faiss_cache', index_dir=str(tmp_path))
+        retriever = Retriever(vector_index=vector_index, cache=LRUCache())
+        assert retriever.naive_retrieval("beta", top_k=2) == ["alpha"]
+        ids = vector_index.add_documents([Document(page_content="beta", metadata={"file_name": "b"})])
+        assert sorted(retriever.naive_retrieval("beta", top_k=2)) == ["alpha", "beta"]
+        vector_index.delete(ids)
+        assert retriever.naive_retrieval("beta", top_k=2) == ["alpha"]
+
+    def test_async_retrieval_micro_batches_concurrent_queries(self, fake_faiss_index):
+        retriever = Retriever(vector_index=fake_faiss_index, max_wait=0.05)
+        queries = [f"chunk {i}" for i in range(8)]
+
+        async def retrieve_all():
+            return await asyncio.gather(*(retriever.anaive_retrieval(query, top_k=3) for query in queries))
+
+        results = asyncio.run(retrieve_all())
+        assert results == [retriever.naive_retrieval(query, top_k=3) for query in queries]
+        assert retriever._embed_batcher.batches == 1
+        assert retriever._embed_batcher.items == 8
+        assert not retriever._embed_batcher._tasks
+
+    def test_multi_query_retrieval(self, fake_faiss_index):
+        class FakeRephrasor:
+            calls = 0
+            def predict_json(self, page_text):
+                self.calls += 1
+                return {"rephrased_queries": ["chunk 2", "chunk 3", "chunk 2"]}
+
+        rephrasor = FakeRephrasor()
+        retriever = Retriever(vector_index=fake_faiss_index, rephrase_cache=LRUCache())
+        results = retriever.multi_query_retrieval("chunk 1", rephrasor=rephrasor, top_k=1, ranked_top_k=5)
+        assert sorted(results) == ["chunk 1", "chunk 2", "chunk 3"]
+        assert retriever.multi_query_retrieval("chunk 1", rephrasor=rephrasor, top_k=1, ranked_top_k=5) == results
+        assert rephrasor.calls == 1
+
+    def test_filtered_retrieval(self, fake_faiss_index):
+        classifier = Classifier(llm=FakeListLLM(responses=['{"related": false}', '{"related": true}']), prompt=Config.classifier_prompt)
+        retriever = Retriever(vector_index=fake_faiss_index, classifier=classifier)
+        results = retriever.filtered_retrieval("chunk 1", top_k=6, ranked_top_k=2, max_concurrency=1)
+        assert results == retriever.naive_retrieval("chunk 1", top_k=6)[1:4:2]
+        assert set(retriever.stage_timings) == {"search", "classify"}
+
+    class FakeRanker:
+        """Scores a chunk by its number, so higher numbered chunks rank first."""
+        def __init__(self):
+            self.batches = []
+
+        def rank(self, query, docs, doc_ids=None):
+            self.batches.append(len(docs))
+            scores = [float(text.split()[-1]) for text in docs]
+            order = sorted(range(len(docs)), key=lambda i: -scores[i])
+            return RankedResults([Result(RerankersDocument(text=docs[i], doc_id=doc_ids[i]), score=scores[i], rank=r + 1) for r, i in enumerate(order)], query=query, has_scores=True)
+
+    def test_rerank_cache_and_batches(self, fake_faiss_index):
+        ranker = self.FakeRanker()
+        retriever = Retriever(vector_index=fake_faiss_index, ranker=ranker, rerank_cache=LRUCache(), rerank_batch_size=4)
+        results = retriever.ranked_retrieval_with_scores("chunk 1", top_k=10, ranked_top_k=3)
+        assert [(doc.page_content, score) for doc, score in results] == [("chunk 9", 9.0), ("chunk 8", 8.0), ("chunk 7", 7.0)]
+        assert results[0][0].metadata == {"file_name": "file_1"}
+        assert ranker.batches == [4, 4, 2]
+        assert retriever.ranked_retrieval("chunk 1", top_k=10, ranked_top_k=3) == ["chunk 9", "chunk 8", "chunk 7"]
+        assert ranker.batches == [4, 4, 2]
+        assert retriever.cache_stats()["rerank_scores"]["hits"] == 10
+
+        budgeted = Retriever(vector_index=fake_faiss_index, ranker=ranker, rerank_token_budget=8)
+        budgeted.ranked_retrieval("chunk 1", top_k=6, ranked_top_k=3)
+        assert ranker.batches[3:] == [2, 2, 2]
+
+    class RankOnlyRanker(FakeRanker):
+        """Returns the positions of FakeRanker without scores, like listwise rerankers."""
+        def rank(self, query, docs, doc_ids=None):
+            results = super().rank(query, docs, doc_ids).results
+            return RankedResults([Result(result.document, rank=result.rank) for result in results], query=query, has_scores=False)
+
+    def test_rank_only_reranker_ranks_in_one_uncached_call(self, fake_faiss_index):
+        ranker = self.RankOnlyRanker()
+        retriever = Retriever(vector_index=fake_faiss_index, ranker=ranker, rerank_cache=LRUCache(), rerank_batch_size=4)
+        results = retriever.ranked_retrieval_with_scores("chunk 1", top_k=10, ranked_top_k=3)
+        assert [(doc.page_content, score) for doc, score in results] == [("chunk 9", -1.0), ("chunk 8", -2.0), ("chunk 7", -3.0)]
+        assert ranker.batches == [4, 10]
+        assert len(retriever.rerank_cache) == 0
+        results = retriever.ranked_retrieval_with_scores("chunk 1", top_k=10, ranked_top_k=2, adaptive=True, initial_candidates=4, step=3, score_gap=10)
+        assert [doc.page_content for doc, _ in results] == ["chunk 9", "chunk 8"]
+
+    def test_rerank_cache_is_keyed_by_ranker(self, fake_faiss_index):
+        class ReversedRanker(self.FakeRanker):
+            def rank(self, query, docs, doc_ids=None):
+                results = super().rank(query, docs, doc_ids).results
+                return RankedResults([Result(result.document, score=-result.score, rank=len(results) + 1 - result.rank) for result in results], query=query, has_scores=True)
+
+        rerank_cache = LRUCache()
+        first = Retriever(vector_index=fake_faiss_index, ranker=self.FakeRanker(), rerank_cache=rerank_cache)
+        second = Retriever(vector_index=fake_faiss_index, ranker=ReversedRanker(), rerank_cache=rerank_cache)
+        assert first.ranked_retrieval("chunk 1", top_k=10, ranked_top_k=2) == ["chunk 9", "chunk 8"]
+        assert second.ranked_retrieval("chunk 1", top_k=10, ranked_top_k=2) == ["chunk 0", "chunk 1"]
+
+    def test_adaptive_candidate_pool(self, fake_faiss_index):
+        ranker = self.FakeRanker()
+        retriever = Retriever(vector_index=fake_faiss_index, ranker=ranker)
+        retriever.ranked_retrieval_with_scores("chunk 1", top_k=10, ranked_top_k=2, adaptive=True, initial_candidates=4, score_gap=-10)
+        assert ranker.batches == [4]
+        results = retriever.ranked_retrieval_with_scores("chunk 1", top_k=10, ranked_top_k=2, adaptive=True, initial_candidates=4, step=3, score_gap=10)
+        assert ranker.batches == [4, 4, 3, 3]
+        assert [doc.page_content for doc, _ in results] == ["chunk 9", "chunk 8"]
@@ -0,0 +1,109 @@
+import os
+import sys
+import pytest
+import numpy as np
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from langchain.docstore.document import Document
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from src.open_retrieval.index_manifest import chunk_id
+from src.open_retrieval.sharded_index import ShardedVectorIndex
+from src.open_retrieval.vector_databases import VectorDatabase
+
+class TestShardedVectorIndex:
+    embedding_function = DeterministicFakeEmbedding(size=16)
+    docs = [Document(page_content=f"chunk {i}", metadata={"file_name": f"file_{i % 10}"}) for i in range(200)]
+
+    def expected(self, query, k, file_names=None):
+        matrix = np.array(self.embedding_function.embed_documents([doc.page_content for doc in self.docs]))
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        vector = np.array(self.embedding_function.embed_query(query))
+        order = np.argsort(-(matrix @ (vector / np.linalg.norm(vector))))
+        return [self.docs[i] for i in order if file_names is None or self.docs[i].metadata["file_name"] in file_names][:k]
+
+    @pytest.mark.parametrize("shard_key", [None, "file_name"])
+    def test_scatter_gather_matches_single_index(self, tmp_path, shard_key):
+        index = ShardedVectorIndex.from_documents(self.docs, self.embedding_function, path=str(tmp_path / "sharded"), vector_store="numpy", num_shards=4, shard_key=shard_key)
+        assert sum(index.counts) == 200
+        assert index.similarity_search("chunk 3", k=10) == self.expected("chunk 3", 10)
+        scores = [score for _, score in index.similarity_search_with_score("chunk 3", k=10)]
+        assert scores == sorted(scores, reverse=True)
+        assert index.similarity_search_by_vectors([self.embedding_function.embed_query("chunk 5")], k=5) == [self.expected("chunk 5", 5)]
+        assert index.similarity_search("chunk 3", k=5, filter={"file_name": ["file_1", "file_2"]}) == self.expected("chunk 3", 5, {"file_1", "file_2"})
+        index.close()
+
+    def test_filtered_query_opens_one_shard(self, tmp_path):
+        path = str(tmp_path / "sharded")
+        ShardedVectorIndex.from_documents(self.docs, self.embedding_function, path=path, vector_store="numpy", num_shards=4, shard_key="file_name").close()
+        index = ShardedVectorIndex(path, self.embedding_function, vector_store="numpy", num_shards=4, shard_key="file_name")
+        results = index.similarity_search("chunk 3", k=5, filter={"file_name": "file_3"})
+        assert results == self.expected("chunk 3", 5, {"file_3"})
+        assert len(index._shards) == 1
+        with pytest.raises(ValueError):
+            ShardedVectorIndex(path, self.embedding_function, vector_store="numpy", num_shards=8, shard_key="file_name")
+
+    def test_incremental_writes_and_delete(self, tmp_path):
+        index = ShardedVectorIndex(str(tmp_path / "sharded"), self.embedding_function, vector_store="numpy", num_shards=3)
+        assert index.sync(self.docs).added == 200
+        assert index.sync(self.docs).skipped == 200
+        index.delete([chunk_id(self.docs[3])])
+        assert sum(index.counts) == 199
+        assert self.docs[3] not in index.similarity_search("chunk 3", k=10)
+
+    def test_create_sharded_faiss_index(self, tmp_path):
+        pytest.importorskip("faiss")
+        vector_database = VectorDatabase(vector_store="faiss")
+        index = vector_database.create_index(self.embedding_function, "sharded", self.docs, index_dir=str(tmp_path), num_shards=4, shard_key="file_name")
+        assert isinstance(index, ShardedVectorIndex)
+        assert sorted(os.listdir(tmp_path / "sharded"))[-1] == "shards.json"
+        results = index.similarity_search("chunk 3", k=4, filter={"file_name": "file_3"})
+        assert len(results) == 4 and all(doc.metadata["file_name"] == "file_3" for doc in results)
+        reopened = vector_database.create_index(self.embedding_function, "sharded", index_dir=str(tmp_path), num_shards=4, shard_key="file_name")
+        assert reopened.similarity_search("chunk 3", k=4, filter={"file_name": "file_3"}) == results
+
+    def test_scatter_gather_faiss_matches_single_index(self, tmp_path):
+        pytest.importorskip("faiss")
+        from langchain_community.vectorstores import FAISS
+        index = ShardedVectorIndex.from_documents(self.docs, self.embedding_function, path=str(tmp_path / "sharded"), vector_store="faiss", num_shards=4)
+        single = FAISS.from_documents(self.docs, self.embedding_function)
+        assert index.similarity_search("chunk 3", k=10) == single.similarity_search("chunk 3", k=10)
+        scores = [score for _, score in index.similarity_search_with_score("chunk 3", k=10)]
+        assert scores == sorted(scores, reverse=True)
+        index.close()
+
+    def test_scatter_gather_keeps_qdrant_similarities(self, tmp_path):
+        class SimilarityShard:
+            """Returns cosine similarities, best first, like the qdrant store."""
+            def __init__(self, hits):
+                self.hits = hits
+
+            def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, **kwargs):
+                return self.hits[:k]
+
+            def _select_relevance_score_fn(self):
+                return lambda score: 1.0 - score
+
+        index = ShardedVectorIndex(str(tmp_path / "sharded"), self.embedding_function, vector_store="qdrant", num_shards=2)
+        index.counts = [1, 1]
+        index._shards = {0: SimilarityShard([(self.docs[0], 0.9), (self.docs[1], 0.5)]), 1: SimilarityShard([(self.docs[2], 0.7), (self.docs[3], 0.1)])}
+        hits = index.similarity_search_with_score_by_vector([0.0] * 16, k=3)
+        assert hits == [(self.docs[0], 0.9), (self.docs[2], 0.7), (self.docs[1], 0.5)]
+
+    def test_qdrant_shards_on_disk(self, tmp_path):
+        qdrant_client = pytest.importorskip("qdrant_client")
+        if not hasattr(qdrant_client.QdrantClient, "search"):
+            pytest.skip("the installed qdrant_client dropped the search API the langchain Qdrant store calls")
+        path = str(tmp_path / "sharded")
+        # local qdrant keeps the metadata dicts it is given and langchain adds _id to them on search
+        docs = [Document(page_content=doc.page_content, metadata=dict(doc.metadata)) for doc in self.docs]
+        index = ShardedVectorIndex(path, self.embedding_function, vector_store="qdrant", num_shards=3, shard_key="file_name")
+        assert index.sync(docs[:100]).added == 100
+        assert all(index.counts)
+        texts = lambda docs: [doc.page_content for doc in docs]
+        results = index.similarity_search("chunk 3", k=5)
+        assert index.sync(docs[100:]).added == 100
+        assert texts(index.similarity_search("chunk 3", k=5, filter={"file_name": "file_3"})) == texts(self.expected("chunk 3", 5, {"file_3"}))
+        index.close()
+        reopened = ShardedVectorIndex(path, self.embedding_function, vector_store="qdrant", num_shards=3, shard_key="file_name")
+        assert len(results) == 5 and texts(reopened.similarity_search("chunk 3", k=5)) == texts(self.expected("chunk 3", 5))
+        assert reopened.sync([Document(page_content=doc.page_content, metadata=dict(doc.metadata)) for doc in self.docs]).skipped == 200
+        reopened.close()
@@ -1,9 +1,11 @@
 import os
 import sys 
 import pytest 
+import re
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from src.open_retrieval.document_loaders import DocumentLoader
-from src.open_retrieval.text_splitters import TextSplitter 
+from src.open_retrieval.text_splitters import TextSplitter
+from langchain.docstore.document import Document
 
 class TestTextSplitter:
     document_loader = DocumentLoader()
@@ -57,3 +59,70 @@ class TestTextSplitter:
         data = self.document_loader.load(file_path=file_path)
         documents = token_text_splitter.split(data)
         assert len(documents) > 0
+
+
+class TestOffsetSplitters:
+    text = "\n\n".join(" ".join(f"word{p}_{w}" for w in range(40)) for p in range(6))
+
+    @pytest.fixture
+    def documents(self):
+        return [Document(page_content=self.text, metadata={"source": "a.txt"})]
+
+    @pytest.mark.parametrize("splitter", ["fast_recursive", "fast_character", "fast_token"])
+    def test_fast_splitter_offsets(self, splitter, documents):
+        chunks = TextSplitter(splitter=splitter).split(documents, chunk_size=200, chunk_overlap=40, extra_metadata={"file_name": "a"})
+        assert len(chunks) > 1
+        for chunk in chunks:
+            assert self.text[chunk.metadata["start_index"]:chunk.metadata["end_index"]] == chunk.page_content
+            assert chunk.metadata["source"] == "a.txt" and chunk.metadata["file_name"] == "a"
+        chunks[0].metadata["source"] = "changed"
+        assert chunks[1].metadata["source"] == "a.txt"
+        assert documents[0].metadata == {"source": "a.txt"}
+
+    def test_fast_recursive_chunk_size(self, documents):
+        chunks = TextSplitter(splitter="fast_recursive").split(documents, chunk_size=150, chunk_overlap=30)
+        assert all(len(chunk.page_content) <= 150 for chunk in chunks)
+        assert chunks[0].metadata["start_index"] == 0
+        assert chunks[-1].metadata["end_index"] == len(self.text)
+        assert all(b.metadata["start_index"] <= a.metadata["end_index"] for a, b in zip(chunks, chunks[1:]))
+
+    def test_fast_token_windows(self, documents):
+        chunks = list(TextSplitter(splitter="fast_token").iter_split(documents, chunk_size=50, chunk_overlap=10))
+        assert [len(chunk.page_content.split()) for chunk in chunks[:-1]] == [50] * (len(chunks) - 1)
+        assert chunks[1].page_content.split()[:10] == chunks[0].page_content.split()[-10:]
+
+    def test_iter_split_is_lazy(self):
+        def documents():
+            yield Document(page_content=self.text, metadata={})
+            raise AssertionError("read past the first document")
+        chunk = next(TextSplitter(splitter="fast_recursive").iter_split(documents(), chunk_size=100, chunk_overlap=0))
+        assert chunk.metadata["start_index"] == 0
+
+
+class FakeFastTokenizer:
+    is_fast = True
+    model_max_length = 32
+
+    def __init__(self):
+        self.calls = 0
+
+    def num_special_tokens_to_add(self, pair=False):
+        return 2
+
+    def __call__(self, texts, **kwargs):
+        self.calls += 1
+        # Every 3 characters of a word are one token
+        return {"offset_mapping": [[(m.start() + i, min(m.start() + i + 3, m.end())) for m in re.finditer(r"\S+", text) for i in range(0, m.end() - m.start(), 3)] for text in texts]}
+
+
+class TestModelTokenSplitter:
+    def test_model_token_chunks_fit_window(self):
+        tokenizer = FakeFastTokenizer()
+        docs = [Document(page_content=" ".join(f"token{i}" for i in range(100)), metadata={"page": p}) for p in range(5)]
+        splitter = TextSplitter(splitter="model_token", splitter_args=[("tokenizer", tokenizer), ("batch_size", 4)])
+        chunks = splitter.split(docs, chunk_size=1000, chunk_overlap=5)
+        assert tokenizer.calls == 2
+        assert len(tokenizer([chunks[0].page_content])["offset_mapping"][0]) == 30
+        for chunk in chunks:
+            assert len(tokenizer([chunk.page_content])["offset_mapping"][0]) <= 30
+            assert docs[chunk.metadata["page"]].page_content[chunk.metadata["start_index"]:chunk.metadata["end_index"]] == chunk.page_content
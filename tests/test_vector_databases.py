@@ -3,6 +3,8 @@ import sys
 import pytest
 # from langchain_community.vectorstores import Milvus
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from langchain.docstore.document import Document
+from langchain_community.embeddings import DeterministicFakeEmbedding
 from src.open_retrieval.document_loaders import DocumentLoader
 from src.open_retrieval.embedding_providers import EmbeddingProvider
 from src.open_retrieval.text_splitters import TextSplitter
@@ -84,3 +86,16 @@ class TestVectorDatabase:
         docs = self.text_splitter.split(data)
         assert array_vector_database.create_index(embedding_function=embedding_function,docs=docs, index_name=index_name,index_dir=index_dir) is not None
         
+    def test_sync_index_faiss(self, faiss_vector_database, tmp_path):
+        index_dir = str(tmp_path)
+        index_name = 'test_sync_faiss'
+        embedding_function = DeterministicFakeEmbedding(size=16)
+        docs = [Document(page_content=f"chunk {i}", metadata={"source": "a.txt"}) for i in range(3)]
+        _, report = faiss_vector_database.sync_index(embedding_function=embedding_function, index_name=index_name, docs=docs, index_dir=index_dir)
+        assert (report.added, report.skipped, report.removed) == (3, 0, 0)
+
+        docs = docs[1:] + [Document(page_content="chunk 3", metadata={"source": "a.txt"})]
+        vector_index, report = faiss_vector_database.sync_index(embedding_function=embedding_function, index_name=index_name, docs=docs, index_dir=index_dir)
+        assert (report.added, report.skipped, report.removed) == (1, 2, 1)
+        assert len(vector_index.index_to_docstore_id) == 3
+        assert os.path.exists(os.path.join(index_dir, f"{index_name}.manifest.json"))
@@ -0,0 +1,57 @@
+import os
+import sys
+import threading
+import functools
+import pytest
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+pytest.importorskip("aiohttp")
+from src.open_retrieval.web_loader import WebLoader, parse_html
+
+PAGE = '<html lang="en"><head><title>Page {i}</title></head><body><nav>menu</nav><div class="post-title">Title {i}</div><div class="post-content">Body {i}</div></body></html>'
+
+class TestWebLoader:
+    @pytest.fixture
+    def server(self, tmp_path):
+        site = tmp_path / "site"
+        site.mkdir()
+        for i in range(20):
+            (site / f"page_{i}.html").write_text(PAGE.format(i=i))
+        requests = []
+
+        class Handler(SimpleHTTPRequestHandler):
+            def log_message(self, *args):
+                requests.append(self.path)
+
+        httpd = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(Handler, directory=str(site)))
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        thread.start()
+        yield f"http://127.0.0.1:{httpd.server_address[1]}", site, requests
+        httpd.shutdown()
+
+    def test_parse_html_keeps_strained_elements(self):
+        doc, = parse_html(PAGE.format(i=1), "http://example.com")
+        assert doc.page_content == "Title 1Body 1"
+        assert doc.metadata["source"] == "http://example.com"
+
+    def test_bulk_load_and_conditional_refetch(self, server, tmp_path):
+        base, site, requests = server
+        urls = [f"{base}/page_{i}.html" for i in range(20)] + [f"{base}/missing.html"]
+        loader = WebLoader(cache_dir=str(tmp_path / "cache"), max_connections=4, parse_workers=2)
+        docs, report = loader.load(urls)
+        assert (report.fetched, report.not_modified, report.failed_urls) == (20, 0, [f"{base}/missing.html"])
+        assert sorted(doc.page_content for doc in docs) == sorted(f"Title {i}Body {i}" for i in range(20))
+
+        os.utime(site / "page_3.html", (2_000_000_000, 2_000_000_000))
+        docs, report = loader.load(urls)
+        assert (report.fetched, report.not_modified) == (1, 19)
+        assert [doc.metadata["source"] for doc in docs] == [f"{base}/page_3.html"]
+
+        docs, report = WebLoader(cache_dir=str(tmp_path / "cache"), parse_workers=1, skip_unchanged=False).load(urls[:5])
+        assert report.not_modified == 5 and len(docs) == 5
+
+    def test_streams_and_stops_early(self, server):
+        base, _, _ = server
+        stream = WebLoader(max_connections=2, parse_workers=1).iter_documents([f"{base}/page_{i}.html" for i in range(20)])
+        assert next(stream).page_content.startswith("Title")
+        stream.close()